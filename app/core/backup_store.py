@@ -0,0 +1,323 @@
+"""
+Хранилище резервных копий автосохранения: сжатие, дельты и ограничения
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from app.core.save_pipeline import atomic_write
+from app.utils.constants import (BACKUP_MAX_COUNT, BACKUP_MAX_AGE_DAYS, BACKUP_MAX_SIZE_MB,
+                                 BACKUP_DELTA_RATIO, BACKUP_CHUNK)
+
+
+class BackupVersion:
+    """Одна резервная копия файла"""
+
+    __slots__ = ('id', 'time', 'digest', 'size', 'base')
+
+    def __init__(self, id, time, digest, size, base=None):
+        self.id = id
+        self.time = time
+        self.digest = digest
+        # Длина текста в символах
+        self.size = size
+        # Номер полной копии, от которой посчитана дельта, или None
+        self.base = base
+
+
+def iter_lines(chunks):
+    """Строки текста, заданного порциями, без '\\n' (как у split('\\n'))"""
+    carry = ''
+    for chunk in chunks:
+        lines = chunk.split('\n')
+        lines[0] = carry + lines[0]
+        carry = lines.pop()
+        yield from lines
+    yield carry
+
+
+def make_delta(base_lines, lines):
+    """Дельта строк lines относительно base_lines и число новых символов
+
+    Дельта - список операций: [начало, число] копирует строки основы,
+    строка добавляет свои строки (соединенные через '\\n'). Строки
+    сопоставляются по первому вхождению в основе, а совпадающий участок
+    продлевается, пока строки идут подряд, - это линейно по длине.
+    """
+    # С конца, чтобы у повторяющихся строк осталось первое вхождение.
+    # Порциями: копии пишутся в фоне, и GUI-поток не должен подолгу ждать GIL
+    first = {}
+    for end in range(len(base_lines), 0, -BACKUP_CHUNK):
+        start = max(0, end - BACKUP_CHUNK)
+        first.update(zip(reversed(base_lines[start:end]), range(end - 1, start - 1, -1)))
+    ops = []
+    literal = []
+    literal_chars = 0
+    run_start = run_next = None
+    for line in lines:
+        if run_next is not None and run_next < len(base_lines) and base_lines[run_next] == line:
+            run_next += 1
+            continue
+        if run_next is not None:
+            ops.append([run_start, run_next - run_start])
+            run_next = None
+        start = first.get(line)
+        if start is None:
+            literal.append(line)
+            literal_chars += len(line) + 1
+            continue
+        if literal:
+            ops.append('\n'.join(literal))
+            literal = []
+        run_start, run_next = start, start + 1
+    if run_next is not None:
+        ops.append([run_start, run_next - run_start])
+    if literal:
+        ops.append('\n'.join(literal))
+    return ops, literal_chars
+
+
+def apply_delta(base_lines, ops):
+    """Текст, восстановленный из строк основы и дельты"""
+    lines = []
+    for op in ops:
+        if isinstance(op, str):
+            lines.extend(op.split('\n'))
+        else:
+            start, count = op
+            lines.extend(base_lines[start:start + count])
+    return '\n'.join(lines)
+
+
+class BackupStore:
+    """Резервные копии файлов в каталоге <directory>/<ключ пути>/
+
+    Для каждого файла ведется index.json со списком копий, сами копии
+    лежат сжатыми в <номер>.gz. Копия с тем же хешем, что и последняя,
+    не пишется. Новая копия хранится дельтой относительно последней
+    полной копии, а если новых строк в ней больше BACKUP_DELTA_RATIO
+    от текста - становится полной сама. Полная копия удаляется с диска
+    только вместе с последней опирающейся на нее дельтой.
+
+    Ограничения: не больше max_count копий на файл, не старше max_age
+    секунд и не больше max_size байт на все хранилище (удаляются самые
+    старые копии, но одна копия в хранилище остается всегда).
+    Методы можно вызывать из разных потоков.
+    """
+
+    def __init__(self, directory, max_count=BACKUP_MAX_COUNT,
+                 max_age=BACKUP_MAX_AGE_DAYS * 86400, max_size=BACKUP_MAX_SIZE_MB * 1024 * 1024):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_count = max_count
+        self.max_age = max_age
+        self.max_size = max_size
+        # Ключ пути -> данные index.json, загружаются по мере надобности
+        self._indexes = {}
+        self._all_loaded = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(path):
+        return hashlib.sha1(os.path.abspath(path).encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+
+    def _load(self, key):
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+        try:
+            with open(self.directory / key / 'index.json', encoding='utf-8') as f:
+                data = json.load(f)
+            index = {
+                'path': data['path'],
+                'next': data['next'],
+                'versions': [BackupVersion(*item) for item in data['versions']],
+                'files': {int(number): size for number, size in data['files'].items()},
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            index = {'path': None, 'next': 1, 'versions': [], 'files': {}}
+        self._indexes[key] = index
+        return index
+
+    def _load_all(self):
+        if self._all_loaded:
+            return
+        for entry in self.directory.iterdir():
+            if entry.is_dir():
+                self._load(entry.name)
+        self._all_loaded = True
+
+    def _save_index(self, key, index):
+        if not index['versions']:
+            self._indexes.pop(key, None)
+            folder = self.directory / key
+            for path in folder.glob('*'):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            try:
+                folder.rmdir()
+            except OSError:
+                pass
+            return
+        data = {
+            'path': index['path'],
+            'next': index['next'],
+            'versions': [[v.id, v.time, v.digest, v.size, v.base] for v in index['versions']],
+            'files': index['files'],
+        }
+        atomic_write(self.directory / key / 'index.json', [json.dumps(data, ensure_ascii=False)])
+
+    def _open_file(self, key, number):
+        return gzip.open(self.directory / key / f"{number}.gz", 'rt',
+                         encoding='utf-8', errors='surrogatepass', newline='')
+
+    def _read_file(self, key, number):
+        with self._open_file(key, number) as f:
+            return f.read()
+
+    def _read_lines(self, key, number):
+        """Строки копии, читаемой порциями"""
+        with self._open_file(key, number) as f:
+            return list(iter_lines(iter(lambda: f.read(BACKUP_CHUNK), '')))
+
+    def _write_file(self, key, number, chunks):
+        path = self.directory / key / f"{number}.gz"
+        atomic_write(path, chunks, errors='surrogatepass', compression='gzip')
+        return path.stat().st_size
+
+    def versions(self, path):
+        """Копии файла, от старых к новым"""
+        with self._lock:
+            return list(self._load(self.key(path))['versions'])
+
+    def files(self):
+        """Пути файлов, у которых есть копии"""
+        with self._lock:
+            self._load_all()
+            return [index['path'] for index in self._indexes.values() if index['versions']]
+
+    def total_size(self):
+        """Байт, занятых копиями на диске"""
+        with self._lock:
+            self._load_all()
+            return sum(sum(index['files'].values()) for index in self._indexes.values())
+
+    def put(self, path, chunks, timestamp=None):
+        """Сохранить копию текста, вернуть BackupVersion или None, если она совпала с последней
+
+        chunks - текст или список его порций: порции обрабатываются по
+        отдельности, без склейки всего текста в одну строку.
+        """
+        with self._lock:
+            return self._put(path, [chunks] if isinstance(chunks, str) else chunks, timestamp)
+
+    def _put(self, path, chunks, timestamp=None):
+        key = self.key(path)
+        index = self._load(key)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in chunks:
+            digest.update(chunk.encode('utf-8', 'surrogatepass'))
+            size += len(chunk)
+        digest = digest.hexdigest()
+        versions = index['versions']
+        if versions and versions[-1].digest == digest:
+            return None
+        (self.directory / key).mkdir(exist_ok=True)
+
+        number = index['next']
+        base = None
+        content = chunks
+        if versions:
+            base_id = versions[-1].base or versions[-1].id
+            try:
+                ops, literal_chars = make_delta(self._read_lines(key, base_id), iter_lines(chunks))
+                if literal_chars <= size * BACKUP_DELTA_RATIO:
+                    base = base_id
+                    # По операции на строку
+                    content = (json.dumps(op, ensure_ascii=False) + '\n' for op in ops)
+            except (OSError, EOFError, ValueError):
+                pass
+
+        version = BackupVersion(number, timestamp or time.time(), digest, size, base)
+        index['files'][number] = self._write_file(key, number, content)
+        index['path'] = os.path.abspath(path)
+        index['next'] = number + 1
+        versions.append(version)
+        self._save_index(key, index)
+        self.prune()
+        return version
+
+    def read(self, path, number):
+        """Текст копии с номером number, OSError если ее нет"""
+        with self._lock:
+            return self._read(path, number)
+
+    def _read(self, path, number):
+        key = self.key(path)
+        for version in self._load(key)['versions']:
+            if version.id == number:
+                break
+        else:
+            raise FileNotFoundError(f"Нет резервной копии {number} для {path}")
+        content = self._read_file(key, number)
+        if version.base is None:
+            return content
+        ops = [json.loads(line) for line in content.split('\n') if line]
+        return apply_delta(self._read_file(key, version.base).split('\n'), ops)
+
+    def _drop(self, key, index, versions):
+        """Убрать копии из индекса и удалить файлы, на которые никто не опирается"""
+        dropped = set(versions)
+        index['versions'] = [v for v in index['versions'] if v not in dropped]
+        needed = set()
+        for version in index['versions']:
+            needed.add(version.id)
+            if version.base is not None:
+                needed.add(version.base)
+        for number in list(index['files']):
+            if number not in needed:
+                del index['files'][number]
+                try:
+                    (self.directory / key / f"{number}.gz").unlink()
+                except OSError:
+                    pass
+        self._save_index(key, index)
+
+    def prune(self, now=None):
+        """Применить ограничения по числу, возрасту и объему"""
+        with self._lock:
+            return self._prune(now)
+
+    def _prune(self, now=None):
+        now = now or time.time()
+        self._load_all()
+        for key, index in list(self._indexes.items()):
+            versions = index['versions']
+            old = [v for v in versions if now - v.time > self.max_age]
+            extra = versions[:max(0, len(versions) - self.max_count)]
+            if old or extra:
+                self._drop(key, index, set(old) | set(extra))
+
+        total = self.total_size()
+        while total > self.max_size:
+            if sum(len(index['versions']) for index in self._indexes.values()) <= 1:
+                break
+            _, key = min((index['versions'][0].time, key) for key, index in self._indexes.items()
+                         if index['versions'])
+            index = self._indexes[key]
+            before = sum(index['files'].values())
+            self._drop(key, index, [index['versions'][0]])
+            total -= before - sum(index['files'].values())
+
+        # Файлы прежнего формата autosave_<имя>_<время>.bak
+        for path in self.directory.glob('autosave_*.bak'):
+            try:
+                if now - path.stat().st_mtime > self.max_age:
+                    path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,109 @@
+"""
+Параллельное открытие множества файлов
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from app.core.encoding import get_encoding_detector
+from app.core.compression import MAGIC
+from app.utils.constants import LOAD_ASYNC_THRESHOLD, OPEN_MAX_WORKERS, BINARY_CHECK_SIZE
+
+
+def is_binary(data):
+    """Файл считается двоичным, если в его начале есть нулевой байт"""
+    return b'\0' in data[:BINARY_CHECK_SIZE]
+
+
+def expand_paths(paths):
+    """Развернуть папки в отсортированный список файлов (скрытые пропускаются)
+
+    Возвращает пары (путь, из_папки): файлы, найденные в папках,
+    проверяются на двоичность, а явно указанные открываются как есть.
+    """
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if not name.startswith('.'):
+                        result.append((os.path.join(root, name), True))
+        elif os.path.isfile(path):
+            result.append((path, False))
+    return result
+
+
+def read_file_task(path, skip_binary=False):
+    """Прочитать и декодировать файл в рабочем потоке
+
+    Возвращает кортеж (вид, данные): 'text' - (текст, кодировка),
+    'defer' - файл велик или сжат и открывается обычным путем,
+    'binary' - двоичный файл пропущен, 'error' - текст ошибки.
+    """
+    try:
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            # Сжатие и двоичность видны по началу файла, поэтому и
+            # большие файлы проверяются до передачи загрузчику
+            data = f.read(BINARY_CHECK_SIZE)
+            # Сжатые файлы распаковывает фоновый загрузчик
+            if any(data.startswith(magic) for magic, _ in MAGIC):
+                return 'defer', None
+            if skip_binary and is_binary(data):
+                return 'binary', None
+            if stat.st_size >= LOAD_ASYNC_THRESHOLD:
+                return 'defer', None
+            data += f.read()
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        return 'text', get_encoding_detector().decode(data, key)
+    except Exception as e:
+        return 'error', str(e)
+
+
+class BatchOpener(QObject):
+    """Чтение файлов пулом потоков и создание вкладок в исходном порядке"""
+
+    result_ready = pyqtSignal(int, object)
+    finished = pyqtSignal()
+
+    def __init__(self, file_manager, entries, parent=None):
+        super().__init__(parent)
+        self.file_manager = file_manager
+        self.entries = entries
+        self.errors = []
+        self._results = {}
+        self._next = 0
+        self._executor = ThreadPoolExecutor(max_workers=OPEN_MAX_WORKERS)
+        # Сигнал испускается из рабочих потоков и доставляется в GUI-поток
+        self.result_ready.connect(self._on_result)
+
+    def start(self):
+        """Отправить все файлы в пул"""
+        for index, (path, skip_binary) in enumerate(self.entries):
+            future = self._executor.submit(read_file_task, path, skip_binary)
+            future.add_done_callback(
+                lambda future, index=index: self.result_ready.emit(index, future.result())
+            )
+        self._executor.shutdown(wait=False)
+
+    def _on_result(self, index, result):
+        self._results[index] = result
+        # Вкладки создаются по порядку, как только готов следующий файл
+        while self._next in self._results:
+            kind, payload = self._results.pop(self._next)
+            path = self.entries[self._next][0]
+            self._next += 1
+            if kind == 'text':
+                content, encoding = payload
+                editor = self.file_manager.editor
+                editor.set_modified(editor.get_tab_data(editor.new_tab(path, content, encoding)), False)
+                editor.file_watch_service.track(path)
+            elif kind == 'defer':
+                self.file_manager.open_file(path)
+            elif kind == 'error':
+                self.errors.append(f"{path}: {payload}")
+            self.file_manager.editor.statusbar_manager.set_text(
+                f"Открыто файлов: {self._next} из {len(self.entries)}"
+            )
+        if self._next == len(self.entries):
+            self.finished.emit()
@@ -0,0 +1,60 @@
+"""
+Прозрачная потоковая работа со сжатыми файлами (.gz, .bz2, .xz)
+"""
+import bz2
+import gzip
+import lzma
+import os
+
+# Сигнатуры форматов в начале файла
+MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+
+def detect_compression(path):
+    """Определить формат сжатия по сигнатуре, None для обычного файла"""
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, compression in MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_for_path(path):
+    """Формат сжатия по расширению имени файла"""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def open_decompressed(raw, compression):
+    """Обернуть открытый двоичный файл распаковывающим потоком"""
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(raw, 'rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(raw, 'rb')
+    return raw
+
+
+def open_compressed_writer(raw, compression, name=''):
+    """Обернуть открытый на запись файл сжимающим потоком
+
+    Закрытие обертки дописывает конец сжатого потока, но не закрывает raw.
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(filename=name, fileobj=raw, mode='wb')
+    if compression == 'bz2':
+        return bz2.BZ2File(raw, 'wb')
+    if compression == 'xz':
+        return lzma.LZMAFile(raw, 'wb')
+    return None
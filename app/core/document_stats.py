@@ -0,0 +1,79 @@
+"""
+Инкрементальная статистика документа (строки, слова, символы)
+"""
+from array import array
+from PyQt6.QtCore import QObject
+
+
+def block_stats(text):
+    """Число слов и непробельных символов в строке"""
+    words = text.split()
+    return len(words), sum(map(len, words))
+
+
+class DocumentStats(QObject):
+    """Статистика документа, обновляемая по сигналу contentsChange
+
+    Для каждого блока хранятся число слов и непробельных символов,
+    при правке пересчитываются только затронутые блоки, а итоги
+    корректируются на разницу. Строки и символы берутся у документа.
+    """
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.document = document
+        self.words = 0
+        self.non_whitespace = 0
+        self._block_words = array('l')
+        self._block_non_ws = array('l')
+        self.rescan()
+        # Без раскладки документ не испускает contentsChange
+        document.documentLayout()
+        document.contentsChange.connect(self.on_contents_change)
+
+    @property
+    def lines(self):
+        return self.document.blockCount()
+
+    @property
+    def characters(self):
+        # characterCount() учитывает завершающий разделитель абзаца
+        return self.document.characterCount() - 1
+
+    def _scan(self, first, last):
+        """Статистика блоков с first по last включительно"""
+        words = array('l')
+        non_ws = array('l')
+        block = self.document.findBlockByNumber(first)
+        for _ in range(last - first + 1):
+            block_words, block_non_ws = block_stats(block.text())
+            words.append(block_words)
+            non_ws.append(block_non_ws)
+            block = block.next()
+        return words, non_ws
+
+    def rescan(self):
+        """Полный пересчет"""
+        self._block_words, self._block_non_ws = self._scan(0, self.document.blockCount() - 1)
+        self.words = sum(self._block_words)
+        self.non_whitespace = sum(self._block_non_ws)
+
+    def on_contents_change(self, position, removed, added):
+        count = self.document.blockCount()
+        old_count = len(self._block_words)
+        end = min(position + added, self.document.characterCount() - 1)
+        first = self.document.findBlock(position).blockNumber()
+        last_new = self.document.findBlock(end).blockNumber()
+        if first < 0 or last_new < 0:
+            self.rescan()
+            return
+        last_old = last_new - (count - old_count)
+        if last_old < first - 1 or last_old >= old_count:
+            self.rescan()
+            return
+
+        words, non_ws = self._scan(first, last_new)
+        self.words += sum(words) - sum(self._block_words[first:last_old + 1])
+        self.non_whitespace += sum(non_ws) - sum(self._block_non_ws[first:last_old + 1])
+        self._block_words[first:last_old + 1] = words
+        self._block_non_ws[first:last_old + 1] = non_ws
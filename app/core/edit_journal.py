@@ -0,0 +1,391 @@
+"""
+Журнал правок для восстановления несохраненного текста после сбоя
+"""
+import itertools
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from PyQt6.QtGui import QTextCursor, QTextDocument
+from app.core.encoding import get_encoding_detector
+from app.core.save_pipeline import atomic_write
+from app.utils.constants import JOURNAL_FLUSH_INTERVAL, JOURNAL_COMPACT_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def lock_file(f):
+    """Захватить открытый файл без ожидания, False если он уже занят"""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class TabJournal:
+    """Запись правок одного документа в очередь журнала
+
+    Обработчик contentsChange только берет вставленный текст и кладет
+    запись в очередь, остальное делает поток записи EditJournal.
+    """
+
+    def __init__(self, journal, tab_id, tab_data):
+        self.journal = journal
+        self.tab_id = tab_id
+        self.tab_data = tab_data
+        self.document = tab_data.text_edit.document()
+        self.active = False
+        # Примерный объем журнала с последнего снимка
+        self.size = 0
+        # Без раскладки документ не испускает contentsChange
+        self.document.documentLayout()
+
+    def connect(self):
+        if not self.active:
+            self.document.contentsChange.connect(self.on_contents_change)
+            self.active = True
+
+    def disconnect(self):
+        if self.active:
+            try:
+                self.document.contentsChange.disconnect(self.on_contents_change)
+            except (TypeError, RuntimeError):
+                pass
+            self.active = False
+
+    def on_contents_change(self, position, removed, added):
+        text = ''
+        if added:
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(position)
+            # Замена всего документа сообщает длину с завершающим разделителем
+            cursor.setPosition(min(position + added, self.document.characterCount() - 1),
+                               QTextCursor.MoveMode.KeepAnchor)
+            text = cursor.selectedText()
+        self.journal.queue.put(('edit', self.tab_id, position, removed, text))
+        # Позиции, скобки и перевод строки в записи - около 16 байт
+        self.size += len(text) + 16
+        if self.size >= JOURNAL_COMPACT_SIZE:
+            self.journal.reset(self.tab_data)
+
+
+class EditJournal:
+    """Журнал правок вкладок в ~/.texteditor/journal/<pid>-<время запуска>
+
+    Для каждой вкладки хранится снимок <id>.snap (текст или ссылка на
+    неизмененный файл) и журнал <id>.<поколение>.log со строками JSON
+    [позиция, удалено, вставлено]. Файлы пишет фоновый поток порциями
+    раз в JOURNAL_FLUSH_INTERVAL. Когда журнал дорастает до
+    JOURNAL_COMPACT_SIZE, делается новый снимок и журнал начинается
+    заново, так что его размер ограничен.
+
+    У каждого запущенного редактора свой новый каталог (одного PID мало:
+    после перезагрузки или в другом пространстве PID номер повторяется),
+    и все время работы он держит захваченным файл lock в нем. Штатное
+    завершение удаляет каталог; каталог, lock которого удалось
+    захватить, остался от сеанса, завершившегося сбоем, и проигрывается.
+    Журналы других работающих редакторов не трогаются. Если захватить
+    свой lock не удалось, журнал выключается: иначе другой редактор
+    принял бы его за брошенный.
+    """
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.root = editor.journal_dir
+        self.directory = None
+        self.queue = queue.SimpleQueue()
+        self._ids = itertools.count(1)
+        self._writer = None
+        self._lock = None
+        self.enabled = True
+
+    def start(self):
+        """Создать и захватить свой каталог и запустить поток записи"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        while True:
+            directory = self.root / f"{os.getpid()}-{time.time_ns()}"
+            try:
+                directory.mkdir()
+                break
+            except FileExistsError:
+                continue
+        self.directory = directory
+        self._lock = open(directory / "lock", 'a')
+        if not lock_file(self._lock):
+            print("Журнал правок выключен: не удалось захватить его каталог")
+            self._lock.close()
+            self._lock = None
+            shutil.rmtree(directory, ignore_errors=True)
+            self.directory = None
+            self.enabled = False
+            # Журналы уже открытых вкладок писать некому
+            for tab_data in self.editor.tabs:
+                self.suspend(tab_data)
+                tab_data.journal = None
+            self.queue = queue.SimpleQueue()
+            return
+        self._writer = threading.Thread(target=self._run, name="edit-journal", daemon=True)
+        self._writer.start()
+
+    def shutdown(self):
+        """Штатное завершение: дописать очередь и удалить журнал"""
+        if self._writer is not None:
+            self.queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def attach(self, tab_data):
+        """Начать журнал вкладки"""
+        if not self.enabled:
+            return
+        if tab_data.journal is None:
+            tab_data.journal = TabJournal(self, next(self._ids), tab_data)
+        self.resume(tab_data)
+
+    def suspend(self, tab_data):
+        """Не записывать правки (загрузка, слежение за файлом)"""
+        tab_journal = tab_data.journal
+        if tab_journal:
+            tab_journal.disconnect()
+
+    def resume(self, tab_data):
+        """Продолжить запись с нового снимка"""
+        tab_journal = tab_data.journal
+        if tab_journal:
+            tab_journal.connect()
+            self.reset(tab_data)
+
+    def reset(self, tab_data):
+        """Начать журнал вкладки с текущего состояния документа"""
+        tab_journal = tab_data.journal
+        if not tab_journal or not tab_journal.active:
+            return
+        meta = {
+            'name': tab_data.name,
+            'file_path': tab_data.file_path,
+            'encoding': tab_data.encoding,
+        }
+        file_path = tab_data.file_path
+        if file_path and not tab_data.modified and os.path.exists(file_path):
+            # Текст совпадает с файлом - достаточно запомнить его версию
+            stat = os.stat(file_path)
+            meta.update(base='file', mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        else:
+            meta.update(base='text', text=tab_journal.document.toRawText().replace('\u2029', '\n'))
+        tab_journal.size = 0
+        self.queue.put(('base', tab_journal.tab_id, meta))
+
+    def drop(self, tab_data):
+        """Вкладка закрыта - её журнал больше не нужен"""
+        tab_journal = tab_data.journal
+        tab_data.journal = None
+        if tab_journal:
+            tab_journal.disconnect()
+            self.queue.put(('drop', tab_journal.tab_id))
+
+    def _run(self):
+        """Поток записи: порция записей за JOURNAL_FLUSH_INTERVAL, затем fsync"""
+        logs = {}
+        generations = {}
+        running = True
+        while running:
+            items = [self.queue.get()]
+            deadline = time.monotonic() + JOURNAL_FLUSH_INTERVAL
+            while items[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            touched = set()
+            for item in items:
+                if item is None:
+                    running = False
+                    break
+                try:
+                    self._write(item, logs, generations, touched)
+                except (OSError, ValueError) as e:
+                    print(f"Ошибка записи журнала правок: {e}")
+            for tab_id in touched:
+                log = logs.get(tab_id)
+                if log:
+                    log.flush()
+                    os.fsync(log.fileno())
+        for log in logs.values():
+            log.close()
+
+    def _write(self, item, logs, generations, touched):
+        kind, tab_id = item[0], item[1]
+        if kind == 'edit':
+            log = logs.get(tab_id)
+            if log:
+                _, _, position, removed, text = item
+                log.write(json.dumps([position, removed, text.replace('\u2029', '\n')], ensure_ascii=False))
+                log.write('\n')
+                touched.add(tab_id)
+        elif kind == 'base':
+            # Сначала снимок нового поколения, потом журнал прежнего удаляется:
+            # при сбое посередине останется согласованная пара файлов
+            generation = generations.get(tab_id, 0) + 1
+            meta = dict(item[2], generation=generation)
+            log = open(self.directory / f"{tab_id}.{generation}.log", 'w', encoding='utf-8', errors='surrogatepass')
+            atomic_write(self.directory / f"{tab_id}.snap", [json.dumps(meta, ensure_ascii=False)],
+                         errors='surrogatepass')
+            self._close_log(tab_id, logs, generations)
+            logs[tab_id] = log
+            generations[tab_id] = generation
+        elif kind == 'drop':
+            self._close_log(tab_id, logs, generations)
+            generations.pop(tab_id, None)
+            (self.directory / f"{tab_id}.snap").unlink(missing_ok=True)
+
+    def _close_log(self, tab_id, logs, generations):
+        log = logs.pop(tab_id, None)
+        if log:
+            log.close()
+            (self.directory / f"{tab_id}.{generations[tab_id]}.log").unlink(missing_ok=True)
+
+    def recover(self):
+        """Проиграть журналы сеансов, завершившихся сбоем
+
+        Восстановленный текст открывается в новых вкладках, помеченных
+        измененными. Возвращает число восстановленных вкладок.
+        """
+        recovered = []
+        try:
+            directories = sorted(path for path in self.root.iterdir() if path.is_dir())
+        except OSError:
+            directories = []
+        for directory in directories:
+            if directory != self.directory:
+                recovered.extend(self._recover_directory(directory))
+
+        count = 0
+        for meta, text in recovered:
+            if text is None:
+                continue
+            tab_index = self.editor.new_tab(meta['file_path'], text, meta.get('encoding', 'utf-8'))
+            tab_data = self.editor.get_tab_data(tab_index)
+            tab_data.name = meta['name']
+            self.editor.set_modified(tab_data, True)
+            count += 1
+        if count:
+            self.editor.statusbar_manager.set_text(f"После сбоя восстановлено вкладок: {count}")
+        return count
+
+
+    @staticmethod
+    def _recover_directory(directory):
+        """Журналы каталога, если его редактор уже не работает"""
+        try:
+            lock = open(directory / "lock", 'a')
+        except OSError:
+            return []
+        recovered = []
+        try:
+            if not lock_file(lock):
+                # Редактор еще работает
+                return []
+            for snap in sorted(directory.glob('*.snap')):
+                try:
+                    recovered.append(replay(snap))
+                except (OSError, ValueError) as e:
+                    print(f"Не удалось восстановить {snap.name}: {e}")
+                # Пока каталог захвачен, снимки удаляются, чтобы другой
+                # запущенный редактор не восстановил их второй раз
+                snap.unlink(missing_ok=True)
+        finally:
+            lock.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        return recovered
+
+
+def replay(snap_path):
+    """Текст вкладки по снимку и журналу, (метаданные, текст)
+
+    Текст равен None, если восстанавливать нечего: вкладка совпадала с
+    файлом и не менялась либо файл с тех пор изменился и правки к нему
+    не применить.
+    """
+    # Правка может разрезать суррогатную пару, поэтому половинки пар
+    # пишутся и читаются как есть
+    with open(snap_path, 'r', encoding='utf-8', errors='surrogatepass') as f:
+        meta = json.load(f)
+    records = []
+    log_path = snap_path.with_name(f"{snap_path.stem}.{meta['generation']}.log")
+    if log_path.exists():
+        with open(log_path, 'r', encoding='utf-8', errors='surrogatepass') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # строка, оборванная сбоем
+    if meta['base'] == 'file':
+        if not records:
+            return meta, None
+        try:
+            stat = os.stat(meta['file_path'])
+        except OSError:
+            return meta, None
+        if stat.st_mtime_ns != meta['mtime_ns'] or stat.st_size != meta['size']:
+            return meta, None
+        text, _ = get_encoding_detector().read_text(meta['file_path'])
+        # Текст в том виде, в каком его держал документ (переводы строк)
+        document = QTextDocument()
+        document.setPlainText(text)
+        text = document.toRawText().replace('\u2029', '\n')
+    else:
+        text = meta['text']
+        if not records and not text:
+            return meta, None
+    return meta, apply_records(text, records)
+
+
+def apply_records(text, records):
+    """Применить правки журнала к тексту
+
+    Позиции в журнале - позиции QTextDocument, то есть в единицах
+    UTF-16, поэтому текст хранится байтами UTF-16-LE в буфере с
+    разрывом: left - текст до места правки, right - после него в
+    обратном порядке байтов. Правки при наборе идут рядом друг с другом,
+    и каждая обходится без копирования всего текста.
+    """
+    left = bytearray(text.encode('utf-16-le', 'surrogatepass'))
+    right = bytearray()
+    for position, removed, inserted in records:
+        gap = len(left) // 2
+        total = gap + len(right) // 2
+        position = min(position, total)
+        end = min(position + removed, total)
+        if position < gap:
+            moved = (gap - position) * 2
+            right += left[-moved:][::-1]
+            del left[-moved:]
+        elif position > gap:
+            moved = (position - gap) * 2
+            left += right[-moved:][::-1]
+            del right[-moved:]
+        if end > position:
+            del right[len(right) - (end - position) * 2:]
+        left += inserted.encode('utf-16-le', 'surrogatepass')
+    left += right[::-1]
+    return left.decode('utf-16-le', 'surrogatepass')
@@ -3,8 +3,8 @@
 Команды редактирования текста
 """
 from datetime import datetime
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QListWidget, QListWidgetItem, QPushButton, QMessageBox, QFontDialog
-from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QListWidget, QListWidgetItem, QPushButton, QMessageBox, QFontDialog, QInputDialog, QTextEdit
+from PyQt6.QtGui import QFont, QTextCursor
 from PyQt6.QtCore import Qt
 class EditorCommands:
     """Команды редактирования"""
@@ -61,6 +61,37 @@ class EditorCommands:
             dt_string = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             text_edit.insertPlainText(dt_string)
            
+    def goto_line(self):
+        """Перейти к строке"""
+        large_view = self.editor.get_current_large_view()
+        text_edit = self.editor.get_current_text_edit()
+        if large_view:
+            current = large_view.current_line + 1
+            total = large_view.mapped_file.line_count()
+        elif text_edit:
+            current = text_edit.textCursor().blockNumber() + 1
+            total = text_edit.document().blockCount()
+        else:
+            return
+       
+        line, ok = QInputDialog.getInt(
+            self.editor, "Перейти к строке", f"Номер строки (1 - {total}):",
+            current, 1, max(1, total)
+        )
+        if not ok:
+            return
+        self.go_to_line(large_view or text_edit, line)
+       
+    def go_to_line(self, widget, line):
+        """Поставить курсор на строку line (с 1) в редакторе или просмотре"""
+        if isinstance(widget, QTextEdit):
+            block = widget.document().findBlockByNumber(min(line, widget.document().blockCount()) - 1)
+            widget.setTextCursor(QTextCursor(block))
+            widget.ensureCursorVisible()
+        else:
+            widget.goto_line(line)
+        widget.setFocus()
+           
     def toggle_word_wrap(self):
         """Переключить перенос слов"""
         text_edit = self.editor.get_current_text_edit()
@@ -80,50 +111,42 @@ class EditorCommands:
        
         if ok:
             # Применяем шрифт ко всем вкладкам
-            for i in range(self.editor.tab_widget.count()):
-                tab_data = self.editor.get_tab_data(i)
-                if tab_data:
-                    tab_data['text_edit'].setFont(font)
+            for tab_data in self.editor.tabs:
+                tab_data.text_edit.setFont(font)
                    
     def zoom_in(self):
         """Увеличить размер шрифта"""
-        for i in range(self.editor.tab_widget.count()):
-            tab_data = self.editor.get_tab_data(i)
-            if tab_data:
-                font = tab_data['text_edit'].font()
-                font.setPointSize(font.pointSize() + 1)
-                tab_data['text_edit'].setFont(font)
+        for tab_data in self.editor.tabs:
+            font = tab_data.text_edit.font()
+            font.setPointSize(font.pointSize() + 1)
+            tab_data.text_edit.setFont(font)
                
     def zoom_out(self):
         """Уменьшить размер шрифта"""
-        for i in range(self.editor.tab_widget.count()):
-            tab_data = self.editor.get_tab_data(i)
-            if tab_data:
-                font = tab_data['text_edit'].font()
-                new_size = max(8, font.pointSize() - 1)
-                font.setPointSize(new_size)
-                tab_data['text_edit'].setFont(font)
+        for tab_data in self.editor.tabs:
+            font = tab_data.text_edit.font()
+            new_size = max(8, font.pointSize() - 1)
+            font.setPointSize(new_size)
+            tab_data.text_edit.setFont(font)
                
     def zoom_reset(self):
         """Сбросить масштаб"""
         from app.utils.constants import DEFAULT_FONT
-        for i in range(self.editor.tab_widget.count()):
-            tab_data = self.editor.get_tab_data(i)
-            if tab_data:
-                font = QFont(DEFAULT_FONT[0], DEFAULT_FONT[1])
-                tab_data['text_edit'].setFont(font)
+        for tab_data in self.editor.tabs:
+            font = QFont(DEFAULT_FONT[0], DEFAULT_FONT[1])
+            tab_data.text_edit.setFont(font)
                
     def show_statistics(self):
         """Показать статистику документа"""
-        text_edit = self.editor.get_current_text_edit()
-        if not text_edit:
+        tab_data = self.editor.get_current_tab_data()
+        if not tab_data or not tab_data.stats:
             return
        
-        text = text_edit.toPlainText()
-        lines = len(text.split('\n'))
-        words = len(text.split())
-        chars = len(text)
-        chars_no_spaces = len(text.replace(' ', '').replace('\n', ''))
+        stats = tab_data.stats
+        lines = stats.lines
+        words = stats.words
+        chars = stats.characters
+        chars_no_spaces = stats.non_whitespace
        
         QMessageBox.information(
             self.editor,
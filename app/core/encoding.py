@@ -0,0 +1,141 @@
+"""
+Определение кодировки файлов за один проход с кэшем по пути
+"""
+import codecs
+import os
+import re
+import threading
+from collections import OrderedDict
+from app.utils.constants import ENCODING_SAMPLE_SIZE, ENCODING_CACHE_SIZE
+
+# Порядок важен: BOM UTF-32 LE начинается с BOM UTF-16 LE
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Байты, не определенные в windows-1252
+CP1252_UNDEFINED = re.compile(rb'[\x81\x8d\x8f\x90\x9d]')
+
+# Байты ниже 0xC0 и серии из двух и более байтов 0xC0-0xFF
+LOW_BYTES = bytes(range(0xC0))
+HIGH_RUN = re.compile(rb'[\xc0-\xff]{2,}')
+
+
+def is_ascii_compatible(encoding):
+    """Совпадают ли ASCII-символы (в том числе '\\n') с их байтами"""
+    return encoding in ('utf-8', 'utf-8-sig', 'cp1251', 'windows-1252', 'iso-8859-1', 'latin-1')
+
+
+class EncodingDetector:
+    """Определение кодировки по BOM и ограниченной выборке байтов"""
+
+    def __init__(self, sample_size=ENCODING_SAMPLE_SIZE, cache_size=ENCODING_CACHE_SIZE):
+        self.sample_size = sample_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_key(self, path, stat=None):
+        stat = stat or os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def _cache_get(self, key):
+        with self._lock:
+            encoding = self._cache.get(key)
+            if encoding is not None:
+                self._cache.move_to_end(key)
+            return encoding
+
+    def _cache_put(self, key, encoding):
+        with self._lock:
+            self._cache[key] = encoding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def detect_bytes(self, data, complete=True):
+        """Определить кодировку по байтам (complete - данные до конца файла)"""
+        for bom, encoding in BOMS:
+            if data.startswith(bom):
+                return encoding
+
+        sample = data[:self.sample_size]
+        if self.is_valid_utf8(sample, final=complete and len(data) <= self.sample_size):
+            return 'utf-8'
+        return self.detect_single_byte(sample)
+
+    @staticmethod
+    def is_valid_utf8(data, final=True):
+        """Потоковая проверка UTF-8 (обрезанный в конце символ допустим при final=False)"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            decoder.decode(data, final)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    @staticmethod
+    def detect_single_byte(sample):
+        """Выбор между cp1251, windows-1252 и iso-8859-1"""
+        # Кириллица в cp1251 идет словами из байтов 0xC0-0xFF,
+        # а западные диакритики обычно стоят по одной среди ASCII
+        high = len(sample.translate(None, LOW_BYTES))
+        paired = len(sample) - len(HIGH_RUN.sub(b'', sample))
+        if high and paired >= high * 0.5:
+            return 'cp1251'
+        if not CP1252_UNDEFINED.search(sample):
+            return 'windows-1252'
+        return 'iso-8859-1'
+
+    def detect_file(self, path):
+        """Определить кодировку файла, читая только выборку"""
+        stat = os.stat(path)
+        key = self._cache_key(path, stat)
+        encoding = self._cache_get(key)
+        if encoding is None:
+            with open(path, 'rb') as f:
+                sample = f.read(self.sample_size)
+            encoding = self.detect_bytes(sample, complete=stat.st_size <= self.sample_size)
+            self._cache_put(key, encoding)
+        return encoding
+
+    def decode(self, data, key=None):
+        """Декодировать байты за один проход, вернуть (текст, кодировка)"""
+        encoding = self._cache_get(key) if key else None
+        if encoding is None:
+            encoding = self.detect_bytes(data)
+        try:
+            text = data.decode(encoding)
+        except UnicodeDecodeError as e:
+            # Выборка оказалась корректной, а остаток файла - нет:
+            # определяем однобайтовую кодировку по месту ошибки
+            encoding = self.detect_single_byte(data[e.start:e.start + self.sample_size])
+            text = data.decode(encoding, errors='replace')
+        if '\r' in text:
+            # Как в текстовом режиме open(): универсальные переводы строк
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if key:
+            self._cache_put(key, encoding)
+        return text, encoding
+
+    def read_text(self, path):
+        """Прочитать файл целиком один раз и декодировать, вернуть (текст, кодировка)"""
+        with open(path, 'rb') as f:
+            key = self._cache_key(path, os.fstat(f.fileno()))
+            data = f.read()
+        return self.decode(data, key)
+
+
+_encoding_detector = None
+
+
+def get_encoding_detector():
+    """Получить общий экземпляр детектора кодировок"""
+    global _encoding_detector
+    if _encoding_detector is None:
+        _encoding_detector = EncodingDetector()
+    return _encoding_detector
@@ -0,0 +1,181 @@
+"""
+Фоновая загрузка файлов с порционной вставкой в документ
+"""
+import codecs
+import os
+import queue
+import threading
+import time
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+from app.core.encoding import get_encoding_detector
+from app.core.compression import open_decompressed
+from app.utils.constants import (LOAD_CHUNK_SIZE, LOAD_QUEUE_SIZE,
+                                 LOAD_BATCH_TIME, LOAD_INSERT_CHARS,
+                                 ENCODING_SAMPLE_SIZE)
+
+
+class FileLoader(QObject):
+    """Загрузка файла в документ без блокировки GUI
+
+    Рабочий поток читает и декодирует файл порциями и кладет их в
+    ограниченную очередь, а таймер в GUI-потоке забирает порции и
+    вставляет их в документ, укладываясь в LOAD_BATCH_TIME за такт.
+    """
+
+    progress_changed = pyqtSignal(int)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, document, compression=None, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.compression = compression
+        self.document = document
+        self.encoding = None
+        self.progress = 0
+        self.size = os.path.getsize(file_path)
+        self._bytes_inserted = 0
+        self._pending = None  # (текст, смещение, байт прочитано)
+        self._queue = queue.Queue(maxsize=LOAD_QUEUE_SIZE)
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._insert_batch)
+
+    def start(self):
+        """Запустить загрузку"""
+        self.document.setUndoRedoEnabled(False)
+        self._thread.start()
+        self._timer.start(5)
+
+    def cancel(self):
+        """Прервать загрузку"""
+        self._cancelled.set()
+        self._timer.stop()
+        # Освобождаем место в очереди, чтобы поток не ждал вечно
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        """Чтение и декодирование в рабочем потоке
+
+        Кодировка определяется по первой выборке, а файл декодируется
+        строго: замена байтов на U+FFFD незаметно испортила бы файл при
+        следующем сохранении. Если дальше выборки встретились байты,
+        недопустимые в кодировке, она определяется заново по месту
+        ошибки, и файл читается с начала. iso-8859-1 декодирует любые
+        байты, поэтому перезапусков не больше двух.
+        """
+        try:
+            encoding = None
+            while True:
+                try:
+                    if self._read_pass(encoding):
+                        self._put(('done', None))
+                    return
+                except UnicodeDecodeError as e:
+                    if encoding is None or encoding in ('utf-8', 'utf-8-sig', 'utf-16', 'utf-32'):
+                        encoding = get_encoding_detector().detect_single_byte(
+                            e.object[e.start:e.start + ENCODING_SAMPLE_SIZE])
+                    else:
+                        encoding = 'iso-8859-1'
+                    if not self._put(('restart', encoding)):
+                        return
+        except Exception as e:
+            self._put(('error', str(e)))
+
+    def _read_pass(self, encoding=None):
+        """Один проход по файлу, False если загрузку отменили"""
+        with open(self.file_path, 'rb') as raw, open_decompressed(raw, self.compression) as f:
+            sample = f.read(ENCODING_SAMPLE_SIZE)
+            if encoding is None:
+                encoding = get_encoding_detector().detect_bytes(sample, complete=len(sample) < ENCODING_SAMPLE_SIZE)
+                self._put(('encoding', encoding))
+            decoder = codecs.getincrementaldecoder(encoding)()
+            data = sample
+            pending_cr = ''
+            while not self._cancelled.is_set():
+                # Прогресс считаем по сжатым байтам, прочитанным с диска
+                bytes_read = raw.tell()
+                final = not data
+                text = pending_cr + decoder.decode(data, final)
+                # '\r\n' может разорваться между порциями
+                pending_cr = ''
+                if text.endswith('\r') and not final:
+                    text, pending_cr = text[:-1], '\r'
+                if '\r' in text:
+                    text = text.replace('\r\n', '\n').replace('\r', '\n')
+                if text and not self._put(('text', (text, bytes_read))):
+                    return False
+                if final:
+                    return True
+                data = f.read(LOAD_CHUNK_SIZE)
+        return False
+
+    def _insert_batch(self):
+        """Вставка накопленных порций в GUI-потоке"""
+        deadline = time.perf_counter() + LOAD_BATCH_TIME
+        cursor = None
+        while time.perf_counter() < deadline:
+            if self._pending is None:
+                try:
+                    kind, payload = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'encoding':
+                    self.encoding = payload
+                    continue
+                elif kind == 'restart':
+                    # Кодировка оказалась другой - вставленное убираем
+                    self.encoding = payload
+                    self.document.clear()
+                    self._bytes_inserted = 0
+                    cursor = None
+                    continue
+                elif kind == 'done':
+                    self._finish()
+                    self.finished.emit(self.encoding)
+                    return
+                elif kind == 'error':
+                    self._finish()
+                    self.failed.emit(payload)
+                    return
+                text, bytes_read = payload
+                self._pending = (text, 0, bytes_read)
+
+            # Порцию вставляем кусками: раскладка QTextEdit дорогая,
+            # и один большой insertText надолго заморозил бы окно
+            text, offset, bytes_read = self._pending
+            if cursor is None:
+                cursor = QTextCursor(self.document)
+                cursor.movePosition(QTextCursor.MoveOperation.End)
+            end = offset + LOAD_INSERT_CHARS
+            cursor.insertText(text[offset:end])
+            if end >= len(text):
+                self._pending = None
+                self._bytes_inserted = bytes_read
+            else:
+                self._pending = (text, end, bytes_read)
+
+        progress = int(self._bytes_inserted * 100 / self.size) if self.size else 100
+        if progress != self.progress:
+            self.progress = progress
+            self.progress_changed.emit(progress)
+
+    def _finish(self):
+        self._timer.stop()
+        self.document.setUndoRedoEnabled(True)
+        self.document.setModified(False)
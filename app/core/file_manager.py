@@ -7,11 +7,19 @@ from pathlib import Path
 from PyQt6.QtWidgets import QFileDialog, QMessageBox
 from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
 from PyQt6.QtGui import QTextDocument
+from app.core.large_file import MappedFile
+from app.core.file_loader import FileLoader
+from app.core.batch_open import BatchOpener, expand_paths
+from app.core.save_pipeline import write_document
+from app.core.compression import detect_compression, compression_for_path
+from app.core.encoding import get_encoding_detector, is_ascii_compatible
+from app.utils.constants import LARGE_FILE_THRESHOLD, LOAD_ASYNC_THRESHOLD
 class FileManager:
     """Управление файлами (открытие, сохранение, печать)"""
    
     def __init__(self, editor):
         self.editor = editor
+        self.batch_openers = []
        
     def new_file(self):
         """Создание нового файла"""
@@ -19,41 +27,56 @@ class FileManager:
         current_data = self.editor.get_current_tab_data()
        
         # Если текущая вкладка пуста, используем её
-        if current_data and not current_data['modified'] and not current_data['file_path']:
+        if current_data and not current_data.modified and not current_data.file_path:
             return
        
         self.editor.new_tab()
        
-    def open_file(self, file_path=None):
-        """Открытие файла"""
+    def open_file(self, file_path=None, line=None):
+        """Открытие файла (и переход к строке line, если она указана)"""
         if not file_path:
-            file_path, _ = QFileDialog.getOpenFileName(
+            file_paths, _ = QFileDialog.getOpenFileNames(
                 self.editor,
-                "Открыть файл",
+                "Открыть файлы",
                 "",
                 ";;".join([f"{name} ({ext})" for name, ext in __import__('app.utils.constants', fromlist=['SUPPORTED_FILES']).SUPPORTED_FILES])
             )
+            self.open_files(file_paths)
+            return
        
         if file_path:
+            # При переходе к строке уже открытый файл не открываем повторно
+            if line is not None and self.show_open_file(file_path, line):
+                return
             try:
-                # Пробуем разные кодировки
-                encodings = ['utf-8', 'cp1251', 'iso-8859-1', 'windows-1252']
-                content = None
+                # Сжатые файлы распаковываются потоком в фоновом загрузчике
+                compression = detect_compression(file_path)
+                if compression:
+                    self.load_file_async(file_path, compression, line)
+                    return
+               
+                file_size = os.path.getsize(file_path)
+                if file_size >= LARGE_FILE_THRESHOLD:
+                    encoding = get_encoding_detector().detect_file(file_path)
+                    # Индекс строк ищет байт '\n', поэтому UTF-16/32 так не открыть
+                    if is_ascii_compatible(encoding):
+                        self.open_large_file(file_path, encoding)
+                        if line is not None:
+                            self.editor.editor_commands.go_to_line(self.editor.get_current_large_view(), line)
+                        return
                
-                for encoding in encodings:
-                    try:
-                        with open(file_path, 'r', encoding=encoding) as f:
-                            content = f.read()
-                        break
-                    except UnicodeDecodeError:
-                        continue
+                if file_size >= LOAD_ASYNC_THRESHOLD:
+                    self.load_file_async(file_path, line=line)
+                    return
                
-                if content is None:
-                    with open(file_path, 'rb') as f:
-                        content = f.read().decode('latin-1')
+                content, encoding = get_encoding_detector().read_text(file_path)
                
                 # Создаем новую вкладку
-                self.editor.new_tab(file_path, content)
+                tab_index = self.editor.new_tab(file_path, content, encoding)
+                self.editor.set_modified(self.editor.get_tab_data(tab_index), False)
+                self.editor.file_watch_service.track(file_path)
+                if line is not None:
+                    self.editor.editor_commands.go_to_line(self.editor.get_current_text_edit(), line)
                
             except Exception as e:
                 QMessageBox.critical(
@@ -62,24 +85,201 @@ class FileManager:
                     f"Не удалось открыть файл:\n{str(e)}"
                 )
                
+    def show_open_file(self, file_path, line):
+        """Перейти к строке файла, если он уже открыт, вернуть True при успехе"""
+        path = os.path.abspath(file_path)
+        for tab_data in self.editor.tabs:
+            if tab_data.file_path and os.path.abspath(tab_data.file_path) == path:
+                self.editor.tab_widget.setCurrentWidget(tab_data.text_edit)
+                if tab_data.loader:
+                    tab_data.goto_line = line
+                else:
+                    self.editor.editor_commands.go_to_line(tab_data.text_edit, line)
+                return True
+        return False
+       
+    def open_files(self, paths):
+        """Открытие нескольких файлов и папок (чтение идет пулом потоков)"""
+        entries = expand_paths(paths)
+        if not entries:
+            return
+        if len(entries) == 1 and not entries[0][1]:
+            self.open_file(entries[0][0])
+            return
+       
+        opener = BatchOpener(self, entries, self.editor)
+        self.batch_openers.append(opener)
+        opener.finished.connect(lambda: self.on_batch_finished(opener))
+        opener.start()
+       
+    def on_batch_finished(self, opener):
+        """Завершение пакетного открытия"""
+        self.batch_openers.remove(opener)
+        opener.deleteLater()
+        if opener.errors:
+            shown = "\n".join(opener.errors[:10])
+            more = len(opener.errors) - 10
+            if more > 0:
+                shown += f"\n... и еще {more}"
+            QMessageBox.warning(
+                self.editor,
+                "Ошибка",
+                f"Не удалось открыть некоторые файлы:\n{shown}"
+            )
+           
+    def open_large_file(self, file_path, encoding=None):
+        """Открытие большого файла в режиме просмотра через mmap"""
+        if encoding is None:
+            encoding = get_encoding_detector().detect_file(file_path)
+        if encoding == 'utf-8-sig':
+            encoding = 'utf-8'
+        mapped_file = MappedFile(file_path, encoding)
+        self.editor.new_large_file_tab(file_path, mapped_file)
+        self.editor.statusbar_manager.set_text(
+            f"Большой файл открыт только для чтения: {Path(file_path).name}"
+        )
+               
+    def load_file_async(self, file_path, compression=None, line=None):
+        """Фоновая загрузка файла в новую вкладку"""
+        tab_index = self.editor.new_tab(file_path, compression=compression)
+        self.start_loader(self.editor.get_tab_data(tab_index), compression, line)
+       
+    def start_loader(self, tab_data, compression=None, line=None):
+        """Фоновая загрузка файла вкладки в её документ"""
+        file_path = tab_data.file_path
+        tab_data.compression = compression
+        if line is not None:
+            tab_data.goto_line = line
+        text_edit = tab_data.text_edit
+        text_edit.setReadOnly(True)
+        self.editor.edit_journal.suspend(tab_data)
+       
+        loader = FileLoader(file_path, text_edit.document(), compression, text_edit)
+        tab_data.loader = loader
+        loader.progress_changed.connect(lambda progress: self.on_load_progress(text_edit))
+        loader.finished.connect(lambda encoding: self.on_load_finished(text_edit, encoding))
+        loader.failed.connect(lambda error: self.on_load_failed(text_edit, error))
+        loader.start()
+        self.editor.update_tab_label(text_edit)
+       
+    def load_into_tab(self, tab_data, background=False):
+        """Прочитать файл в уже созданную вкладку (отложенное открытие)
+
+        При background файл любого размера читается фоновым загрузчиком.
+        """
+        file_path = tab_data.file_path
+        text_edit = tab_data.text_edit
+        try:
+            compression = detect_compression(file_path)
+            if background or compression or os.path.getsize(file_path) >= LOAD_ASYNC_THRESHOLD:
+                self.start_loader(tab_data, compression)
+                return
+            content, encoding = get_encoding_detector().read_text(file_path)
+        except Exception as e:
+            self.editor.discard_tab(text_edit)
+            self.editor.statusbar_manager.set_text(f"Не удалось открыть файл {file_path}: {e}")
+            return
+        text_edit.setPlainText(content)
+        tab_data.encoding = encoding
+        self.editor.set_modified(tab_data, False)
+        self.editor.file_watch_service.track(file_path)
+       
+    def on_load_progress(self, text_edit):
+        """Обновление индикатора загрузки"""
+        self.editor.ui_scheduler.mark_tab(text_edit)
+        if text_edit is self.editor.get_current_text_edit():
+            self.editor.ui_scheduler.mark_status()
+           
+    def on_load_finished(self, text_edit, encoding):
+        """Завершение фоновой загрузки"""
+        tab_data = self.editor.get_tab_data_for_widget(text_edit)
+        if not tab_data:
+            return
+        tab_data.loader = None
+        tab_data.encoding = encoding
+        text_edit.setReadOnly(False)
+        self.editor.file_watch_service.track(tab_data.file_path)
+        self.editor.set_modified(tab_data, False)
+        self.editor.edit_journal.resume(tab_data)
+        self.editor.ui_scheduler.mark_all(text_edit)
+        if tab_data.goto_line:
+            self.editor.editor_commands.go_to_line(text_edit, tab_data.goto_line)
+            tab_data.goto_line = None
+        else:
+            tab_data.restore_view()
+           
+    def on_load_failed(self, text_edit, error):
+        """Ошибка фоновой загрузки"""
+        self.editor.discard_tab(text_edit)
+        QMessageBox.critical(
+            self.editor,
+            "Ошибка",
+            f"Не удалось открыть файл:\n{error}"
+        )
+       
+    def cancel_loading(self):
+        """Отменить загрузку файла в текущей вкладке"""
+        current_data = self.editor.get_current_tab_data()
+        if current_data and current_data.loader:
+            current_data.loader.cancel()
+            self.editor.discard_tab(current_data.text_edit)
+            self.editor.statusbar_manager.set_text("Загрузка отменена")
+           
+    def can_save(self, tab_data):
+        """Проверка, что вкладку можно сохранить"""
+        if tab_data.large_file:
+            self.editor.statusbar_manager.set_text("Большой файл открыт только для чтения")
+            return False
+        if tab_data.loader:
+            self.editor.statusbar_manager.set_text("Дождитесь окончания загрузки файла")
+            return False
+        return True
+       
+    def write_tab(self, tab_data, file_path, compression=None):
+        """Записать документ вкладки в файл в её кодировке (и формате сжатия)
+
+        Возвращает хеш записанного текста или None, если запись отменена.
+        """
+        document = tab_data.text_edit.document()
+        encoding = tab_data.encoding
+        # Автосохранение, снятое до этой записи, файл уже не перезапишет
+        with self.editor.autosave_manager.file_lock(file_path):
+            return self._write_tab(tab_data, document, file_path, encoding, compression)
+       
+    def _write_tab(self, tab_data, document, file_path, encoding, compression):
+        try:
+            return write_document(document, file_path, encoding, compression)
+        except UnicodeEncodeError:
+            reply = QMessageBox.question(
+                self.editor,
+                "Кодировка",
+                f"Текст содержит символы, которых нет в кодировке {encoding}.\n"
+                f"Сохранить файл в UTF-8?"
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return None
+            digest = write_document(document, file_path, 'utf-8', compression)
+            tab_data.encoding = 'utf-8'
+            return digest
+       
     def save_file(self):
         """Сохранение текущего файла"""
         current_data = self.editor.get_current_tab_data()
-        if not current_data:
+        if not current_data or not self.can_save(current_data):
             return
        
-        file_path = current_data['file_path']
+        file_path = current_data.file_path
        
         if file_path:
             try:
-                text_edit = current_data['text_edit']
-                content = text_edit.toPlainText()
-               
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                if not self.editor.file_watch_service.confirm_overwrite(file_path):
+                    return
+                digest = self.write_tab(current_data, file_path, current_data.compression)
+                if digest is None:
+                    return
+                self.editor.file_watch_service.track(file_path)
                
-                current_data['modified'] = False
-                self.editor.update_window_title()
+                self.editor.set_modified(current_data, False, digest)
                 self.editor.statusbar_manager.set_text("Файл сохранен")
                
             except Exception as e:
@@ -93,6 +293,10 @@ class FileManager:
            
     def save_as_file(self):
         """Сохранение файла с новым именем"""
+        current_data = self.editor.get_current_tab_data()
+        if not current_data or not self.can_save(current_data):
+            return
+       
         file_path, _ = QFileDialog.getSaveFileName(
             self.editor,
             "Сохранить файл как",
@@ -102,23 +306,20 @@ class FileManager:
        
         if file_path:
             try:
-                text_edit = self.editor.get_current_text_edit()
-                content = text_edit.toPlainText()
+                # Формат сжатия при сохранении под новым именем задает расширение
+                compression = compression_for_path(file_path)
+                digest = self.write_tab(current_data, file_path, compression)
+                if digest is None:
+                    return
+                self.editor.file_watch_service.track(file_path)
                
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                current_data.file_path = file_path
+                current_data.compression = compression
+                current_data.name = Path(file_path).name
                
-                current_data = self.editor.get_current_tab_data()
-                if current_data:
-                    current_data['file_path'] = file_path
-                    current_data['modified'] = False
-                    current_data['name'] = Path(file_path).name
-                   
-                    # Обновляем вкладку
-                    current_index = self.editor.tab_widget.currentIndex()
-                    self.editor.tab_widget.setTabText(current_index, current_data['name'])
-                   
-                self.editor.update_window_title()
+                # Обновляем вкладку и заголовок
+                self.editor.set_modified(current_data, False, digest)
+                self.editor.ui_scheduler.mark_all(current_data.text_edit)
                 self.editor.statusbar_manager.set_text("Файл сохранен")
                
             except Exception as e:
@@ -0,0 +1,280 @@
+"""
+Поиск по файлам папки пулом процессов
+"""
+import fnmatch
+import multiprocessing
+import os
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from PyQt6.QtCore import QObject, pyqtSignal
+from app.core.batch_open import is_binary
+from app.core.compression import MAGIC
+from app.core.encoding import get_encoding_detector
+from app.core.search_engine import get_search_engine
+from app.core.trigram_index import TrigramIndex, text_trigrams, query_trigrams
+from app.utils.constants import (FIND_FILES_MAX_WORKERS, FIND_FILES_BATCH, FIND_FILES_MAX_SIZE,
+                                 FIND_FILES_MAX_MATCHES, FIND_FILES_PREVIEW)
+
+
+def split_globs(text):
+    """Список масок из строки вида '*.py; *.txt'"""
+    return [glob.strip() for glob in text.replace(',', ';').split(';') if glob.strip()]
+
+
+def iter_files(root, include=(), exclude=()):
+    """Файлы папки, подходящие под маски include и не попадающие под exclude
+
+    Маски исключения проверяются и для имен, и для путей относительно
+    root, так что исключить можно и папку целиком ('build', 'docs/*').
+    """
+    def excluded(name, relative):
+        return any(fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(relative, glob) for glob in exclude)
+
+    for directory, dirs, files in os.walk(root):
+        relative_dir = os.path.relpath(directory, root)
+        dirs[:] = sorted(
+            name for name in dirs
+            if not excluded(name, os.path.normpath(os.path.join(relative_dir, name)))
+        )
+        for name in sorted(files):
+            relative = os.path.normpath(os.path.join(relative_dir, name))
+            if include and not any(fnmatch.fnmatch(name, glob) for glob in include):
+                continue
+            if not excluded(name, relative):
+                yield os.path.join(directory, name)
+
+
+def find_lines(text, pattern, limit=FIND_FILES_MAX_MATCHES):
+    """Совпадения как (номер строки, колонка, строка) с нумерацией от 1"""
+    results = []
+    line = 0
+    line_start = 0
+    position = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        if text.count('\n', start, end):
+            return _find_lines_split(text, pattern, limit)
+        newlines = text.count('\n', position, start)
+        if newlines:
+            line += newlines
+            line_start = text.rfind('\n', 0, start) + 1
+        position = start
+        line_end = text.find('\n', start)
+        preview = text[line_start:line_end if line_end >= 0 else len(text)]
+        results.append((line + 1, start - line_start + 1, preview[:FIND_FILES_PREVIEW]))
+        if len(results) >= limit:
+            break
+    return results
+
+
+def _find_lines_split(text, pattern, limit):
+    results = []
+    for number, line in enumerate(text.split('\n'), 1):
+        for match in pattern.finditer(line):
+            if match.start() != match.end():
+                results.append((number, match.start() + 1, line[:FIND_FILES_PREVIEW]))
+                if len(results) >= limit:
+                    return results
+    return results
+
+
+def read_text_file(path):
+    """Текст файла и его stat; текст None для двоичных, сжатых и больших файлов"""
+    try:
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size > FIND_FILES_MAX_SIZE:
+                return None, stat
+            data = f.read()
+    except OSError:
+        return None, None
+    if is_binary(data) or any(data.startswith(magic) for magic, _ in MAGIC):
+        return None, stat
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    return get_encoding_detector().decode(data, key)[0], stat
+
+
+def search_file(path, pattern):
+    """Совпадения в одном файле, пустой список для двоичных и больших файлов"""
+    text, _ = read_text_file(path)
+    return find_lines(text, pattern) if text is not None else []
+
+
+def search_files_task(paths, query, index=False):
+    """Задание для процесса пула: query - аргументы SearchEngine.compile
+
+    С index=True для каждого файла возвращаются и его триграммы
+    (путь, mtime_ns, размер, байты массива) для обновления индекса.
+    """
+    pattern = get_search_engine().compile(*query)
+    results = []
+    entries = []
+    for path in paths:
+        text, stat = read_text_file(path)
+        if text is not None:
+            for line, column, preview in find_lines(text, pattern):
+                results.append((path, line, column, preview))
+        if index and stat is not None:
+            trigrams = text_trigrams(text) if text is not None else array('I')
+            entries.append((path, stat.st_mtime_ns, stat.st_size, trigrams.tobytes()))
+    return len(paths), results, entries
+
+
+_pool = None
+
+
+def get_search_pool():
+    """Общий пул процессов поиска, создается при первом поиске
+
+    Процессы запускаются через spawn: fork процесса с потоками Qt
+    небезопасен, а пул переиспользуется, так что запуск платится раз.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=min(FIND_FILES_MAX_WORKERS, os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def shutdown_search_pool():
+    """Остановить пул при выходе из программы"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class FileSearch(QObject):
+    """Один поиск по папке: обход в потоке, проверка файлов в пуле процессов
+
+    С индексом неизмененные файлы, в которых не может быть совпадения,
+    не читаются вовсе, а новые и измененные проверяются целиком и заодно
+    переиндексируются. Базу индекса трогает только поток обхода.
+    """
+
+    results_ready = pyqtSignal(list)
+    progress_changed = pyqtSignal(int, int)
+    finished = pyqtSignal(bool)
+    _task_done = pyqtSignal(object)
+
+    def __init__(self, root, query, include=(), exclude=(), use_index=False, parent=None):
+        super().__init__(parent)
+        self.root = os.path.abspath(root)
+        self.query = query
+        self.include = include
+        self.exclude = exclude
+        self.use_index = use_index
+        self.files_total = 0
+        self.files_done = 0
+        self.files_skipped = 0
+        self._futures = set()
+        self._walking = True
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._finished = False
+        # Сигнал испускается из потоков и доставляется в GUI-поток
+        self._task_done.connect(self._on_task_done)
+
+    def start(self):
+        threading.Thread(target=self._walk, daemon=True).start()
+
+    def cancel(self):
+        self._cancelled = True
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def _walk(self):
+        pool = get_search_pool()
+        try:
+            if self.use_index:
+                self._walk_indexed(pool)
+            else:
+                self._submit_all(pool, iter_files(self.root, self.include, self.exclude))
+        finally:
+            with self._lock:
+                self._walking = False
+            self._task_done.emit(None)
+
+    def _submit_all(self, pool, paths, index=False):
+        """Отправить файлы в пул порциями, вернуть список заданий"""
+        futures = []
+        batch = []
+        for path in paths:
+            if self._cancelled:
+                break
+            batch.append(path)
+            if len(batch) >= FIND_FILES_BATCH:
+                futures.append(self._submit(pool, batch, index))
+                batch = []
+        if batch and not self._cancelled:
+            futures.append(self._submit(pool, batch, index))
+        return futures
+
+    def _walk_indexed(self, pool):
+        index = TrigramIndex(self.root)
+        try:
+            seen = set()
+            current = []
+            changed = []
+            for path in iter_files(self.root, self.include, self.exclude):
+                if self._cancelled:
+                    return
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                (current if index.is_current(path, stat) else changed).append(path)
+
+            # Новые и измененные файлы проверяются целиком и переиндексируются
+            futures = self._submit_all(pool, changed, index=True)
+            text, _, _, regex = self.query
+            candidates = index.candidates(query_trigrams(text, regex))
+            if candidates is not None:
+                self.files_skipped = len(current) - len(candidates & set(current))
+                current = [path for path in current if path in candidates]
+            self._submit_all(pool, current)
+
+            wait(futures)
+            if self._cancelled:
+                return
+            for future in futures:
+                if not future.cancelled() and future.exception() is None:
+                    for path, mtime_ns, size, data in future.result()[2]:
+                        trigrams = array('I')
+                        trigrams.frombytes(data)
+                        index.update(path, mtime_ns, size, trigrams)
+            index.remove_missing(seen)
+        finally:
+            index.close()
+
+    def _submit(self, pool, batch, index=False):
+        future = pool.submit(search_files_task, batch, self.query, index)
+        with self._lock:
+            self.files_total += len(batch)
+            self._futures.add(future)
+        future.add_done_callback(self._task_done.emit)
+        return future
+
+    def _on_task_done(self, future):
+        if future is not None:
+            with self._lock:
+                self._futures.discard(future)
+            if not future.cancelled() and future.exception() is None:
+                searched, results, _ = future.result()
+                self.files_done += searched
+                if results and not self._cancelled:
+                    self.results_ready.emit(results)
+        with self._lock:
+            done = not self._walking and not self._futures
+        self.progress_changed.emit(self.files_done, self.files_total)
+        if done and not self._finished:
+            self._finished = True
+            self.finished.emit(self._cancelled)
@@ -0,0 +1,422 @@
+"""
+Режим просмотра больших файлов через отображение в память (mmap)
+"""
+import mmap
+import os
+import re
+import time
+from bisect import bisect_left
+from PyQt6.QtWidgets import QAbstractScrollArea
+from PyQt6.QtCore import Qt, QTimer, QRect, pyqtSignal
+from PyQt6.QtGui import QPainter, QColor, QFont
+from app.utils.constants import (LARGE_FILE_INDEX_CHUNK, LARGE_FILE_INDEX_STEP,
+                                 LARGE_FILE_MAX_LINE, LARGE_FILE_SEARCH_WINDOW,
+                                 LARGE_FILE_SEARCH_OVERLAP, LARGE_FILE_SEARCH_SLICE,
+                                 DEFAULT_FONT)
+
+
+class MappedFile:
+    """Файл, отображенный в память, с ленивым индексом строк
+
+    Индекс хранит для каждого блока по LARGE_FILE_INDEX_CHUNK байт число
+    переводов строк перед его началом, поэтому занимает несколько сотен
+    килобайт даже для многогигабайтного файла. Строка внутри блока
+    находится последовательным поиском от начала блока.
+
+    Чтение отображения за концом усеченного файла завершает процесс по
+    SIGBUS, поэтому перед чтением вызывается refresh().
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, 'rb')
+        self._mm = None
+        self._map()
+
+    def _map(self):
+        """Отобразить файл текущего размера и начать индекс заново"""
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # _chunk_lines[i] - число '\n' до смещения i * LARGE_FILE_INDEX_CHUNK
+        self._chunk_lines = [0]
+        self._indexed = 0
+
+    def refresh(self):
+        """Отобразить файл заново, если его размер изменился, вернуть True если так"""
+        if os.fstat(self._file.fileno()).st_size == self.size:
+            return False
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        try:
+            self._map()
+        except (OSError, ValueError):
+            # Без отображения файл показывается пустым
+            self.size = 0
+            self._chunk_lines = [0]
+            self._indexed = 0
+        return True
+
+    def close(self):
+        """Освободить отображение и файл"""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    @property
+    def index_complete(self):
+        return self._indexed >= self.size
+
+    def index_step(self, budget=LARGE_FILE_INDEX_STEP):
+        """Проиндексировать очередную порцию файла, вернуть True по завершении"""
+        end = min(self.size, self._indexed + budget)
+        while self._indexed < end:
+            chunk_end = min(self.size, self._indexed + LARGE_FILE_INDEX_CHUNK)
+            count = self._mm[self._indexed:chunk_end].count(b'\n')
+            self._chunk_lines.append(self._chunk_lines[-1] + count)
+            self._indexed = chunk_end
+        return self.index_complete
+
+    def line_count(self):
+        """Число строк (оценка, пока индекс не построен полностью)"""
+        if self.index_complete:
+            return self._chunk_lines[-1] + 1
+        if not self._indexed:
+            return 1
+        return max(self._chunk_lines[-1] + 1,
+                   int(self._chunk_lines[-1] * self.size / self._indexed))
+
+    def _ensure_line_indexed(self, line):
+        while not self.index_complete and self._chunk_lines[-1] <= line:
+            self.index_step()
+
+    def _ensure_offset_indexed(self, offset):
+        while not self.index_complete and self._indexed <= offset:
+            self.index_step()
+
+    def line_offset(self, line):
+        """Смещение начала строки (нумерация с нуля)"""
+        if self._mm is None or line <= 0:
+            return 0
+        self._ensure_line_indexed(line)
+        line = min(line, self._chunk_lines[-1])
+        # Строка начинается в последнем блоке, перед которым меньше line переводов
+        chunk = bisect_left(self._chunk_lines, line) - 1
+        pos = chunk * LARGE_FILE_INDEX_CHUNK
+        for _ in range(line - self._chunk_lines[chunk]):
+            pos = self._mm.find(b'\n', pos) + 1
+        return pos
+
+    def line_at_offset(self, offset):
+        """Номер строки, содержащей заданное смещение"""
+        if self._mm is None:
+            return 0
+        offset = max(0, min(offset, self.size))
+        self._ensure_offset_indexed(offset)
+        chunk = offset // LARGE_FILE_INDEX_CHUNK
+        start = chunk * LARGE_FILE_INDEX_CHUNK
+        return self._chunk_lines[chunk] + self._mm[start:offset].count(b'\n')
+
+    def _line_end(self, pos):
+        end = self._mm.find(b'\n', pos)
+        return self.size if end == -1 else end
+
+    def decode(self, data):
+        text = data.decode(self.encoding, errors='replace')
+        return text[:-1] if text.endswith('\r') else text
+
+    def lines(self, first, count):
+        """Декодировать count строк начиная с first"""
+        if self._mm is None:
+            return [''] if first == 0 else []
+        result = []
+        self._ensure_line_indexed(first)
+        if first > self._chunk_lines[-1]:
+            return result
+        pos = self.line_offset(first)
+        while len(result) < count and pos <= self.size:
+            end = self._line_end(pos)
+            result.append(self.decode(self._mm[pos:min(end, pos + LARGE_FILE_MAX_LINE)]))
+            if end >= self.size:
+                break
+            pos = end + 1
+        return result
+
+    def column_of(self, offset):
+        """Номер строки и колонка (в символах) для смещения"""
+        line = self.line_at_offset(offset)
+        start = self.line_offset(line)
+        return line, len(self._mm[start:offset].decode(self.encoding, errors='replace'))
+
+    def compile_search(self, text, case_sensitive=False, whole_words=False, regex=False):
+        """Скомпилировать байтовый шаблон для поиска по отображению"""
+        pattern = text.encode(self.encoding, errors='replace')
+        if not regex:
+            pattern = re.escape(pattern)
+        if whole_words:
+            pattern = rb'\b(?:' + pattern + rb')\b'
+        return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+    def iter_search(self, pattern, start, backward=False):
+        """Поиск порциями по LARGE_FILE_SEARCH_WINDOW байт
+
+        После каждой просмотренной порции без совпадения выдает None,
+        найденное совпадение - как (начало, конец) в байтах, после чего
+        останавливается. Порции перекрываются на LARGE_FILE_SEARCH_OVERLAP,
+        так что совпадение на их границе не теряется, если оно не длиннее.
+        """
+        mm = self._mm
+        if mm is None:
+            return
+        if not backward:
+            pos = start
+            while pos < self.size:
+                window_end = pos + LARGE_FILE_SEARCH_WINDOW
+                match = pattern.search(mm, pos, window_end + LARGE_FILE_SEARCH_OVERLAP)
+                # Совпадение из перекрытия найдет и следующая порция, а до него
+                # может быть более раннее, не поместившееся в эту
+                if match and match.start() < window_end:
+                    yield match.span()
+                    return
+                pos = window_end
+                yield None
+            return
+        end = start
+        while end > 0:
+            begin = max(0, end - LARGE_FILE_SEARCH_WINDOW)
+            last = None
+            for match in pattern.finditer(mm, begin, min(start, end + LARGE_FILE_SEARCH_OVERLAP)):
+                if match.start() >= end:
+                    break
+                last = match
+            if last:
+                yield last.span()
+                return
+            end = begin
+            yield None
+
+
+class LargeFileView(QAbstractScrollArea):
+    """Просмотр большого файла только для чтения
+
+    Декодируются и отрисовываются только видимые строки, поэтому
+    расход памяти пропорционален размеру окна, а не файла.
+    """
+
+    cursorPositionChanged = pyqtSignal()
+    # Размер файла изменился, и он отображен заново
+    fileChanged = pyqtSignal()
+    # Поиск, начатый find(), закончен: найдено ли совпадение
+    searchFinished = pyqtSignal(bool)
+
+    def __init__(self, mapped_file, parent=None):
+        super().__init__(parent)
+        self.mapped_file = mapped_file
+        self.current_line = 0
+        self.match = None  # (строка, начало, конец) в символах
+        self._match_bytes = None
+        self.setFont(QFont(DEFAULT_FONT[0], DEFAULT_FONT[1]))
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+
+        # Индекс строк достраивается в фоне порциями
+        self.index_timer = QTimer(self)
+        self.index_timer.timeout.connect(self._index_step)
+        self.index_timer.start(0)
+        self.update_scrollbars()
+
+        # Поиск идет порциями по таймеру, чтобы не останавливать интерфейс
+        self._search = None
+        self.search_timer = QTimer(self)
+        self.search_timer.timeout.connect(self._search_step)
+
+    def check_file(self):
+        """Перед чтением отображения: отобразить файл заново, если его изменили"""
+        try:
+            changed = self.mapped_file.refresh()
+        except OSError:
+            return
+        if not changed:
+            return
+        # Смещения найденного и начатого поиска относятся к прежнему файлу
+        self.cancel_search()
+        self.match = None
+        self._match_bytes = None
+        self.current_line = min(self.current_line, max(0, self.mapped_file.line_count() - 1))
+        self.index_timer.start(0)
+        self.update_scrollbars()
+        self.viewport().update()
+        self.fileChanged.emit()
+
+    def _index_step(self):
+        self.check_file()
+        if self.mapped_file.index_step():
+            self.index_timer.stop()
+        self.update_scrollbars()
+
+    def line_height(self):
+        return self.fontMetrics().lineSpacing()
+
+    def visible_line_count(self):
+        return max(1, self.viewport().height() // self.line_height())
+
+    def update_scrollbars(self):
+        """Пересчитать диапазоны полос прокрутки"""
+        vbar = self.verticalScrollBar()
+        page = self.visible_line_count()
+        vbar.setPageStep(page)
+        vbar.setRange(0, max(0, self.mapped_file.line_count() - page))
+        hbar = self.horizontalScrollBar()
+        hbar.setPageStep(self.viewport().width())
+        hbar.setSingleStep(self.fontMetrics().horizontalAdvance('M'))
+        hbar.setRange(0, self.fontMetrics().horizontalAdvance('M') * LARGE_FILE_MAX_LINE)
+
+    def first_visible_line(self):
+        return self.verticalScrollBar().value()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbars()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == event.Type.FontChange:
+            self.update_scrollbars()
+            self.viewport().update()
+
+    def paintEvent(self, event):
+        self.check_file()
+        painter = QPainter(self.viewport())
+        palette = self.palette()
+        painter.fillRect(self.viewport().rect(), palette.base())
+
+        first = self.first_visible_line()
+        height = self.line_height()
+        ascent = self.fontMetrics().ascent()
+        x = -self.horizontalScrollBar().value() + 4
+        width = self.viewport().width()
+        highlight = QColor(palette.highlight().color())
+        highlight.setAlpha(90)
+        current = QColor(highlight)
+        current.setAlpha(35)
+
+        painter.setPen(palette.text().color())
+        for row, text in enumerate(self.mapped_file.lines(first, self.visible_line_count() + 1)):
+            line = first + row
+            top = row * height
+            if line == self.current_line:
+                painter.fillRect(QRect(0, top, width, height), current)
+            if self.match and self.match[0] == line:
+                metrics = self.fontMetrics()
+                left = x + metrics.horizontalAdvance(text[:self.match[1]])
+                right = x + metrics.horizontalAdvance(text[:self.match[2]])
+                painter.fillRect(QRect(left, top, right - left, height), highlight)
+            painter.drawText(x, top + ascent, text)
+        painter.end()
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        ctrl = event.modifiers() & Qt.KeyboardModifier.ControlModifier
+        page = self.visible_line_count()
+        if key == Qt.Key.Key_Up:
+            self.set_current_line(self.current_line - 1)
+        elif key == Qt.Key.Key_Down:
+            self.set_current_line(self.current_line + 1)
+        elif key == Qt.Key.Key_PageUp:
+            self.set_current_line(self.current_line - page)
+        elif key == Qt.Key.Key_PageDown:
+            self.set_current_line(self.current_line + page)
+        elif key == Qt.Key.Key_Home and ctrl:
+            self.set_current_line(0)
+        elif key == Qt.Key.Key_End and ctrl:
+            self.check_file()
+            while not self.mapped_file.index_step():
+                pass
+            self.update_scrollbars()
+            self.set_current_line(self.mapped_file.line_count() - 1)
+        else:
+            super().keyPressEvent(event)
+
+    def mousePressEvent(self, event):
+        self.set_current_line(self.first_visible_line() + int(event.position().y()) // self.line_height())
+
+    def set_current_line(self, line):
+        """Сделать строку текущей и прокрутить к ней"""
+        line = max(0, min(line, self.mapped_file.line_count() - 1))
+        self.current_line = line
+        first = self.first_visible_line()
+        page = self.visible_line_count()
+        if line < first:
+            self.verticalScrollBar().setValue(line)
+        elif line >= first + page:
+            self.verticalScrollBar().setValue(line - page + 1)
+        self.viewport().update()
+        self.cursorPositionChanged.emit()
+
+    def goto_line(self, line):
+        """Перейти к строке (нумерация с единицы)"""
+        self.check_file()
+        self.mapped_file._ensure_line_indexed(line)
+        self.update_scrollbars()
+        self.verticalScrollBar().setValue(max(0, line - 1 - self.visible_line_count() // 2))
+        self.set_current_line(line - 1)
+
+    def find(self, text, backward=False, case_sensitive=False, whole_words=False, regex=False):
+        """Начать поиск текста в отображенном файле
+
+        Ошибка в выражении (re.error) возникает сразу, а итог поиска
+        сообщает сигнал searchFinished. Новый поиск отменяет прежний.
+        """
+        self.check_file()
+        pattern = self.mapped_file.compile_search(text, case_sensitive, whole_words, regex)
+        self.cancel_search()
+        if self._match_bytes and self.match and self.match[0] == self.current_line:
+            start = self._match_bytes[0] if backward else self._match_bytes[1]
+        else:
+            start = self.mapped_file.line_offset(self.current_line)
+        self._search = self._iter_find(pattern, start, backward)
+        self.search_timer.start(0)
+
+    def _iter_find(self, pattern, start, backward):
+        """Поиск от start, затем с начала (или с конца) файла"""
+        yield from self.mapped_file.iter_search(pattern, start, backward)
+        yield from self.mapped_file.iter_search(pattern, self.mapped_file.size if backward else 0, backward)
+
+    def cancel_search(self):
+        """Прервать начатый поиск без сигнала searchFinished"""
+        self.search_timer.stop()
+        self._search = None
+
+    def _search_step(self):
+        deadline = time.perf_counter() + LARGE_FILE_SEARCH_SLICE
+        try:
+            while time.perf_counter() < deadline:
+                span = next(self._search)
+                if span is not None:
+                    self.cancel_search()
+                    self._show_match(span)
+                    self.searchFinished.emit(True)
+                    return
+        except StopIteration:
+            self.cancel_search()
+            self.searchFinished.emit(False)
+        except (ValueError, OSError):
+            # Отображение закрыли вместе с вкладкой
+            self.cancel_search()
+
+    def _show_match(self, span):
+        """Выделить найденное совпадение и прокрутить к нему"""
+        self._match_bytes = span
+        line, begin = self.mapped_file.column_of(span[0])
+        _, end = self.mapped_file.column_of(span[1])
+        if end < begin:
+            end = begin
+        self.match = (line, begin, end)
+        self.update_scrollbars()
+        if not (self.first_visible_line() <= line < self.first_visible_line() + self.visible_line_count()):
+            self.verticalScrollBar().setValue(max(0, line - self.visible_line_count() // 2))
+        self.set_current_line(line)
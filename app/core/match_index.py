@@ -0,0 +1,233 @@
+"""
+Упорядоченный индекс совпадений поиска, исправляемый при правках
+"""
+import time
+from array import array
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from app.core.search_engine import document_text, text_matches, text_index, utf16_index
+from app.utils.constants import TAB_SEARCH_SLICE, TAB_SEARCH_CHUNK
+
+
+class MatchIndex(QObject):
+    """Позиции всех совпадений шаблона в документе
+
+    Позиции хранятся в отсортированном массиве. Правка пересканирует
+    только затронутые строки, а сдвиг хвоста откладывается: хвост с
+    индекса _shift_index считается сдвинутым на _shift_delta и реально
+    переписывается лишь на отрезке между соседними местами правок.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, document, pattern, matches=None):
+        super().__init__(document)
+        self.document = document
+        self.pattern = pattern
+        self._starts = array('q')
+        self._lengths = array('l')
+        self._shift_index = 0
+        self._shift_delta = 0
+        self._characters = document.characterCount()
+        if matches is None:
+            self.rebuild()
+        else:
+            # Совпадения уже найдены (MatchScan) для текущей версии документа
+            self._starts, self._lengths = matches
+            self._shift_index = len(self._starts)
+        # Без раскладки документ не испускает contentsChange
+        document.documentLayout()
+        document.contentsChange.connect(self.on_contents_change)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def rebuild(self):
+        """Полный пересчет по всему документу"""
+        starts, lengths = text_matches(document_text(self.document), self.pattern)
+        self._starts = array('q', starts)
+        self._lengths = array('l', lengths)
+        self._shift_index = len(self._starts)
+        self._shift_delta = 0
+        self._characters = self.document.characterCount()
+
+    def detach(self):
+        """Отключиться от документа"""
+        try:
+            self.document.contentsChange.disconnect(self.on_contents_change)
+        except (TypeError, RuntimeError):
+            pass
+        self.setParent(None)
+
+    def position(self, i):
+        """Позиция i-го совпадения в документе"""
+        if i >= self._shift_index:
+            return self._starts[i] + self._shift_delta
+        return self._starts[i]
+
+    def match(self, i):
+        """i-е совпадение как (позиция, длина)"""
+        return self.position(i), self._lengths[i]
+
+    def bisect(self, position):
+        """Номер первого совпадения, начинающегося не раньше позиции"""
+        low, high = 0, len(self._starts)
+        while low < high:
+            middle = (low + high) // 2
+            if self.position(middle) < position:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def next_index(self, position):
+        """Номер совпадения от позиции вперед с переходом на начало"""
+        if not self._starts:
+            return None
+        i = self.bisect(position)
+        return i if i < len(self._starts) else 0
+
+    def previous_index(self, position):
+        """Номер совпадения до позиции с переходом на конец"""
+        if not self._starts:
+            return None
+        i = self.bisect(position) - 1
+        return i if i >= 0 else len(self._starts) - 1
+
+    def index_of(self, position, length):
+        """Номер совпадения с точно такими границами или None"""
+        i = self.bisect(position)
+        if i < len(self._starts) and self.position(i) == position and self._lengths[i] == length:
+            return i
+        return None
+
+    def _move_shift(self, index):
+        """Перенести границу отложенного сдвига на index"""
+        starts, delta = self._starts, self._shift_delta
+        if delta:
+            if index > self._shift_index:
+                for i in range(self._shift_index, index):
+                    starts[i] += delta
+            else:
+                for i in range(index, self._shift_index):
+                    starts[i] -= delta
+        self._shift_index = index
+
+    def on_contents_change(self, position, removed, added):
+        characters = self.document.characterCount()
+        delta = characters - self._characters
+        self._characters = characters
+
+        # Совпадения не пересекают строк: пересканируем строки правки целиком
+        region_start = self.document.findBlock(position).position()
+        last_block = self.document.findBlock(min(position + added, characters - 1))
+        if not last_block.isValid():
+            self.rebuild()
+            self.changed.emit()
+            return
+        new_end = last_block.position() + last_block.length() - 1
+        old_end = new_end - delta
+
+        first = self.bisect(region_start)
+        last = self.bisect(old_end + 1)
+        self._move_shift(last)
+        self._shift_delta += delta
+
+        starts, lengths = text_matches(
+            document_text(self.document, region_start, new_end), self.pattern, region_start
+        )
+        self._starts[first:last] = array('q', starts)
+        self._lengths[first:last] = array('l', lengths)
+        self._shift_index = first + len(starts)
+        self.changed.emit()
+
+
+class MatchScan(QObject):
+    """Построение MatchIndex порциями в GUI-потоке, с возможностью отмены
+
+    За такт таймера просматривается не дольше TAB_SEARCH_SLICE. Если
+    передан previous - индекс запроса, который новый запрос продолжает,
+    - проверяются только места его совпадений: новое совпадение может
+    начаться лишь внутри одного из них. Правка документа во время
+    построения начинает его заново.
+    """
+
+    finished = pyqtSignal(object)
+    progress_changed = pyqtSignal(int)
+
+    def __init__(self, document, pattern, previous=None, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self.pattern = pattern
+        self.previous = previous
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._step)
+
+    def start(self):
+        self._restart()
+        self._timer.start(0)
+
+    def cancel(self):
+        self._timer.stop()
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def _restart(self):
+        self._revision = self.document.revision()
+        self._starts = array('q')
+        self._lengths = array('l')
+        self._next = 0
+        self._last_end = (-1, 0)
+
+    def _step(self):
+        if self.document.revision() != self._revision:
+            self._restart()
+        deadline = time.perf_counter() + TAB_SEARCH_SLICE
+        done = False
+        while not done and time.perf_counter() < deadline:
+            done = self._narrow_chunk() if self.previous is not None else self._scan_chunk()
+        self.progress_changed.emit(len(self._starts))
+        if done:
+            self._timer.stop()
+            self.finished.emit(MatchIndex(self.document, self.pattern, (self._starts, self._lengths)))
+
+    def _scan_chunk(self):
+        """Очередные TAB_SEARCH_CHUNK строк, True когда документ пройден"""
+        count = self.document.blockCount()
+        first = self.document.findBlockByNumber(self._next)
+        last_number = min(self._next + TAB_SEARCH_CHUNK, count) - 1
+        last = self.document.findBlockByNumber(last_number)
+        start = first.position()
+        starts, lengths = text_matches(
+            document_text(self.document, start, last.position() + last.length() - 1), self.pattern, start
+        )
+        self._starts.extend(starts)
+        self._lengths.extend(lengths)
+        self._next = last_number + 1
+        return self._next >= count
+
+    def _narrow_chunk(self):
+        """Проверить очередные места совпадений previous"""
+        previous = self.previous
+        end = min(self._next + TAB_SEARCH_CHUNK, len(previous))
+        block = None
+        for i in range(self._next, end):
+            position, length = previous.match(i)
+            if block is None or not block.position() <= position < block.position() + block.length():
+                block = self.document.findBlock(position)
+                text = block.text()
+            base = block.position()
+            begin = text_index(text, position - base)
+            stop = text_index(text, position + length - base)
+            # Совпадения не перекрываются, как у finditer
+            skip = self._last_end[1] if self._last_end[0] == base else 0
+            for offset in range(max(begin, skip), stop):
+                match = self.pattern.match(text, offset)
+                if match and match.end() > match.start():
+                    first = utf16_index(text, offset)
+                    self._starts.append(base + first)
+                    self._lengths.append(utf16_index(text, match.end()) - first)
+                    self._last_end = (base, match.end())
+                    break
+        self._next = end
+        return end >= len(previous)
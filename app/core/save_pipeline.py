@@ -0,0 +1,124 @@
+"""
+Потоковое атомарное сохранение документов
+"""
+import codecs
+import hashlib
+import os
+import shutil
+import tempfile
+from app.core.compression import open_compressed_writer
+from app.utils.constants import SAVE_CHUNK_CHARS, SAVE_BUFFER_SIZE
+
+# umask процесса читается один раз при импорте: узнать его можно только
+# сменой, а сохранения идут и из фоновых потоков
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def text_digest(chunks):
+    """Хеш текста, заданного порциями (не зависит от разбиения)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        digest.update(chunk.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+def document_digest(document):
+    """Хеш текста документа в том виде, в каком он пишется в файл"""
+    return text_digest(iter_document_chunks(document))
+
+
+def iter_document_chunks(document, chunk_chars=SAVE_CHUNK_CHARS):
+    """Текст документа порциями по блокам, без полной копии через toPlainText()
+
+    Разрыв строки внутри абзаца (Shift+Enter) хранится в блоке как U+2028
+    и, как и в toPlainText(), записывается обычным переводом строки.
+    """
+    parts = []
+    size = 0
+    block = document.begin()
+    while block.isValid():
+        text = block.text()
+        block = block.next()
+        if block.isValid():
+            text += '\n'
+        parts.append(text)
+        size += len(text)
+        if size >= chunk_chars:
+            yield ''.join(parts).replace('\u2028', '\n')
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts).replace('\u2028', '\n')
+
+
+def atomic_write(path, chunks, encoding='utf-8', errors='strict', compression=None):
+    """Записать порции текста во временный файл рядом с целевым и заменить его
+
+    Файл пишется через инкрементальный кодировщик, сбрасывается на диск
+    (fsync) и атомарно переименовывается поверх целевого, поэтому при сбое
+    на диске остается либо старая, либо новая версия целиком.
+    При заданном compression байты по пути сжимаются тем же форматом.
+    """
+    # Через символическую ссылку пишется ее цель: os.replace поверх самой
+    # ссылки заменил бы ее обычным файлом
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory
+    )
+    try:
+        encoder = codecs.getincrementalencoder(encoding)(errors)
+        with open(fd, 'wb', buffering=SAVE_BUFFER_SIZE) as f:
+            writer = open_compressed_writer(f, compression, os.path.basename(path))
+            target = writer or f
+            for chunk in chunks:
+                target.write(encoder.encode(chunk))
+            target.write(encoder.encode('', final=True))
+            if writer:
+                writer.close()
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        else:
+            # mkstemp создает файл с правами 0600, а новый файл должен
+            # получить обычные права, как при open()
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory):
+    """Закрепить переименование на диске (только POSIX)"""
+    if os.name != 'posix':
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_document(document, path, encoding='utf-8', compression=None):
+    """Сохранить QTextDocument в файл потоково и атомарно, вернуть хеш текста"""
+    digest = hashlib.blake2b(digest_size=16)
+
+    def chunks():
+        for chunk in iter_document_chunks(document):
+            digest.update(chunk.encode('utf-8', 'surrogatepass'))
+            yield chunk
+
+    atomic_write(path, chunks(), encoding, compression=compression)
+    return digest.hexdigest()
@@ -0,0 +1,296 @@
+"""
+Поиск по документу: обычный текст, целые слова и регулярные выражения
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from PyQt6.QtGui import QTextCursor
+from app.utils.constants import SEARCH_PATTERN_CACHE_SIZE, REPLACE_MERGE_GAP
+
+# Символы вне BMP занимают в QTextDocument две позиции (UTF-16)
+ASTRAL = re.compile('[\U00010000-\U0010ffff]')
+
+
+def utf16_index(text, index):
+    """Позиция в UTF-16 для индекса символа строки Python"""
+    if text.isascii():
+        return index
+    return index + len(ASTRAL.findall(text, 0, index))
+
+
+def text_index(text, position):
+    """Индекс символа строки Python для позиции в UTF-16"""
+    if text.isascii():
+        return position
+    for match in ASTRAL.finditer(text):
+        if match.start() >= position:
+            break
+        position -= 1
+    return position
+
+
+class SearchEngine:
+    """Компиляция шаблонов поиска с LRU-кэшем по (шаблон, флаги)"""
+
+    def __init__(self, cache_size=SEARCH_PATTERN_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, text, case_sensitive=False, whole_words=False, regex=False):
+        """Скомпилированный шаблон, re.error при ошибке в выражении"""
+        key = (text, case_sensitive, whole_words, regex)
+        with self._lock:
+            pattern = self._cache.get(key)
+            if pattern is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return pattern
+        self.misses += 1
+
+        source = text if regex else re.escape(text)
+        if whole_words:
+            source = rf'\b(?:{source})\b'
+        pattern = re.compile(source, 0 if case_sensitive else re.IGNORECASE)
+        with self._lock:
+            self._cache[key] = pattern
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return pattern
+
+
+def block_matches(block, pattern):
+    """Непустые совпадения в блоке как (позиция, длина) в документе"""
+    text = block.text()
+    base = block.position()
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        begin = utf16_index(text, start)
+        yield base + begin, utf16_index(text, end) - begin
+
+
+def document_text(document, start=0, end=None):
+    """Текст документа (или диапазона) с '\\n' между блоками
+
+    Позиции символов совпадают с позициями документа, кроме символов
+    вне BMP: их учитывает text_matches.
+    """
+    if start == 0 and end is None:
+        text = document.toRawText()
+    else:
+        cursor = QTextCursor(document)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        text = cursor.selectedText()
+    return text.replace('\u2029', '\n')
+
+
+def text_matches(text, pattern, base=0):
+    """Непустые совпадения в тексте как списки позиций и длин в документе
+
+    Совпадения не пересекают строк, как и при поиске по блокам: если
+    шаблон захватил перевод строки, текст просматривается построчно.
+    """
+    starts = []
+    lengths = []
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        if text.count('\n', start, end):
+            return _line_matches(text, pattern, base)
+        starts.append(start)
+        lengths.append(end - start)
+    return _to_utf16(text, starts, lengths, base)
+
+
+def _line_matches(text, pattern, base):
+    starts = []
+    lengths = []
+    offset = 0
+    for line in text.split('\n'):
+        for match in pattern.finditer(line):
+            start, end = match.span()
+            if start != end:
+                starts.append(offset + start)
+                lengths.append(end - start)
+        offset += len(line) + 1
+    return _to_utf16(text, starts, lengths, base)
+
+
+def _to_utf16(text, starts, lengths, base):
+    """Перевести индексы символов в позиции документа"""
+    astral = [] if text.isascii() else [match.start() for match in ASTRAL.finditer(text)]
+    if not astral:
+        return [base + start for start in starts], lengths
+    positions = []
+    for i, start in enumerate(starts):
+        before = bisect_left(astral, start)
+        inside = bisect_left(astral, start + lengths[i]) - before
+        positions.append(base + start + before)
+        lengths[i] += inside
+    return positions, lengths
+
+
+def text_replacements(text, pattern, replacement, expand=False, breaks=()):
+    """Замены в тексте как участки (начало, конец, новый текст) и их число
+
+    При expand замена разворачивается как шаблон re (\\1, \\g<имя>).
+    Совпадения, как и при поиске, не пересекают строк. Замены, между
+    которыми не больше REPLACE_MERGE_GAP символов, объединяются в один
+    участок: вызовов insertText становится на порядки меньше. Через
+    позиции breaks (отсортированные индексы символов) участки не тянутся.
+    """
+    spans = []
+    # Текущий участок: границы и части нового текста
+    span_start = span_end = 0
+    parts = None
+    count = 0
+    breaks = list(breaks)
+    next_break = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        if text.count('\n', start, end):
+            return _line_replacements(text, pattern, replacement, expand)
+        new = match.expand(replacement) if expand else replacement
+        count += 1
+        merge = parts is not None and start - span_end <= REPLACE_MERGE_GAP
+        if merge and breaks:
+            while next_break < len(breaks) and breaks[next_break] < span_end:
+                next_break += 1
+            # Позиция курсора не должна оказаться внутри объединенного участка
+            merge = next_break == len(breaks) or breaks[next_break] >= end
+        if merge:
+            parts.append(text[span_end:start])
+            parts.append(new)
+        else:
+            if parts is not None:
+                spans.append((span_start, span_end, ''.join(parts)))
+            span_start = start
+            parts = [new]
+        span_end = end
+    if parts is not None:
+        spans.append((span_start, span_end, ''.join(parts)))
+    return spans, count
+
+
+def _line_replacements(text, pattern, replacement, expand):
+    spans = []
+    offset = 0
+    for line in text.split('\n'):
+        for match in pattern.finditer(line):
+            start, end = match.span()
+            if start != end:
+                spans.append((offset + start, offset + end,
+                              match.expand(replacement) if expand else replacement))
+        offset += len(line) + 1
+    return spans, len(spans)
+
+
+def utf16_length(text):
+    """Длина строки в позициях QTextDocument"""
+    if text.isascii():
+        return len(text)
+    return len(text) + len(ASTRAL.findall(text))
+
+
+def _map_position(position, ends, starts, shifts):
+    """Позиция после замен: внутри замененного участка - его начало"""
+    i = bisect_right(ends, position)
+    shift = shifts[i - 1] if i else 0
+    if i < len(starts) and starts[i] < position:
+        return starts[i] + shift
+    return position + shift
+
+
+def replace_all(document, pattern, replacement, expand=False, text_cursor=None):
+    """Заменить все совпадения одной отменяемой правкой, вернуть их число
+
+    Участки заменяются с конца документа, чтобы позиции впереди не
+    сдвигались. Курсор text_cursor, если он передан, переносится так,
+    чтобы остаться у того же текста.
+    """
+    text = document_text(document)
+    breaks = ()
+    if text_cursor is not None:
+        # Сам курсор документ сдвинет при правке, поэтому позиции запоминаем
+        anchor, position = text_cursor.anchor(), text_cursor.position()
+        breaks = sorted({text_index(text, anchor), text_index(text, position)})
+    spans, count = text_replacements(text, pattern, replacement, expand, breaks)
+    if not spans:
+        return 0
+    starts, lengths = _to_utf16(text, [start for start, _, _ in spans],
+                                [end - start for start, end, _ in spans], 0)
+
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    for i in range(len(spans) - 1, -1, -1):
+        cursor.setPosition(starts[i])
+        cursor.setPosition(starts[i] + lengths[i], QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(spans[i][2])
+    cursor.endEditBlock()
+
+    if text_cursor is not None:
+        ends = [start + length for start, length in zip(starts, lengths)]
+        shifts = []
+        shift = 0
+        for i, (_, _, new) in enumerate(spans):
+            shift += utf16_length(new) - lengths[i]
+            shifts.append(shift)
+        anchor = _map_position(anchor, ends, starts, shifts)
+        position = _map_position(position, ends, starts, shifts)
+        text_cursor.setPosition(anchor)
+        text_cursor.setPosition(position, QTextCursor.MoveMode.KeepAnchor)
+    return count
+
+
+def find(document, pattern, position, backward=False):
+    """Ближайшее совпадение от позиции, (позиция, длина) или None
+
+    Поиск идет по блокам, поэтому совпадение не пересекает границу строки.
+    """
+    block = document.findBlock(position)
+    if not block.isValid():
+        return None
+    while block.isValid():
+        text = block.text()
+        offset = text_index(text, position - block.position())
+        if not backward:
+            for match in pattern.finditer(text, offset):
+                if match.start() != match.end():
+                    begin = utf16_index(text, match.start())
+                    return block.position() + begin, utf16_index(text, match.end()) - begin
+            block = block.next()
+            position = block.position()
+        else:
+            last = None
+            for match in pattern.finditer(text):
+                if match.start() >= offset:
+                    break
+                if match.start() != match.end():
+                    last = match
+            if last:
+                begin = utf16_index(text, last.start())
+                return block.position() + begin, utf16_index(text, last.end()) - begin
+            block = block.previous()
+            if block.isValid():
+                position = block.position() + block.length() - 1
+    return None
+
+
+_engine = None
+
+
+def get_search_engine():
+    """Общий экземпляр движка поиска"""
+    global _engine
+    if _engine is None:
+        _engine = SearchEngine()
+    return _engine
@@ -3,12 +3,33 @@
 Менеджер сессий - сохранение и восстановление состояния редактора
 """
 import json
+import os
 from pathlib import Path
+from PyQt6.QtCore import QTimer
+from app.core.save_pipeline import atomic_write
+from app.core.session_store import SessionBlobStore
+from app.utils.constants import LARGE_FILE_THRESHOLD, SESSION_PRELOAD_DELAY, SESSION_PRELOAD_MAX_CHARS
 class SessionManager:
-    """Управление сессиями пользователя"""
+    """Управление сессиями пользователя
+
+    Вкладки сессии восстанавливаются заготовками: пустой вкладкой с
+    именем, путем и записью сессии в tab_data.pending. Содержимое
+    загружается при первом переходе на вкладку или в простое по таймеру,
+    поэтому время до готовности окна не зависит от размера сессии.
+
+    Для чистых вкладок с файлом сохраняются только метаданные, текст
+    остальных лежит в SessionBlobStore. Хеш текста запоминается вместе с
+    revision() документа, так что неизмененные вкладки при сохранении
+    сессии даже не читаются.
+    """
    
     def __init__(self, editor):
         self.editor = editor
+        self.restoring = False
+        self.blob_store = SessionBlobStore(editor.session_blob_dir)
+        self.preload_timer = QTimer(editor)
+        self.preload_timer.setSingleShot(True)
+        self.preload_timer.timeout.connect(self.preload_next)
        
     def save_session(self):
         """Сохранение текущей сессии"""
@@ -16,25 +37,61 @@ class SessionManager:
             'tabs': [],
             'theme': self.editor.theme,
             'auto_save_enabled': self.editor.auto_save_enabled,
-            'auto_save_interval': self.editor.auto_save_interval
+            'auto_save_interval': self.editor.auto_save_interval,
+            'current': self.editor.tab_widget.currentIndex()
         }
        
-        for i in range(self.editor.tab_widget.count()):
-            tab_data = self.editor.get_tab_data(i)
-            if tab_data:
-                tab_info = {
-                    'file_path': tab_data['file_path'],
-                    'content': tab_data['text_edit'].toPlainText(),
-                    'name': tab_data['name']
-                }
-                session_data['tabs'].append(tab_info)
-       
         try:
-            with open(self.editor.session_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, ensure_ascii=False, indent=2)
+            for tab_data in self.editor.tabs:
+                session_data['tabs'].append(self.tab_entry(tab_data))
+           
+            atomic_write(self.editor.session_file,
+                         [json.dumps(session_data, ensure_ascii=False, separators=(',', ':'))])
+            self.blob_store.collect({tab_info['blob'] for tab_info in session_data['tabs'] if 'blob' in tab_info})
         except Exception as e:
             print(f"Ошибка сохранения сессии: {e}")
            
+    def tab_entry(self, tab_data):
+        """Запись сессии для вкладки"""
+        if tab_data.pending:
+            tab_info = tab_data.pending
+            if 'content' in tab_info:
+                # Сессия прежнего формата хранила текст прямо в JSON
+                tab_info = dict(tab_info)
+                content = tab_info.pop('content')
+                tab_info.update(blob=self.blob_store.put(content), length=len(content))
+                tab_data.pending = tab_info
+            # Незагруженная вкладка сохраняется той же записью
+            return tab_info
+        if tab_data.large_file or tab_data.loader:
+            # Большие и еще не загруженные файлы сохраняем только путем,
+            # при восстановлении они открываются заново
+            return {
+                'file_path': tab_data.file_path,
+                'name': tab_data.name
+            }
+       
+        tab_info = {
+            'file_path': tab_data.file_path,
+            'name': tab_data.name,
+            'encoding': tab_data.encoding,
+            'compression': tab_data.compression
+        }
+        document = tab_data.text_edit.document()
+        modified = self.editor.is_dirty(tab_data)
+        if tab_data.file_path and not modified:
+            # Текст чистой вкладки есть в файле
+            return tab_info
+        if not tab_data.file_path and document.isEmpty():
+            return tab_info
+       
+        cached = tab_data.session_blob
+        if cached is None or cached[0] != document.revision():
+            content = document.toPlainText()
+            cached = tab_data.session_blob = (document.revision(), self.blob_store.put(content), len(content))
+        tab_info.update(blob=cached[1], length=cached[2], modified=modified)
+        return tab_info
+           
     def load_session(self):
         """Загрузка сохраненной сессии"""
         try:
@@ -49,18 +106,110 @@ class SessionManager:
                
                 # Очищаем пустую первую вкладку
                 if self.editor.tab_widget.count() == 1:
-                    self.editor.tab_widget.removeTab(0)
+                    self.editor.remove_tab(0)
                
-                # Восстанавливаем вкладки
-                for tab_info in session_data.get('tabs', []):
-                    self.editor.new_tab(
-                        tab_info.get('file_path'),
-                        tab_info.get('content')
-                    )
+                # Восстанавливаем вкладки заготовками
+                self.restoring = True
+                try:
+                    for tab_info in session_data.get('tabs', []):
+                        self.add_pending_tab(tab_info)
+                finally:
+                    self.restoring = False
                
                 # Если нет вкладок, создаем пустую
                 if self.editor.tab_widget.count() == 0:
                     self.editor.new_tab()
+               
+                current = session_data.get('current', self.editor.tab_widget.count() - 1)
+                if 0 <= current < self.editor.tab_widget.count():
+                    self.editor.tab_widget.setCurrentIndex(current)
+                self.restore_tab(self.editor.get_current_tab_data())
+                self.preload_timer.start(SESSION_PRELOAD_DELAY)
                    
         except Exception as e:
             print(f"Ошибка загрузки сессии: {e}")
+           
+    def add_pending_tab(self, tab_info):
+        """Вкладка-заготовка для записи сессии"""
+        file_path = tab_info.get('file_path')
+        if 'content' not in tab_info and 'blob' not in tab_info:
+            if not file_path:
+                # Пустая безымянная вкладка
+                self.editor.new_tab()
+                return
+            if not Path(file_path).exists():
+                return
+            if os.path.getsize(file_path) >= LARGE_FILE_THRESHOLD:
+                # Просмотр через mmap не читает файл целиком, его открываем сразу
+                count = self.editor.tab_widget.count()
+                self.editor.file_manager.open_file(file_path)
+                if self.editor.tab_widget.count() == count:
+                    # Файл не открылся, об ошибке уже сообщено
+                    return
+                tab_index = self.editor.tab_widget.currentIndex()
+                if self.editor.get_tab_data(tab_index).large_file:
+                    return
+                # Файл открылся обычной вкладкой - она заменяется заготовкой
+                self.editor.remove_tab(tab_index)
+        tab_index = self.editor.new_tab(file_path, encoding=tab_info.get('encoding', 'utf-8'),
+                                        compression=tab_info.get('compression'))
+        tab_data = self.editor.get_tab_data(tab_index)
+        tab_data.pending = tab_info
+        tab_data.text_edit.setReadOnly(True)
+        if file_path:
+            self.editor.tab_widget.setTabToolTip(tab_index, file_path)
+           
+    def on_tab_activated(self, tab_data):
+        """Переход на вкладку: загрузить её, если это заготовка"""
+        if not self.restoring:
+            self.restore_tab(tab_data)
+           
+    def restore_tab(self, tab_data, background=False):
+        """Загрузить содержимое вкладки-заготовки"""
+        tab_info = tab_data.pending if tab_data else None
+        if tab_info is None:
+            return
+        tab_data.pending = None
+        tab_data.hibernated = False
+        text_edit = tab_data.text_edit
+        text_edit.setReadOnly(False)
+        # Загрузку текста в журнал правок не пишем
+        self.editor.edit_journal.suspend(tab_data)
+        if 'blob' in tab_info:
+            try:
+                content = self.blob_store.get(tab_info['blob'])
+            except (OSError, EOFError, UnicodeDecodeError) as e:
+                self.editor.statusbar_manager.set_text(f"Не удалось восстановить {tab_data.name}: {e}")
+                content = ''
+            text_edit.setPlainText(content)
+            if content:
+                tab_data.session_blob = (text_edit.document().revision(), tab_info['blob'], len(content))
+            self.editor.set_modified(tab_data, tab_info.get('modified', False))
+        elif 'content' in tab_info:
+            text_edit.setPlainText(tab_info['content'])
+            self.editor.set_modified(tab_data, False)
+        else:
+            self.editor.file_manager.load_into_tab(tab_data, background)
+        if not tab_data.loader:
+            self.editor.edit_journal.resume(tab_data)
+            tab_data.restore_view()
+        self.editor.ui_scheduler.mark_all(text_edit)
+       
+    def preload_next(self):
+        """Загрузить в простое следующую заготовку
+
+        Файлы читаются фоновым загрузчиком по одному. Несохраненный текст
+        вставляется целиком, поэтому заранее загружается только небольшой,
+        а большой ждет перехода на вкладку.
+        """
+        tabs = list(self.editor.tabs)
+        if any(tab_data.loader for tab_data in tabs):
+            self.preload_timer.start(SESSION_PRELOAD_DELAY)
+            return
+        for tab_data in tabs:
+            tab_info = tab_data.pending
+            # Выгруженные из памяти вкладки ждут перехода на них
+            if tab_info and not tab_data.hibernated and tab_info.get('length', len(tab_info.get('content', ''))) < SESSION_PRELOAD_MAX_CHARS:
+                self.restore_tab(tab_data, background=True)
+                self.preload_timer.start(SESSION_PRELOAD_DELAY)
+                return
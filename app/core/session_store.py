@@ -0,0 +1,46 @@
+"""
+Хранилище текста несохраненных вкладок сессии, адресуемое хешем
+"""
+import gzip
+import hashlib
+from app.core.save_pipeline import atomic_write
+
+
+class SessionBlobStore:
+    """Сжатые копии текста в файлах <sha256>.gz
+
+    Одинаковый текст хранится одним файлом, уже записанный повторно не
+    пишется. Файлы, на которые не ссылается сессия, удаляет collect().
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest):
+        return self.directory / f"{digest}.gz"
+
+    def put(self, text):
+        """Сохранить текст, вернуть его хеш"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            atomic_write(path, [text], compression='gzip')
+        return digest
+
+    def get(self, digest):
+        """Текст по хешу, OSError если его нет"""
+        with gzip.open(self.path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def collect(self, referenced):
+        """Удалить файлы, не упомянутые в referenced, вернуть их число"""
+        removed = 0
+        for path in self.directory.glob('*.gz'):
+            if path.stem not in referenced:
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
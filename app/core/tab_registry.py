@@ -0,0 +1,100 @@
+"""
+Реестр вкладок: состояние каждой вкладки по ее виджету
+"""
+
+
+class TabState:
+    """Состояние одной вкладки
+
+    Поля, которые к вкладке не относятся, равны None: loader есть только
+    у загружающегося файла, large_file - у просмотра большого файла,
+    follow - у вкладки в режиме слежения, pending - у вкладки сессии
+    или выгруженной из памяти, текст которой еще не загружен.
+    """
+
+    __slots__ = ('text_edit', 'file_path', 'name', 'encoding', 'compression', 'modified',
+                 'stats', 'large_file', 'loader', 'follow', 'pending', 'goto_line',
+                 'saved', 'dirty_checked', 'journal', 'session_blob', 'view',
+                 'last_used', 'hibernated')
+
+    def __init__(self, text_edit, name, file_path=None, encoding='utf-8', compression=None,
+                 stats=None, large_file=None):
+        self.text_edit = text_edit
+        self.file_path = file_path
+        self.name = name
+        self.encoding = encoding
+        self.compression = compression
+        self.modified = False
+        self.stats = stats
+        self.large_file = large_file
+        self.loader = None
+        self.follow = None
+        self.pending = None
+        # Строка, на которую перейти после загрузки
+        self.goto_line = None
+        # (ревизия, длина, хеш) текста, совпадающего с файлом
+        self.saved = None
+        # (ревизия, отличается ли текст от сохраненного)
+        self.dirty_checked = None
+        self.journal = None
+        # (ревизия, хеш, длина) текста, записанного в сессию
+        self.session_blob = None
+        # (позиция курсора, прокрутка), см. save_view
+        self.view = None
+        # Когда вкладка последний раз была текущей (порядковый номер)
+        self.last_used = 0
+        # Документ выгружен из памяти, см. HibernationManager
+        self.hibernated = False
+
+    def save_view(self):
+        """Запомнить положение курсора и прокрутки"""
+        text_edit = self.text_edit
+        self.view = (text_edit.textCursor().position(), text_edit.verticalScrollBar().value())
+        return self.view
+
+    def restore_view(self):
+        """Вернуть курсор и прокрутку, запомненные save_view"""
+        if self.view is None:
+            return
+        position, scroll = self.view
+        self.view = None
+        text_edit = self.text_edit
+        cursor = text_edit.textCursor()
+        cursor.setPosition(min(position, text_edit.document().characterCount() - 1))
+        text_edit.setTextCursor(cursor)
+        text_edit.verticalScrollBar().setValue(scroll)
+
+
+class TabRegistry:
+    """Состояния вкладок по их виджетам
+
+    Виджет -> состояние ищется в словаре, состояние -> виджет - это поле
+    text_edit, поэтому поиск в обе стороны не зависит от числа вкладок и
+    не сбивается, когда после закрытия вкладки сдвигаются индексы.
+    Перебор идет в порядке добавления (он же порядок вкладок) по копии,
+    так что вкладки можно закрывать прямо во время перебора.
+    """
+
+    def __init__(self):
+        self._states = {}
+
+    def add(self, state):
+        self._states[state.text_edit] = state
+        return state
+
+    def remove(self, widget):
+        """Убрать вкладку с виджетом, вернуть ее состояние или None"""
+        return self._states.pop(widget, None)
+
+    def get(self, widget):
+        """Состояние вкладки с виджетом или None"""
+        return self._states.get(widget) if widget is not None else None
+
+    def __contains__(self, state):
+        return self._states.get(state.text_edit) is state
+
+    def __iter__(self):
+        return iter(list(self._states.values()))
+
+    def __len__(self):
+        return len(self._states)
@@ -0,0 +1,250 @@
+"""
+Поиск по всем открытым вкладкам порциями в GUI-потоке
+"""
+import codecs
+import threading
+import time
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from app.core.compression import open_decompressed
+from app.core.encoding import get_encoding_detector
+from app.core.file_search import find_lines
+from app.core.search_engine import get_search_engine, document_text
+from app.utils.constants import (TAB_SEARCH_SLICE, TAB_SEARCH_CHUNK, TAB_SEARCH_WAIT_INTERVAL,
+                                 FIND_FILES_MAX_MATCHES, LOAD_CHUNK_SIZE, ENCODING_SAMPLE_SIZE)
+
+
+def iter_pending_text(tab_info, blob_store):
+    """Текст вкладки-заготовки порциями по целым строкам
+
+    Несохраненный текст берется из хранилища сессии, текст чистой
+    вкладки - из ее файла, в кодировке и формате сжатия вкладки.
+    """
+    if 'blob' in tab_info:
+        yield blob_store.get(tab_info['blob'])
+        return
+    if 'content' in tab_info:
+        yield tab_info['content']
+        return
+    with open(tab_info['file_path'], 'rb') as raw, \
+            open_decompressed(raw, tab_info.get('compression')) as f:
+        data = f.read(ENCODING_SAMPLE_SIZE)
+        encoding = tab_info.get('encoding') or get_encoding_detector().detect_bytes(
+            data, complete=len(data) < ENCODING_SAMPLE_SIZE)
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        tail = ''
+        while data:
+            text = tail + decoder.decode(data)
+            # Порция обрезается по последнему переводу строки, а '\r' в
+            # конце может оказаться половиной '\r\n'
+            cut = max(text.rfind('\n'), text.rfind('\r', 0, len(text) - 1)) + 1
+            text, tail = text[:cut], text[cut:]
+            if text:
+                yield text.replace('\r\n', '\n').replace('\r', '\n')
+            data = f.read(LOAD_CHUNK_SIZE)
+        tail += decoder.decode(b'', True)
+        if tail:
+            yield tail.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def search_pending(tab_info, blob_store, pattern, is_cancelled):
+    """Совпадения в тексте заготовки, как у find_lines"""
+    matches = []
+    line = 0
+    for text in iter_pending_text(tab_info, blob_store):
+        if is_cancelled():
+            break
+        limit = FIND_FILES_MAX_MATCHES - len(matches)
+        matches.extend((line + number, column, preview)
+                       for number, column, preview in find_lines(text, pattern, limit))
+        if len(matches) >= FIND_FILES_MAX_MATCHES:
+            break
+        line += text.count('\n')
+    return matches
+
+
+class OpenTabsSearch(QObject):
+    """Поиск по документам вкладок с теми же сигналами, что у FileSearch
+
+    Документы читаются порциями по TAB_SEARCH_CHUNK строк, и за такт
+    таймера тратится не больше TAB_SEARCH_SLICE, так что интерфейс не
+    замирает. Результаты документа запоминаются в cache вместе с его
+    revision(): повторный запрос перечитывает только измененные вкладки.
+
+    Вкладки-заготовки (сессии и выгруженные из памяти) ради поиска не
+    загружаются: их текст читается из файла или хранилища сессии в
+    отдельном потоке. Вкладки, файл которых еще загружается, ждут конца
+    загрузки. Просмотры больших файлов не ищутся и считаются в
+    files_skipped.
+    """
+
+    results_ready = pyqtSignal(list)
+    progress_changed = pyqtSignal(int, int)
+    finished = pyqtSignal(bool)
+    _pending_done = pyqtSignal(object, list)
+
+    def __init__(self, editor, query, cache, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.query = query
+        self.cache = cache
+        self.files_total = 0
+        self.files_done = 0
+        self.files_skipped = 0
+        self.files_cached = 0
+        self._queue = []
+        self._waiting = []
+        self._current = None
+        self._pending_left = 0
+        self._finished = False
+        self._cancelled = threading.Event()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._step)
+        # Сигнал испускается из потока чтения и доставляется в GUI-поток
+        self._pending_done.connect(self._on_pending_done)
+
+    def start(self):
+        self.pattern = get_search_engine().compile(*self.query)
+        pending = []
+        for tab_data in self.editor.tabs:
+            if tab_data.large_file:
+                self.files_skipped += 1
+            elif tab_data.pending is not None:
+                pending.append((tab_data, tab_data.pending))
+            else:
+                self._queue.append(tab_data)
+        self.files_total = len(self._queue) + len(pending)
+        # Закрытые с прошлого поиска документы из кэша убираем
+        alive = {id(tab_data.text_edit.document()) for tab_data in self._queue}
+        for key in [key for key in self.cache if key not in alive]:
+            del self.cache[key]
+        if pending:
+            self._pending_left = len(pending)
+            threading.Thread(target=self._search_pending, args=(pending,), daemon=True).start()
+        self._timer.start(0)
+
+    def cancel(self):
+        self._cancelled.set()
+        self._timer.stop()
+        self._finish(True)
+
+    def _finish(self, cancelled):
+        if not self._finished:
+            self._finished = True
+            self.finished.emit(cancelled)
+
+    def _search_pending(self, pending):
+        """Поиск по заготовкам в рабочем потоке"""
+        blob_store = self.editor.session_manager.blob_store
+        for tab_data, tab_info in pending:
+            if self._cancelled.is_set():
+                return
+            try:
+                matches = search_pending(tab_info, blob_store, self.pattern, self._cancelled.is_set)
+            except (OSError, EOFError, ValueError, LookupError):
+                # Файл удален или поврежден - искать в нем нечего
+                matches = []
+            if self._cancelled.is_set():
+                return
+            self._pending_done.emit(tab_data, matches)
+
+    def _on_pending_done(self, tab_data, matches):
+        if self._finished:
+            return
+        self._pending_left -= 1
+        self.files_done += 1
+        if self._is_open(tab_data):
+            self._emit(tab_data, matches)
+        self.progress_changed.emit(self.files_done, self.files_total)
+        self._check_finished()
+
+    def _check_finished(self):
+        if (self._current is None and not self._queue and not self._waiting
+                and not self._pending_left):
+            self._timer.stop()
+            self._finish(False)
+
+    def _next_document(self):
+        """Взять следующую вкладку; результаты из кэша отдаются сразу"""
+        while self._queue:
+            tab_data = self._queue.pop(0)
+            if not self._is_open(tab_data):
+                self.files_done += 1
+                continue
+            if tab_data.loader:
+                # Документ еще загружается, вернемся к нему после загрузки
+                self._waiting.append(tab_data)
+                continue
+            document = tab_data.text_edit.document()
+            cached = self.cache.get(id(document))
+            if cached and cached[0] is document and cached[1] == document.revision() and cached[2] == self.query:
+                self.files_done += 1
+                self.files_cached += 1
+                self._emit(tab_data, cached[3])
+                continue
+            self._current = {'tab_data': tab_data, 'document': document,
+                             'revision': document.revision(), 'block': 0, 'matches': []}
+            return True
+        return False
+
+    def _is_open(self, tab_data):
+        return tab_data in self.editor.tabs
+
+    def _emit(self, tab_data, matches):
+        if matches:
+            widget = tab_data.text_edit
+            self.results_ready.emit([
+                (tab_data.name, line, column, preview, widget)
+                for line, column, preview in matches
+            ])
+
+    def _step(self):
+        deadline = time.perf_counter() + TAB_SEARCH_SLICE
+        while time.perf_counter() < deadline:
+            if self._current is None and not self._next_document():
+                self._requeue_waiting()
+                break
+            self._scan_chunk()
+        self.progress_changed.emit(self.files_done, self.files_total)
+
+    def _requeue_waiting(self):
+        """Очередь пуста: вернуть в нее загрузившиеся вкладки"""
+        waiting = [tab_data for tab_data in self._waiting if self._is_open(tab_data)]
+        # Вкладку закрыли или загрузка не удалась
+        self.files_done += len(self._waiting) - len(waiting)
+        self._queue = [tab_data for tab_data in waiting if not tab_data.loader]
+        self._waiting = [tab_data for tab_data in waiting if tab_data.loader]
+        if self._queue:
+            self._timer.start(0)
+        elif self._waiting:
+            self._timer.start(TAB_SEARCH_WAIT_INTERVAL)
+        else:
+            self._timer.stop()
+            self._check_finished()
+
+    def _scan_chunk(self):
+        """Просмотреть очередные TAB_SEARCH_CHUNK строк текущего документа"""
+        state = self._current
+        if not self._is_open(state['tab_data']):
+            # Вкладку закрыли во время поиска
+            self.files_done += 1
+            self._current = None
+            return
+        document = state['document']
+        if document.revision() != state['revision']:
+            # Документ правили во время поиска - начинаем его заново
+            state.update(revision=document.revision(), block=0, matches=[])
+        first = state['block']
+        last = min(first + TAB_SEARCH_CHUNK, document.blockCount())
+        end_block = document.findBlockByNumber(last - 1)
+        text = document_text(document, document.findBlockByNumber(first).position(),
+                             end_block.position() + end_block.length() - 1)
+        limit = FIND_FILES_MAX_MATCHES - len(state['matches'])
+        matches = [(first + line, column, preview)
+                   for line, column, preview in find_lines(text, self.pattern, limit)]
+        state['matches'].extend(matches)
+        state['block'] = last
+        if last >= document.blockCount() or len(state['matches']) >= FIND_FILES_MAX_MATCHES:
+            self.cache[id(document)] = (document, state['revision'], self.query, state['matches'])
+            self.files_done += 1
+            self._current = None
+            self._emit(state['tab_data'], state['matches'])
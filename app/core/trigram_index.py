@@ -0,0 +1,188 @@
+"""
+Постоянный триграммный индекс папки для повторного поиска в файлах
+"""
+import hashlib
+import os
+import sqlite3
+from array import array
+from pathlib import Path
+from app.utils.constants import INDEX_FLUSH_ENTRIES, INDEX_COMPACT_RATIO
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+INDEX_DIR = Path.home() / ".texteditor" / "index"
+
+
+def text_trigrams(text):
+    """Триграммы текста в нижнем регистре (байты UTF-8) как отсортированный массив
+
+    Совпадения не пересекают строк, поэтому повторяющиеся строки
+    учитываются один раз - в журналах это заметно ускоряет разбор.
+    """
+    data = b'\n'.join(set(text.lower().encode('utf-8', errors='replace').split(b'\n')))
+    return array('I', sorted((a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))))
+
+
+def literal_trigrams(literal):
+    """Триграммы строки, которая обязана входить в совпадение"""
+    data = literal.lower().encode('utf-8', errors='replace')
+    return {(a << 16) | (b << 8) | c for a, b, c in zip(data, data[1:], data[2:])}
+
+
+def required_literals(expression):
+    """Подстроки, без которых регулярное выражение не совпадет
+
+    Разбираются только последовательности обычных символов верхнего
+    уровня; при альтернативе или ошибке разбора ограничений нет.
+    """
+    try:
+        parsed = sre_parse.parse(expression)
+    except Exception:
+        return []
+    literals = []
+    current = []
+    for op, value in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(value))
+            continue
+        if current:
+            literals.append(''.join(current))
+            current = []
+        if op == sre_parse.BRANCH:
+            return []
+    if current:
+        literals.append(''.join(current))
+    return literals
+
+
+def query_trigrams(text, regex=False):
+    """Триграммы, которые есть в любом файле с совпадением"""
+    trigrams = set()
+    for literal in (required_literals(text) if regex else [text]):
+        trigrams |= literal_trigrams(literal)
+    return trigrams
+
+
+def index_path(root):
+    """Файл индекса папки в ~/.texteditor/index"""
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    return INDEX_DIR / f"{key}.sqlite"
+
+
+class TrigramIndex:
+    """Индекс: какие файлы папки содержат каждую триграмму
+
+    Файл при изменении получает новый номер, а старый просто удаляется из
+    таблицы files: его номера в списках отбрасываются при запросе и
+    вычищаются сжатием, когда устаревших записей становится много.
+    Объект работает в одном потоке - в том, где создан.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(index_path(root)))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE,
+                                              mtime_ns INTEGER, size INTEGER);
+            CREATE TABLE IF NOT EXISTS postings (trigram INTEGER PRIMARY KEY, ids BLOB);
+        """)
+        self.db.execute("INSERT OR IGNORE INTO meta VALUES ('root', ?)", (self.root,))
+        self.db.execute("INSERT OR IGNORE INTO meta VALUES ('dead', '0')")
+        self.files = {
+            path: (file_id, mtime_ns, size)
+            for file_id, path, mtime_ns, size in self.db.execute("SELECT id, path, mtime_ns, size FROM files")
+        }
+        self._pending = {}
+        self._pending_count = 0
+
+    def close(self):
+        self.flush()
+        self.db.commit()
+        self.db.close()
+
+    def is_current(self, path, stat):
+        """Проиндексирован ли файл в текущем состоянии"""
+        entry = self.files.get(path)
+        return entry is not None and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size
+
+    def candidates(self, trigrams):
+        """Пути проиндексированных файлов, где могут быть все триграммы"""
+        if not trigrams:
+            return None  # ограничений нет
+        by_id = {file_id: path for path, (file_id, _, _) in self.files.items()}
+        postings = []
+        for trigram in trigrams:
+            row = self.db.execute("SELECT ids FROM postings WHERE trigram = ?", (trigram,)).fetchone()
+            if row is None:
+                return set()
+            ids = array('I')
+            ids.frombytes(row[0])
+            postings.append(ids)
+        postings.sort(key=len)
+        result = set(postings[0]) & by_id.keys()
+        for ids in postings[1:]:
+            if not result:
+                break
+            result.intersection_update(ids)
+        return {by_id[file_id] for file_id in result}
+
+    def _drop(self, path):
+        entry = self.files.pop(path, None)
+        if entry:
+            self.db.execute("DELETE FROM files WHERE id = ?", (entry[0],))
+            self.db.execute("UPDATE meta SET value = value + 1 WHERE key = 'dead'")
+
+    def update(self, path, mtime_ns, size, trigrams):
+        """Записать новое состояние файла и его триграммы"""
+        self._drop(path)
+        cursor = self.db.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                 (path, mtime_ns, size))
+        file_id = cursor.lastrowid
+        self.files[path] = (file_id, mtime_ns, size)
+        for trigram in trigrams:
+            self._pending.setdefault(trigram, array('I')).append(file_id)
+        self._pending_count += len(trigrams)
+        if self._pending_count >= INDEX_FLUSH_ENTRIES:
+            self.flush()
+
+    def remove_missing(self, seen):
+        """Забыть файлы, которых больше нет на диске"""
+        for path in [path for path in self.files if path not in seen]:
+            if not os.path.exists(path):
+                self._drop(path)
+
+    def flush(self):
+        """Дописать накопленные номера файлов в списки триграмм"""
+        for trigram, ids in self._pending.items():
+            row = self.db.execute("SELECT ids FROM postings WHERE trigram = ?", (trigram,)).fetchone()
+            data = (row[0] if row else b'') + ids.tobytes()
+            self.db.execute("INSERT OR REPLACE INTO postings VALUES (?, ?)", (trigram, data))
+        self._pending = {}
+        self._pending_count = 0
+        self.db.commit()
+        self.compact_if_needed()
+
+    def compact_if_needed(self):
+        """Вычистить номера удаленных и измененных файлов из списков"""
+        dead = int(self.db.execute("SELECT value FROM meta WHERE key = 'dead'").fetchone()[0])
+        if dead <= max(1000, len(self.files) * INDEX_COMPACT_RATIO):
+            return
+        live = {file_id for file_id, _, _ in self.files.values()}
+        rows = self.db.execute("SELECT trigram, ids FROM postings").fetchall()
+        for trigram, data in rows:
+            ids = array('I')
+            ids.frombytes(data)
+            kept = array('I', (file_id for file_id in ids if file_id in live))
+            if not kept:
+                self.db.execute("DELETE FROM postings WHERE trigram = ?", (trigram,))
+            elif len(kept) != len(ids):
+                self.db.execute("UPDATE postings SET ids = ? WHERE trigram = ?", (kept.tobytes(), trigram))
+        self.db.execute("UPDATE meta SET value = '0' WHERE key = 'dead'")
+        self.db.commit()
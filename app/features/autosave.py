@@ -2,17 +2,106 @@
 """
 Менеджер автосохранения документов
 """
+import os
+import threading
 import time
-from pathlib import Path
-from PyQt6.QtCore import QTimer
-from PyQt6.QtWidgets import QMessageBox
-class AutoSaveManager:
-    """Управление автосохранением"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor, QFont
+from PyQt6.QtWidgets import (QMessageBox, QDialog, QVBoxLayout, QHBoxLayout, QListWidget,
+                             QPlainTextEdit, QDialogButtonBox, QFormLayout, QSpinBox, QLabel)
+from app.core.backup_store import BackupStore
+from app.core.save_pipeline import atomic_write, text_digest
+from app.features.file_watcher import WatchEntry, file_digest
+from app.utils.constants import (BACKUP_MAX_COUNT, BACKUP_MAX_AGE_DAYS, BACKUP_MAX_SIZE_MB,
+                                 AUTOSAVE_MAX_WORKERS, AUTOSAVE_SNAPSHOT_SLICE,
+                                 AUTOSAVE_SNAPSHOT_CHARS, AUTOSAVE_SNAPSHOT_RETRIES,
+                                 AUTOSAVE_TIMING_HISTORY)
+
+
+class AutoSaveJob:
+    """Снимок одной вкладки и результат его записи"""
+
+    __slots__ = ('text_edit', 'path', 'encoding', 'compression', 'generation', 'saved_digest',
+                 'revision', 'parts', 'position', 'restarts', 'tick', 'digest', 'written',
+                 'entry', 'error')
+
+    def __init__(self, text_edit, path, encoding, compression, generation, saved_digest, tick):
+        self.text_edit = text_edit
+        self.path = path
+        self.encoding = encoding
+        self.compression = compression
+        # Номер ручного сохранения файла на момент снимка
+        self.generation = generation
+        # Хеш текста, совпадающего с файлом, если он известен
+        self.saved_digest = saved_digest
+        self.revision = None
+        # Куски текста документа с U+2029 между блоками
+        self.parts = []
+        self.position = 0
+        self.restarts = 0
+        self.tick = tick
+        self.digest = None
+        # Файл совпадает со снимком (записан или уже был таким)
+        self.written = False
+        self.entry = None
+        self.error = None
+
+
+class AutoSaveTick:
+    """Замеры одного срабатывания автосохранения, в миллисекундах"""
+
+    __slots__ = ('started', 'tabs', 'pause', 'snapshot', 'write', 'restarts', 'pending')
+
+    def __init__(self, started):
+        self.started = started
+        self.tabs = 0
+        # Самая долгая остановка GUI-потока и суммарное время снимков
+        self.pause = 0.0
+        self.snapshot = 0.0
+        # Суммарное время кодирования, хеширования и записи в пуле
+        self.write = 0.0
+        self.restarts = 0
+        self.pending = 0
+
+
+class AutoSaveManager(QObject):
+    """Управление автосохранением
+
+    В GUI-потоке снимается только текст документов: порциями по
+    AUTOSAVE_SNAPSHOT_CHARS символов, не дольше AUTOSAVE_SNAPSHOT_SLICE
+    за такт таймера (если документ правят во время снимка, снимок
+    начинается заново). Кодирование, хеширование, резервная копия и
+    запись файла идут в пуле потоков. Ручное сохранение берет ту же
+    блокировку файла и увеличивает его номер сохранения: запись
+    автосохранения, снятого раньше, тогда пропускается. Признак
+    изменения снимается, только если документ с момента снимка не
+    правили.
+    """
+
+    job_finished = pyqtSignal(object)
    
     def __init__(self, editor):
+        super().__init__(editor)
         self.editor = editor
         self.autosave_timer = QTimer()
         self.autosave_timer.timeout.connect(self.autosave)
+        self.snapshot_timer = QTimer()
+        self.snapshot_timer.timeout.connect(self.snapshot_step)
+        self.backup_store = BackupStore(editor.backup_dir)
+        self.apply_retention()
+        self.executor = ThreadPoolExecutor(max_workers=AUTOSAVE_MAX_WORKERS,
+                                           thread_name_prefix="autosave")
+        self.snapshot_queue = deque()
+        # Файлы, у которых есть незавершенное автосохранение
+        self.pending = set()
+        self.file_locks = {}
+        self.generations = {}
+        self.timings = deque(maxlen=AUTOSAVE_TIMING_HISTORY)
+        # Сигнал испускается из пула и доставляется в GUI-поток
+        self.job_finished.connect(self.on_job_finished)
        
     def toggle_autosave(self):
         """Включить/выключить автосохранение"""
@@ -41,34 +130,160 @@ class AutoSaveManager:
         """Остановить автосохранение"""
         self.autosave_timer.stop()
        
+    def shutdown(self):
+        """Дождаться записей, начатых автосохранением"""
+        self.autosave_timer.stop()
+        self.snapshot_timer.stop()
+        self.snapshot_queue.clear()
+        self.executor.shutdown(wait=True)
+       
+    @contextmanager
+    def file_lock(self, path):
+        """Блокировка записи файла; ручное сохранение отменяет запись более старых снимков"""
+        lock = self.file_locks.setdefault(path, threading.Lock())
+        with lock:
+            self.generations[path] = self.generations.get(path, 0) + 1
+            yield
+       
     def autosave(self):
-        """Выполнить автосохранение"""
-        if not self.editor.auto_save_enabled:
+        """Выполнить автосохранение: поставить измененные вкладки в очередь снимков"""
+        if not self.editor.auto_save_enabled or self.snapshot_queue:
             return
        
-        for i in range(self.editor.tab_widget.count()):
-            tab_data = self.editor.get_tab_data(i)
-            if tab_data and tab_data.get('file_path') and tab_data.get('modified'):
-                try:
-                    file_path = tab_data['file_path']
-                    content = tab_data['text_edit'].toPlainText()
-                   
-                    # Создаем резервную копию
-                    backup_name = f"autosave_{Path(file_path).name}_{int(time.time())}.bak"
-                    backup_path = self.editor.backup_dir / backup_name
-                   
-                    with open(backup_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                   
-                    # Сохраняем основной файл
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                   
-                    tab_data['modified'] = False
-                   
-                except Exception as e:
-                    print(f"Ошибка автосохранения: {e}")
-                   
+        tick = AutoSaveTick(time.time())
+        started = time.perf_counter()
+        for tab_data in self.editor.tabs:
+            if (tab_data.file_path and tab_data.modified
+                    and not tab_data.loader and not tab_data.large_file
+                    and not tab_data.pending):
+                file_path = tab_data.file_path
+                # Прошлая запись этого файла еще не закончена
+                if file_path in self.pending:
+                    continue
+               
+                # Чужие изменения на диске без спроса не затираем
+                if self.editor.file_watch_service.changed_on_disk(file_path):
+                    continue
+               
+                saved = tab_data.saved
+                job = AutoSaveJob(tab_data.text_edit, file_path, tab_data.encoding,
+                                  tab_data.compression, self.generations.get(file_path, 0),
+                                  saved[2] if saved else None, tick)
+                self.pending.add(file_path)
+                self.editor.file_watch_service.begin_save(file_path)
+                self.snapshot_queue.append(job)
+                tick.tabs += 1
+        tick.pause = tick.snapshot = (time.perf_counter() - started) * 1000
+        if tick.tabs:
+            tick.pending = tick.tabs
+            self.timings.append(tick)
+            self.snapshot_timer.start(0)
+       
+    def snapshot_step(self):
+        """Такт снимка: порции текста очередных вкладок"""
+        started = time.perf_counter()
+        deadline = started + AUTOSAVE_SNAPSHOT_SLICE
+        while self.snapshot_queue and time.perf_counter() < deadline:
+            job = self.snapshot_queue[0]
+            tab_data = self.editor.get_tab_data_for_widget(job.text_edit)
+            if tab_data is None or tab_data.pending is not None:
+                # Вкладку закрыли или выгрузили из памяти, пока снимок ждал
+                # очереди: в документе уже не ее текст
+                self.snapshot_queue.popleft()
+                self.finish_job(job)
+                continue
+            if self.snapshot_chunk(job):
+                self.snapshot_queue.popleft()
+                self.executor.submit(self.write_job, job)
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.timings:
+            tick = self.timings[-1]
+            tick.pause = max(tick.pause, elapsed)
+            tick.snapshot += elapsed
+        if not self.snapshot_queue:
+            self.snapshot_timer.stop()
+       
+    def snapshot_chunk(self, job):
+        """Снять очередную порцию документа, True когда снимок готов
+
+        Порция кончается на границе блока, поэтому суррогатные пары не
+        разрываются. Если документ изменился, снимок начинается заново;
+        после AUTOSAVE_SNAPSHOT_RETRIES попыток остаток снимается сразу.
+        """
+        document = job.text_edit.document()
+        if job.revision != document.revision():
+            if job.revision is not None:
+                job.restarts += 1
+                job.tick.restarts += 1
+            job.revision = document.revision()
+            job.parts = []
+            job.position = 0
+        last = document.characterCount() - 1
+        end = job.position + AUTOSAVE_SNAPSHOT_CHARS
+        if job.restarts >= AUTOSAVE_SNAPSHOT_RETRIES or end >= last:
+            end = last
+        else:
+            block = document.findBlock(end)
+            end = block.position()
+            if end <= job.position:
+                # Одна строка длиннее порции - берем ее целиком
+                end = block.position() + block.length() - 1
+        cursor = QTextCursor(document)
+        cursor.setPosition(job.position)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        job.parts.append(cursor.selectedText())
+        job.position = end
+        return end >= last
+       
+    def write_job(self, job):
+        """В пуле: резервная копия и запись файла из снимка"""
+        started = time.perf_counter()
+        try:
+            # Разделители блоков и строк - как в iter_document_chunks. Текст
+            # не склеивается: долгие операции над целой строкой держат GIL
+            # и останавливают GUI-поток
+            chunks = [part.replace('\u2029', '\n').replace('\u2028', '\n') for part in job.parts]
+            job.parts = None
+            job.digest = text_digest(chunks)
+            if job.digest == job.saved_digest:
+                # Правки вернули текст к сохраненному - писать нечего
+                job.written = True
+            else:
+                self.backup_store.put(job.path, chunks)
+                with self.file_locks.setdefault(job.path, threading.Lock()):
+                    # После снимка файл сохранили вручную - он уже новее
+                    if self.generations.get(job.path, 0) == job.generation:
+                        atomic_write(job.path, chunks, job.encoding, compression=job.compression)
+                        stat = os.stat(job.path)
+                        job.entry = WatchEntry(stat.st_size, stat.st_mtime_ns, file_digest(job.path))
+                        job.written = True
+        except Exception as e:
+            job.error = e
+        job.tick.write += (time.perf_counter() - started) * 1000
+        self.job_finished.emit(job)
+       
+    def on_job_finished(self, job):
+        """В GUI-потоке: снять признак изменения, если документ не правили"""
+        if job.error is not None:
+            print(f"Ошибка автосохранения: {job.error}")
+            self.editor.statusbar_manager.set_text(f"Ошибка автосохранения {os.path.basename(job.path)}: {job.error}")
+        tab_data = self.editor.get_tab_data_for_widget(job.text_edit)
+        if (job.written and tab_data and tab_data.pending is None and tab_data.file_path == job.path
+                and job.text_edit.document().revision() == job.revision):
+            self.editor.set_modified(tab_data, False, job.digest)
+        self.finish_job(job)
+       
+    def finish_job(self, job):
+        self.pending.discard(job.path)
+        self.editor.file_watch_service.end_save(job.path, job.entry)
+        tick = job.tick
+        tick.pending -= 1
+        if not tick.pending:
+            self.editor.statusbar_manager.set_text(
+                f"Автосохранение: файлов {tick.tabs}, пауза интерфейса {tick.pause:.1f} мс, "
+                f"запись {tick.write:.0f} мс"
+            )
+           
     def set_autosave_interval(self, minutes):
         """Установить интервал автосохранения"""
         if minutes < 1:
@@ -79,3 +294,115 @@ class AutoSaveManager:
         if self.editor.auto_save_enabled:
             self.stop_autosave()
             self.start_autosave()
+       
+    def retention(self):
+        """Ограничения хранилища копий: (число, дней, МБ)"""
+        settings = self.editor.settings
+        return (
+            settings.value("backup/max_count", BACKUP_MAX_COUNT, type=int),
+            settings.value("backup/max_age_days", BACKUP_MAX_AGE_DAYS, type=int),
+            settings.value("backup/max_size_mb", BACKUP_MAX_SIZE_MB, type=int),
+        )
+       
+    def apply_retention(self):
+        """Передать ограничения из настроек в хранилище и почистить его"""
+        max_count, max_age_days, max_size_mb = self.retention()
+        self.backup_store.max_count = max_count
+        self.backup_store.max_age = max_age_days * 86400
+        self.backup_store.max_size = max_size_mb * 1024 * 1024
+        try:
+            self.backup_store.prune()
+        except OSError as e:
+            print(f"Ошибка очистки резервных копий: {e}")
+       
+    def configure_retention(self):
+        """Диалог ограничений хранилища резервных копий"""
+        dialog = QDialog(self.editor)
+        dialog.setWindowTitle("Хранение резервных копий")
+        layout = QFormLayout(dialog)
+        max_count, max_age_days, max_size_mb = self.retention()
+        count_box = QSpinBox()
+        count_box.setRange(1, 1000)
+        count_box.setValue(max_count)
+        age_box = QSpinBox()
+        age_box.setRange(1, 3650)
+        age_box.setValue(max_age_days)
+        size_box = QSpinBox()
+        size_box.setRange(1, 100000)
+        size_box.setValue(max_size_mb)
+        layout.addRow("Копий одного файла:", count_box)
+        layout.addRow("Хранить дней:", age_box)
+        layout.addRow("Общий объем, МБ:", size_box)
+        used = self.backup_store.total_size() / (1024 * 1024)
+        layout.addRow(QLabel(f"Занято: {used:.1f} МБ"))
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow(buttons)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        settings = self.editor.settings
+        settings.setValue("backup/max_count", count_box.value())
+        settings.setValue("backup/max_age_days", age_box.value())
+        settings.setValue("backup/max_size_mb", size_box.value())
+        self.apply_retention()
+       
+    def show_backups(self):
+        """Список резервных копий текущего файла с просмотром и восстановлением"""
+        tab_data = self.editor.get_current_tab_data()
+        file_path = tab_data.file_path if tab_data else None
+        versions = self.backup_store.versions(file_path) if file_path else []
+        if not versions or tab_data.large_file or tab_data.loader:
+            QMessageBox.information(self.editor, "Резервные копии", "Для этой вкладки резервных копий нет")
+            return
+        versions.reverse()
+       
+        dialog = QDialog(self.editor)
+        dialog.setWindowTitle(f"Резервные копии: {tab_data.name}")
+        dialog.resize(900, 500)
+        layout = QVBoxLayout(dialog)
+        row = QHBoxLayout()
+        version_list = QListWidget()
+        for version in versions:
+            stamp = time.strftime("%d.%m.%Y %H:%M:%S", time.localtime(version.time))
+            version_list.addItem(f"{stamp}  ({version.size} симв.)")
+        view = QPlainTextEdit()
+        view.setReadOnly(True)
+        view.setFont(QFont("Consolas", 10))
+        row.addWidget(version_list, 1)
+        row.addWidget(view, 3)
+        layout.addLayout(row)
+       
+        def show_version(index):
+            if index < 0:
+                return
+            try:
+                view.setPlainText(self.backup_store.read(file_path, versions[index].id))
+            except (OSError, EOFError, ValueError) as e:
+                view.setPlainText(f"Не удалось прочитать копию: {e}")
+        version_list.currentRowChanged.connect(show_version)
+        version_list.setCurrentRow(0)
+       
+        buttons = QDialogButtonBox()
+        buttons.addButton("Восстановить", QDialogButtonBox.ButtonRole.AcceptRole)
+        buttons.addButton("Закрыть", QDialogButtonBox.ButtonRole.RejectRole)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        version = versions[version_list.currentRow()]
+        try:
+            text = self.backup_store.read(file_path, version.id)
+        except (OSError, EOFError, ValueError) as e:
+            QMessageBox.warning(self.editor, "Резервные копии", f"Не удалось прочитать копию: {e}")
+            return
+       
+        # Одной правкой, чтобы восстановление можно было отменить
+        cursor = QTextCursor(tab_data.text_edit.document())
+        cursor.beginEditBlock()
+        cursor.select(QTextCursor.SelectionType.Document)
+        cursor.insertText(text)
+        cursor.endEditBlock()
+        self.editor.set_modified(tab_data, True)
+        self.editor.statusbar_manager.set_text(f"Восстановлена резервная копия: {tab_data.name}")
@@ -0,0 +1,326 @@
+"""
+Отслеживание изменений открытых файлов другими программами
+"""
+import difflib
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+from PyQt6.QtGui import QTextCursor, QFont
+from PyQt6.QtWidgets import (QMessageBox, QDialog, QVBoxLayout, QPlainTextEdit,
+                             QDialogButtonBox)
+from app.core.encoding import get_encoding_detector
+from app.core.compression import detect_compression, open_decompressed
+from app.utils.constants import (WATCH_POLL_INTERVAL, WATCH_BATCH_SIZE,
+                                 WATCH_HASH_CHUNK, WATCH_DIFF_MAX_LINES)
+
+
+def file_digest(path):
+    """Хэш содержимого файла, читается порциями"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(WATCH_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class WatchEntry:
+    """Известное состояние файла на диске, digest None пока хэш не посчитан
+
+    changed - (размер, время) состояния, хэш которого уже оказался другим.
+    """
+
+    __slots__ = ('size', 'mtime_ns', 'digest', 'changed')
+
+    def __init__(self, size, mtime_ns, digest=None):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.changed = None
+
+
+class FileWatchService(QObject):
+    """Проверка открытых файлов на внешние изменения
+
+    QFileSystemWatcher сообщает об изменениях сразу, а таймер за каждый
+    цикл проверяет через os.stat не более WATCH_BATCH_SIZE файлов по кругу.
+    Если размер тот же, а изменилось только время модификации, сравнивается
+    хэш содержимого, поэтому простое касание файла не тревожит пользователя.
+    Все хэши считаются в фоновом потоке: исходный - после track(),
+    проверочный - когда изменилось только время. Пока хэша нет, файл
+    считается измененным, а пользователя спрашивают только после проверки.
+    Файлы незагруженных вкладок-заготовок опрос не проверяет.
+    """
+
+    # (путь, запись, (размер, время), хэш или None) из рабочего потока
+    _digest_ready = pyqtSignal(object, object, object, object)
+
+    def __init__(self, editor):
+        super().__init__()
+        self.editor = editor
+        self.entries = {}
+        # Файлы, которые сейчас записывает сам редактор в фоне
+        self.saving = set()
+        self._poll_position = 0
+        self._prompting = False
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="watch-digest")
+        # Файлы, проверочный хэш которых сейчас считается
+        self.confirming = set()
+        self._digest_ready.connect(self._on_digest_ready)
+        self.watcher = QFileSystemWatcher()
+        self.watcher.fileChanged.connect(self.check_path)
+        self.poll_timer = QTimer()
+        self.poll_timer.timeout.connect(self.poll)
+        self.poll_timer.start(WATCH_POLL_INTERVAL)
+
+    def watched_tabs(self, path=None):
+        """Вкладки с файлами, за которыми нужно следить"""
+        return [
+            tab_data for tab_data in self.editor.tabs
+            if tab_data.file_path
+            and not tab_data.large_file
+            and not tab_data.loader
+            and not tab_data.follow
+            and (path is None or tab_data.file_path == path)
+        ]
+
+    def track(self, path):
+        """Запомнить текущее состояние файла как известное"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.entries.pop(path, None)
+            return
+        entry = self.entries[path] = WatchEntry(stat.st_size, stat.st_mtime_ns)
+        self.executor.submit(self._compute_digest, path, entry)
+        if path not in self.watcher.files():
+            self.watcher.addPath(path)
+
+    @staticmethod
+    def _compute_digest(path, entry):
+        """В рабочем потоке: хэш файла для entry, если файл с тех пор не менялся"""
+        try:
+            digest = file_digest(path)
+            stat = os.stat(path)
+        except OSError:
+            return
+        if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+            entry.digest = digest
+
+    def shutdown(self):
+        """Отменить ожидающие подсчеты хэшей при выходе"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def begin_save(self, path):
+        """Файл записывается в фоне - его изменения не считаются чужими"""
+        self.saving.add(path)
+
+    def end_save(self, path, entry=None):
+        """Фоновая запись закончена, entry - состояние файла после нее"""
+        self.saving.discard(path)
+        if entry is None:
+            return
+        self.entries[path] = entry
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+
+    def untrack(self, path):
+        self.entries.pop(path, None)
+        if path in self.watcher.files():
+            self.watcher.removePath(path)
+
+    def disk_state(self, path, wait=False):
+        """Изменился ли файл с момента последнего track()
+
+        None - изменилось только время, и хэш для сравнения еще считается
+        в фоне. С wait хэш считается сразу и ответ всегда True или False.
+        """
+        entry = self.entries.get(path)
+        if entry is None or path in self.saving:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        key = (stat.st_size, stat.st_mtime_ns)
+        if key == (entry.size, entry.mtime_ns):
+            return False
+        if stat.st_size != entry.size or entry.digest is None or entry.changed == key:
+            # Другой размер - другое содержимое, а без хэша не сравнить
+            return True
+        if wait:
+            digest = self._confirm_digest(path, key)
+            return digest is None or self._apply_digest(entry, key, digest)
+        if path not in self.confirming:
+            self.confirming.add(path)
+            self.executor.submit(self._confirm, path, entry, key)
+        return None
+
+    def changed_on_disk(self, path):
+        """Изменился ли файл; пока это не проверено, считается, что да"""
+        return self.disk_state(path) is not False
+
+    @staticmethod
+    def _confirm_digest(path, key):
+        """Хэш файла, если он все еще в состоянии key, иначе None"""
+        try:
+            digest = file_digest(path)
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return digest if (stat.st_size, stat.st_mtime_ns) == key else None
+
+    def _confirm(self, path, entry, key):
+        """В рабочем потоке: проверочный хэш для disk_state"""
+        self._digest_ready.emit(path, entry, key, self._confirm_digest(path, key))
+
+    @staticmethod
+    def _apply_digest(entry, key, digest):
+        """Запомнить итог проверки состояния key, вернуть True если файл другой"""
+        if digest == entry.digest:
+            # Содержимое то же (например, touch) - обновляем метаданные
+            entry.size, entry.mtime_ns = key
+            return False
+        entry.changed = key
+        return True
+
+    def _on_digest_ready(self, path, entry, key, digest):
+        self.confirming.discard(path)
+        if self.entries.get(path) is not entry:
+            # Файл с тех пор перечитали, сохранили или закрыли
+            return
+        # Без хэша файл снова изменился, пока хэш считался - проверим заново
+        if digest is None or self._apply_digest(entry, key, digest):
+            self.check_path(path)
+
+    def poll(self):
+        """Цикл опроса: очередная порция файлов по кругу"""
+        tabs = self.watched_tabs()
+        # Заготовки не опрашиваются, но известное состояние их файлов
+        # сохраняется до загрузки
+        for path in set(self.entries) - {tab_data.file_path for tab_data in tabs}:
+            self.untrack(path)
+        paths = sorted({tab_data.file_path for tab_data in tabs if tab_data.pending is None})
+        if not paths:
+            return
+        start = self._poll_position % len(paths)
+        batch = paths[start:start + WATCH_BATCH_SIZE]
+        self._poll_position = start + len(batch)
+        for path in batch:
+            if path not in self.entries:
+                self.track(path)
+            else:
+                self.check_path(path)
+
+    def check_path(self, path):
+        """Проверить файл и спросить пользователя, если он изменился"""
+        if self._prompting or not self.disk_state(path):
+            # После атомарной замены файла наблюдатель теряет путь
+            if path in self.entries and path not in self.watcher.files() and os.path.exists(path):
+                self.watcher.addPath(path)
+            return
+        tabs = self.watched_tabs(path)
+        if not tabs:
+            return
+
+        if not os.path.exists(path):
+            self.entries.pop(path, None)
+            self.editor.statusbar_manager.set_text(f"Файл удален с диска: {path}")
+            return
+
+        self._prompting = True
+        try:
+            for tab_data in tabs:
+                if tab_data.pending is not None and not tab_data.pending.get('modified'):
+                    # Чистая заготовка и так прочитает файл при загрузке
+                    continue
+                self.editor.session_manager.restore_tab(tab_data)
+                self.ask_reload(tab_data)
+        finally:
+            self._prompting = False
+        self.track(path)
+
+    def ask_reload(self, tab_data):
+        """Предложить перезагрузить вкладку или показать различия"""
+        message = f"Файл {tab_data.file_path} изменен другой программой."
+        if self.editor.is_dirty(tab_data):
+            message += "\nНесохраненные изменения во вкладке будут потеряны при перезагрузке."
+        box = QMessageBox(QMessageBox.Icon.Question, "Файл изменен", message, parent=self.editor)
+        reload_button = box.addButton("Перезагрузить", QMessageBox.ButtonRole.AcceptRole)
+        diff_button = box.addButton("Показать различия", QMessageBox.ButtonRole.ActionRole)
+        box.addButton("Игнорировать", QMessageBox.ButtonRole.RejectRole)
+        box.exec()
+
+        if box.clickedButton() is diff_button:
+            if self.show_diff(tab_data):
+                self.reload_tab(tab_data)
+        elif box.clickedButton() is reload_button:
+            self.reload_tab(tab_data)
+
+    def read_disk_text(self, tab_data):
+        path = tab_data.file_path
+        compression = detect_compression(path)
+        if not compression:
+            return get_encoding_detector().read_text(path)[0]
+        with open(path, 'rb') as raw, open_decompressed(raw, compression) as f:
+            text = f.read().decode(tab_data.encoding, errors='replace')
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    def reload_tab(self, tab_data):
+        """Перечитать файл во вкладку одной отменяемой правкой"""
+        text_edit = tab_data.text_edit
+        text = self.read_disk_text(tab_data)
+        tab_data.save_view()
+
+        cursor = QTextCursor(text_edit.document())
+        cursor.beginEditBlock()
+        cursor.select(QTextCursor.SelectionType.Document)
+        cursor.insertText(text)
+        cursor.endEditBlock()
+
+        tab_data.restore_view()
+        self.editor.set_modified(tab_data, False)
+        self.editor.statusbar_manager.set_text(f"Файл перезагружен: {tab_data.name}")
+
+    def show_diff(self, tab_data):
+        """Показать различия вкладки и диска, вернуть True для перезагрузки"""
+        old_lines = tab_data.text_edit.toPlainText().splitlines(keepends=True)
+        new_lines = self.read_disk_text(tab_data).splitlines(keepends=True)
+        diff = []
+        for line in difflib.unified_diff(old_lines, new_lines, "вкладка", "диск"):
+            diff.append(line)
+            if len(diff) >= WATCH_DIFF_MAX_LINES:
+                diff.append("\n... различия обрезаны ...\n")
+                break
+
+        dialog = QDialog(self.editor)
+        dialog.setWindowTitle(f"Различия: {tab_data.name}")
+        dialog.resize(800, 500)
+        layout = QVBoxLayout(dialog)
+        view = QPlainTextEdit()
+        view.setReadOnly(True)
+        view.setFont(QFont("Consolas", 10))
+        view.setPlainText("".join(diff) or "Различий в тексте нет")
+        layout.addWidget(view)
+        buttons = QDialogButtonBox()
+        buttons.addButton("Перезагрузить", QDialogButtonBox.ButtonRole.AcceptRole)
+        buttons.addButton("Закрыть", QDialogButtonBox.ButtonRole.RejectRole)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        return dialog.exec() == QDialog.DialogCode.Accepted
+
+    def confirm_overwrite(self, path):
+        """Перед сохранением: не затираем молча чужие изменения
+
+        Сохранение запрошено пользователем, поэтому проверочный хэш
+        здесь дожидается результата.
+        """
+        if not self.disk_state(path, wait=True):
+            return True
+        reply = QMessageBox.question(
+            self.editor,
+            "Файл изменен",
+            f"Файл {path} был изменен другой программой.\nПерезаписать его?"
+        )
+        return reply == QMessageBox.StandardButton.Yes
@@ -0,0 +1,260 @@
+"""
+Панель поиска в файлах папки и в открытых вкладках
+"""
+import os
+import re
+from PyQt6.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
+                             QPushButton, QLabel, QCheckBox, QListView, QFileDialog, QComboBox)
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+from app.core.file_search import FileSearch, split_globs
+from app.core.tab_search import OpenTabsSearch
+from app.core.search_engine import get_search_engine
+from app.utils.constants import FIND_FILES_EXCLUDE
+
+
+class SearchResultsModel(QAbstractListModel):
+    """Результаты поиска; список виртуальный, строки дописываются порциями
+
+    Строка результата - (путь, строка, колонка, текст, виджет). Виджет
+    задан у результатов из открытых вкладок, путь у них - имя вкладки.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = ''
+        self.results = []
+        self.files = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        path, line, column, preview, _ = self.results[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            name = os.path.relpath(path, self.root) if self.root else path
+            return f"{name}:{line}:{column}: {preview.strip()}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return path
+        return None
+
+    def append(self, results):
+        first = len(self.results)
+        self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+        for result in results:
+            self.results.append(result if len(result) == 5 else (*result, None))
+        self.files.update(result[4] or result[0] for result in results)
+        self.endInsertRows()
+
+    def reset(self, root):
+        self.beginResetModel()
+        self.root = root
+        self.results = []
+        self.files = set()
+        self.endResetModel()
+
+
+class FindInFilesPanel(QDockWidget):
+    """Поиск строки или выражения во всех файлах папки или во вкладках"""
+
+    def __init__(self, editor):
+        super().__init__("Найти в файлах", editor)
+        self.editor = editor
+        self.search = None
+        # Результаты по документам вкладок между поисками
+        self.tab_cache = {}
+        self.setObjectName("FindInFilesPanel")
+        self.setup_ui()
+
+    def setup_ui(self):
+        """Настройка UI"""
+        widget = QWidget()
+        layout = QVBoxLayout()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+
+        row = QHBoxLayout()
+        row.addWidget(QLabel("Найти:"))
+        self.query_input = QLineEdit()
+        self.query_input.returnPressed.connect(self.start_search)
+        row.addWidget(self.query_input)
+        self.case_sensitive = QCheckBox("Учитывать регистр")
+        row.addWidget(self.case_sensitive)
+        self.whole_words = QCheckBox("Целые слова")
+        row.addWidget(self.whole_words)
+        self.use_regex = QCheckBox("Регулярное выражение")
+        row.addWidget(self.use_regex)
+        self.use_index = QCheckBox("Индекс")
+        self.use_index.setToolTip("Хранить триграммный индекс папки в ~/.texteditor/index\n"
+                                  "и при повторных поисках читать только подходящие файлы")
+        row.addWidget(self.use_index)
+        layout.addLayout(row)
+
+        row = QHBoxLayout()
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItems(["В папке", "В открытых вкладках"])
+        self.scope_combo.currentIndexChanged.connect(self.on_scope_changed)
+        row.addWidget(self.scope_combo)
+        self.folder_label = QLabel("Папка:")
+        row.addWidget(self.folder_label)
+        self.folder_input = QLineEdit()
+        row.addWidget(self.folder_input)
+        self.browse_btn = QPushButton("...")
+        self.browse_btn.setMaximumWidth(30)
+        self.browse_btn.clicked.connect(self.choose_folder)
+        row.addWidget(self.browse_btn)
+        self.include_label = QLabel("Файлы:")
+        row.addWidget(self.include_label)
+        self.include_input = QLineEdit()
+        self.include_input.setPlaceholderText("*.py; *.txt")
+        row.addWidget(self.include_input)
+        self.exclude_label = QLabel("Кроме:")
+        row.addWidget(self.exclude_label)
+        self.exclude_input = QLineEdit(FIND_FILES_EXCLUDE)
+        row.addWidget(self.exclude_input)
+        row.addStretch()
+        self.find_btn = QPushButton("Найти")
+        self.find_btn.clicked.connect(self.start_search)
+        row.addWidget(self.find_btn)
+        self.stop_btn = QPushButton("Стоп")
+        self.stop_btn.clicked.connect(self.cancel_search)
+        self.stop_btn.setEnabled(False)
+        row.addWidget(self.stop_btn)
+        layout.addLayout(row)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        self.model = SearchResultsModel(self)
+        self.results_view = QListView()
+        self.results_view.setModel(self.model)
+        # Одинаковая высота строк: список не измеряет каждую из них
+        self.results_view.setUniformItemSizes(True)
+        self.results_view.doubleClicked.connect(self.open_result)
+        layout.addWidget(self.results_view)
+
+    def show_panel(self, open_tabs=False, text=None):
+        """Показать панель, по умолчанию искать в папке текущего файла"""
+        self.scope_combo.setCurrentIndex(1 if open_tabs else 0)
+        if text:
+            self.query_input.setText(text)
+        if not self.folder_input.text():
+            tab_data = self.editor.get_current_tab_data()
+            if tab_data and tab_data.file_path:
+                self.folder_input.setText(os.path.dirname(tab_data.file_path))
+            else:
+                self.folder_input.setText(os.getcwd())
+        self.show()
+        self.raise_()
+        self.query_input.setFocus()
+        self.query_input.selectAll()
+
+    def in_open_tabs(self):
+        return self.scope_combo.currentIndex() == 1
+
+    def on_scope_changed(self):
+        """Поля папки и масок нужны только для поиска в файлах"""
+        folder = not self.in_open_tabs()
+        for widget in (self.folder_label, self.folder_input, self.browse_btn, self.include_label,
+                       self.include_input, self.exclude_label, self.exclude_input, self.use_index):
+            widget.setVisible(folder)
+
+    def choose_folder(self):
+        folder = QFileDialog.getExistingDirectory(self.editor, "Папка для поиска", self.folder_input.text())
+        if folder:
+            self.folder_input.setText(folder)
+
+    def start_search(self):
+        """Запустить поиск, прервав предыдущий"""
+        text = self.query_input.text()
+        root = self.folder_input.text()
+        if not text:
+            return
+        if self.in_open_tabs():
+            root = ''
+        elif not os.path.isdir(root):
+            self.status_label.setText(f"Папка не найдена: {root}")
+            return
+        query = (text, self.case_sensitive.isChecked(), self.whole_words.isChecked(),
+                 self.use_regex.isChecked())
+        try:
+            # Ошибку в выражении показываем сразу, а не из процессов пула
+            get_search_engine().compile(*query)
+        except re.error as e:
+            self.status_label.setText(f"Ошибка в регулярном выражении: {e}")
+            return
+
+        self.cancel_search()
+        self.model.reset(root)
+        if self.in_open_tabs():
+            self.search = OpenTabsSearch(self.editor, query, self.tab_cache, self)
+        else:
+            self.search = FileSearch(root, query, split_globs(self.include_input.text()),
+                                     split_globs(self.exclude_input.text()),
+                                     self.use_index.isChecked(), self)
+        self.search.results_ready.connect(self.model.append)
+        self.search.progress_changed.connect(self.on_progress)
+        self.search.finished.connect(self.on_finished)
+        self.find_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.status_label.setText("Поиск...")
+        self.search.start()
+
+    def cancel_search(self):
+        if self.search:
+            self.search.cancel()
+
+    def on_progress(self, done, total):
+        if self.sender() is not self.search:
+            return
+        self.status_label.setText(
+            f"Просмотрено {self.units(self.search, True)}: {done} из {total}{self.skipped_text(self.search)} | "
+            f"Совпадений: {len(self.model.results)} в {len(self.model.files)} {self.units(self.search)}"
+        )
+
+    def units(self, search, genitive=False):
+        if isinstance(search, OpenTabsSearch):
+            return "вкладок" if genitive else "вкладках"
+        return "файлов" if genitive else "файлах"
+
+    def skipped_text(self, search):
+        if isinstance(search, OpenTabsSearch):
+            notes = []
+            if search.files_cached:
+                notes.append(f"без изменений {search.files_cached}")
+            if search.files_skipped:
+                notes.append(f"больших файлов пропущено {search.files_skipped}")
+            return f" ({', '.join(notes)})" if notes else ""
+        return f" (индекс отсеял {search.files_skipped})" if search.files_skipped else ""
+
+    def on_finished(self, cancelled):
+        search = self.sender()
+        search.deleteLater()
+        if search is not self.search:
+            return
+        self.search = None
+        self.find_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        prefix = "Поиск остановлен" if cancelled else "Поиск завершен"
+        self.status_label.setText(
+            f"{prefix}{self.skipped_text(search)} | Совпадений: {len(self.model.results)} "
+            f"в {len(self.model.files)} {self.units(search)}"
+        )
+
+    def open_result(self, index):
+        """Открыть файл или вкладку результата на строке совпадения"""
+        path, line, _, _, widget = self.model.results[index.row()]
+        if widget is None:
+            self.editor.file_manager.open_file(path, line=line)
+        elif self.editor.tab_widget.indexOf(widget) >= 0:
+            # Переход на вкладку-заготовку загружает ее текст
+            self.editor.tab_widget.setCurrentWidget(widget)
+            tab_data = self.editor.get_tab_data_for_widget(widget)
+            if tab_data and tab_data.loader:
+                tab_data.goto_line = line
+            else:
+                self.editor.editor_commands.go_to_line(widget, line)
+            widget.setFocus()
+        else:
+            self.status_label.setText(f"Вкладка закрыта: {path}")
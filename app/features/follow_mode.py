@@ -0,0 +1,197 @@
+"""
+Режим слежения за растущими файлами (как tail -f)
+"""
+import codecs
+import os
+from PyQt6.QtCore import QTimer, QFileSystemWatcher
+from PyQt6.QtGui import QTextCursor
+from app.utils.constants import FOLLOW_POLL_INTERVAL, FOLLOW_MAX_LINES, FOLLOW_MAX_READ
+
+
+class FollowState:
+    """Состояние слежения за файлом одной вкладки"""
+
+    def __init__(self, path, encoding, offset, inode):
+        self.path = path
+        self.encoding = encoding
+        self.offset = offset
+        self.inode = inode
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.pending_cr = ''
+        # В документ что-то дописывали: его текст больше не равен файлу
+        self.appended = False
+
+    def reset(self, inode):
+        """Начать чтение заново (файл усечен или заменен)"""
+        self.offset = 0
+        self.inode = inode
+        self.decoder.reset()
+        self.pending_cr = ''
+
+
+class FollowManager:
+    """Дописывание в вкладки новых данных из отслеживаемых файлов
+
+    Изменения ловит QFileSystemWatcher, а таймер подстраховывает его на
+    файловых системах без уведомлений и после ротации, когда прежний
+    путь на время исчезает. Читается только дописанный диапазон байтов.
+    """
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.watcher = QFileSystemWatcher()
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.poll_timer = QTimer()
+        self.poll_timer.timeout.connect(self.poll)
+
+    def followed_tabs(self):
+        return [tab_data for tab_data in self.editor.tabs if tab_data.follow]
+
+    def toggle_follow(self):
+        """Включить/выключить слежение за файлом текущей вкладки"""
+        tab_data = self.editor.get_current_tab_data()
+        if not tab_data:
+            return
+        if tab_data.follow:
+            self.stop_following(tab_data)
+            self.editor.statusbar_manager.set_text("Слежение за файлом выключено")
+        else:
+            self.start_following(tab_data)
+
+    def start_following(self, tab_data):
+        """Начать слежение за файлом вкладки с того места, где кончается документ"""
+        file_path = tab_data.file_path
+        if not file_path or tab_data.large_file or tab_data.compression:
+            self.editor.statusbar_manager.set_text("Слежение доступно только для обычных файлов")
+            return
+        if tab_data.loader or self.editor.is_dirty(tab_data):
+            self.editor.statusbar_manager.set_text("Сохраните изменения или дождитесь загрузки файла")
+            return
+
+        stat = os.stat(file_path)
+        # Документ отражает файл того размера, что запомнили при загрузке
+        # или сохранении; дописанное с тех пор покажет первое чтение
+        entry = self.editor.file_watch_service.entries.get(file_path)
+        offset = entry.size if entry is not None else stat.st_size
+        tab_data.follow = FollowState(file_path, tab_data.encoding,
+                                         offset, stat.st_ino)
+        # Журнал только дописывается извне, править его в редакторе нельзя
+        tab_data.text_edit.setReadOnly(True)
+        self.editor.edit_journal.suspend(tab_data)
+        self.watcher.addPath(file_path)
+        if not self.poll_timer.isActive():
+            self.poll_timer.start(FOLLOW_POLL_INTERVAL)
+        self.editor.update_tab_label(tab_data.text_edit)
+        self.editor.statusbar_manager.set_text(f"Слежение за файлом {tab_data.name}")
+        self.read_appended(tab_data)
+
+    def stop_following(self, tab_data):
+        """Прекратить слежение за файлом вкладки
+
+        Дописанный текст мог лишиться начала, получить отметки о ротации
+        и замены недекодируемых байтов, поэтому вкладка, в которую что-то
+        дописали, перечитывает файл: иначе сохранение записало бы этот
+        текст поверх настоящего файла.
+        """
+        state = tab_data.follow
+        if not state:
+            return
+        tab_data.follow = None
+        if not any(other.follow and other.follow.path == state.path
+                   for other in self.editor.tabs):
+            self.watcher.removePath(state.path)
+        if not self.followed_tabs():
+            self.poll_timer.stop()
+        if tab_data not in self.editor.tabs:
+            # Вкладку закрывают
+            return
+        if state.appended and os.path.exists(state.path):
+            tab_data.save_view()
+            # Загрузчик дописывает в документ, поэтому он очищается; правку,
+            # историю отмены и журнал загрузчик вернет сам
+            tab_data.text_edit.setPlainText('')
+            self.editor.file_manager.start_loader(tab_data)
+            return
+        tab_data.text_edit.setReadOnly(False)
+        self.editor.edit_journal.resume(tab_data)
+        if state.appended:
+            # Файла больше нет - текст вкладки с диском не совпадает
+            self.editor.set_modified(tab_data, True)
+        self.editor.update_tab_label(tab_data.text_edit)
+
+    def on_file_changed(self, path):
+        for tab_data in self.followed_tabs():
+            if tab_data.follow.path == path:
+                self.read_appended(tab_data)
+        # После ротации наблюдатель теряет путь, возвращаем его
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+
+    def poll(self):
+        for tab_data in self.followed_tabs():
+            self.read_appended(tab_data)
+            if tab_data.follow.path not in self.watcher.files() and os.path.exists(tab_data.follow.path):
+                self.watcher.addPath(tab_data.follow.path)
+
+    def read_appended(self, tab_data):
+        """Прочитать и дописать в документ новый диапазон файла"""
+        state = tab_data.follow
+        try:
+            stat = os.stat(state.path)
+        except OSError:
+            return  # файл в процессе ротации
+
+        text = ''
+        if stat.st_ino != state.inode or stat.st_size < state.offset:
+            reason = "заменен" if stat.st_ino != state.inode else "усечен"
+            state.reset(stat.st_ino)
+            text = f"\n--- файл {reason} ---\n"
+        if stat.st_size == state.offset and not text:
+            return
+
+        try:
+            with open(state.path, 'rb') as f:
+                f.seek(state.offset)
+                data = f.read(min(stat.st_size - state.offset, FOLLOW_MAX_READ))
+        except OSError:
+            return
+        state.offset += len(data)
+
+        decoded = state.pending_cr + state.decoder.decode(data)
+        state.pending_cr = ''
+        if decoded.endswith('\r'):
+            decoded, state.pending_cr = decoded[:-1], '\r'
+        text += decoded.replace('\r\n', '\n').replace('\r', '\n')
+        if text:
+            self.append_text(tab_data, text)
+
+    def append_text(self, tab_data, text):
+        """Дописать текст в конец, не трогая курсор пользователя"""
+        tab_data.follow.appended = True
+        text_edit = tab_data.text_edit
+        document = text_edit.document()
+        scrollbar = text_edit.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        excess = document.blockCount() - FOLLOW_MAX_LINES
+        if excess > 0:
+            # История правок после усечения начала теряет смысл и держала бы
+            # удаленный текст в памяти, поэтому отключаем её для документа
+            if document.isUndoRedoEnabled():
+                cursor.endEditBlock()
+                document.setUndoRedoEnabled(False)
+                cursor.beginEditBlock()
+            cursor.setPosition(0)
+            cursor.setPosition(document.findBlockByNumber(excess).position(),
+                               QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+        cursor.endEditBlock()
+        # Дописанное совпадает с файлом
+        document.setModified(False)
+
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
@@ -0,0 +1,149 @@
+"""
+Выгрузка давно не использованных вкладок из памяти
+"""
+import itertools
+import os
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QInputDialog
+from app.utils.constants import (TAB_MEMORY_BUDGET_MB, TAB_CHAR_BYTES, TAB_BLOCK_BYTES,
+                                 TAB_LAYOUT_CHAR_BYTES, HIBERNATE_MIN_BYTES, HIBERNATE_CHECK_DELAY,
+                                 HIBERNATE_CHECK_INTERVAL)
+
+
+class HibernationManager:
+    """Бюджет памяти документов вкладок
+
+    Память вкладки оценивается по числу символов и строк документа и по
+    тому, какая его часть уже разложена по строкам экрана: разметка
+    показанного документа занимает в десятки раз больше самого текста.
+    Когда сумма превышает бюджет, вкладки выгружаются, начиная с давно
+    не открывавшихся: сначала чистые, потом измененные. Выгруженная
+    вкладка становится такой же заготовкой, как вкладка сессии
+    (tab_data.pending): у чистой остаются путь и кодировка, текст
+    измененной сжимается в хранилище сессии. Документ очищается, а
+    виджет, подсчет статистики и журнал остаются на месте, поэтому при
+    переходе на вкладку SessionManager.restore_tab просто загружает текст
+    обратно, и курсор с прокруткой возвращаются на прежнее место.
+    История отмены выгруженной вкладки не сохраняется.
+    """
+
+    def __init__(self, editor):
+        self.editor = editor
+        self._clock = itertools.count(1)
+        # Проверка вскоре после смены вкладки
+        self.check_timer = QTimer(editor)
+        self.check_timer.setSingleShot(True)
+        self.check_timer.timeout.connect(self.check)
+        # И периодически - документы растут и при наборе
+        self.poll_timer = QTimer(editor)
+        self.poll_timer.timeout.connect(self.check)
+        self.poll_timer.start(HIBERNATE_CHECK_INTERVAL)
+
+    def budget(self):
+        """Бюджет памяти в байтах"""
+        return self.editor.settings.value("memory/budget_mb", TAB_MEMORY_BUDGET_MB, type=int) * 1024 * 1024
+
+    def configure_budget(self):
+        """Диалог бюджета памяти вкладок"""
+        used = self.total_footprint() / (1024 * 1024)
+        value, ok = QInputDialog.getInt(
+            self.editor, "Память вкладок",
+            f"Бюджет памяти документов, МБ (занято примерно {used:.0f} МБ):",
+            self.budget() // (1024 * 1024), 16, 1024 * 1024
+        )
+        if ok:
+            self.editor.settings.setValue("memory/budget_mb", value)
+            self.check()
+
+    @staticmethod
+    def laid_out_chars(document):
+        """Сколько символов документа уже разложено по строкам
+
+        Документ раскладывается сверху вниз, поэтому граница разложенной
+        части ищется двоичным поиском по блокам.
+        """
+        if document.lastBlock().layout().lineCount():
+            return document.characterCount()
+        if not document.firstBlock().layout().lineCount():
+            return 0
+        # Блок low разложен, блок high - нет
+        low, high = 0, document.blockCount() - 1
+        while high - low > 1:
+            middle = (low + high) // 2
+            if document.findBlockByNumber(middle).layout().lineCount():
+                low = middle
+            else:
+                high = middle
+        return document.findBlockByNumber(high).position()
+
+    @classmethod
+    def footprint(cls, tab_data):
+        """Примерный объем памяти документа вкладки в байтах"""
+        if tab_data.large_file or tab_data.pending:
+            return 0
+        document = tab_data.text_edit.document()
+        return (document.characterCount() * TAB_CHAR_BYTES + document.blockCount() * TAB_BLOCK_BYTES
+                + cls.laid_out_chars(document) * TAB_LAYOUT_CHAR_BYTES)
+
+    def total_footprint(self):
+        return sum(self.footprint(tab_data) for tab_data in self.editor.tabs)
+
+    def touch(self, tab_data):
+        """Вкладка стала текущей"""
+        if tab_data:
+            tab_data.last_used = next(self._clock)
+            self.check_timer.start(HIBERNATE_CHECK_DELAY)
+
+    def can_hibernate(self, tab_data):
+        if (tab_data.large_file or tab_data.loader or tab_data.follow or tab_data.pending
+                or self.footprint(tab_data) < HIBERNATE_MIN_BYTES):
+            return False
+        if tab_data.file_path in self.editor.autosave_manager.pending:
+            # Автосохранение снимает текст документа порциями - очистка
+            # документа подменила бы снимок пустым текстом
+            return False
+        if not self.editor.is_dirty(tab_data):
+            # Чистая вкладка перечитывается из файла, и он должен быть тем же
+            file_path = tab_data.file_path
+            if (not file_path or not os.path.exists(file_path)
+                    or self.editor.file_watch_service.changed_on_disk(file_path)):
+                return False
+        return True
+
+    def check(self):
+        """Выгрузить вкладки, если документы не помещаются в бюджет"""
+        budget = self.budget()
+        total = self.total_footprint()
+        if total <= budget:
+            return
+        current = self.editor.get_current_tab_data()
+        candidates = [
+            tab_data for tab_data in self.editor.tabs
+            if tab_data is not current and self.can_hibernate(tab_data)
+        ]
+        candidates.sort(key=lambda tab_data: (self.editor.is_dirty(tab_data), tab_data.last_used))
+        hibernated = 0
+        for tab_data in candidates:
+            if total <= budget:
+                break
+            total -= self.footprint(tab_data)
+            self.hibernate(tab_data)
+            hibernated += 1
+        if hibernated:
+            self.editor.statusbar_manager.set_text(f"Выгружено из памяти вкладок: {hibernated}")
+
+    def hibernate(self, tab_data):
+        """Заменить документ вкладки заготовкой"""
+        # Запись та же, что для сессии: путь или сжатый несохраненный текст
+        tab_info = self.editor.session_manager.tab_entry(tab_data)
+        tab_data.save_view()
+        # Очистку документа в журнал не пишем: в нем остается последний текст
+        self.editor.edit_journal.suspend(tab_data)
+        tab_data.pending = tab_info
+        tab_data.hibernated = True
+        tab_data.dirty_checked = None
+        tab_data.session_blob = None
+        text_edit = tab_data.text_edit
+        text_edit.setReadOnly(True)
+        # setPlainText освобождает и текст, и разметку, и историю отмены
+        text_edit.setPlainText('')
@@ -2,10 +2,15 @@
 """
 Виджет поиска и замены
 """
+import re
 from PyQt6.QtWidgets import (QWidget, QHBoxLayout, QLineEdit, QPushButton,
-                             QLabel, QCheckBox, QMessageBox)
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QTextCursor, QColor
+                             QLabel, QCheckBox, QMessageBox, QTextEdit)
+from PyQt6.QtCore import Qt, QTimer, QPoint
+from PyQt6.QtGui import QTextCursor, QColor, QTextCharFormat
+from app.core.search_engine import get_search_engine, block_matches, replace_all
+from app.core.match_index import MatchIndex, MatchScan
+from app.utils.constants import (SEARCH_HIGHLIGHT_MARGIN, SEARCH_HIGHLIGHT_DELAY,
+                                 SEARCH_INCREMENTAL_DELAY, SEARCH_NARROW_RATIO)
 class SearchReplaceWidget(QWidget):
     """Виджет для поиска и замены текста"""
    
@@ -15,8 +20,29 @@ class SearchReplaceWidget(QWidget):
         self.current_match = None
         self.search_visible = False
         self.replace_visible = False
+        self.engine = get_search_engine()
+        self.match_index = None
+        self.match_query = None
+        self.previous_index = None
+        self.previous_query = None
+        self.scan = None
+        self.highlighted_edit = None
+       
+        # Подсветка всех совпадений перерисовывается с небольшой задержкой
+        self.highlight_timer = QTimer(self)
+        self.highlight_timer.setSingleShot(True)
+        self.highlight_timer.timeout.connect(self.update_highlights)
+        self.highlight_format = QTextCharFormat()
+        self.highlight_format.setBackground(QColor(255, 220, 0, 110))
+       
+        # Поиск по мере ввода запускается после паузы в наборе
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.incremental_search)
        
         self.setup_ui()
+        self.editor.tab_widget.currentChanged.connect(self.schedule_highlights)
+        self.editor.tab_widget.currentChanged.connect(self.invalidate_index)
        
     def setup_ui(self):
         """Настройка UI"""
@@ -27,6 +53,8 @@ class SearchReplaceWidget(QWidget):
         main_layout.addWidget(QLabel("Найти:"))
         self.find_input = QLineEdit()
         self.find_input.returnPressed.connect(self.find_next)
+        self.find_input.textChanged.connect(self.schedule_highlights)
+        self.find_input.textChanged.connect(self.on_query_changed)
         main_layout.addWidget(self.find_input)
        
         # Кнопки поиска
@@ -38,6 +66,15 @@ class SearchReplaceWidget(QWidget):
         find_prev_btn.clicked.connect(self.find_previous)
         main_layout.addWidget(find_prev_btn)
        
+        find_tabs_btn = QPushButton("Во всех вкладках")
+        find_tabs_btn.setToolTip("Найти во всех открытых документах")
+        find_tabs_btn.clicked.connect(self.find_in_open_tabs)
+        main_layout.addWidget(find_tabs_btn)
+       
+        # Номер текущего совпадения и их общее число
+        self.match_label = QLabel("")
+        main_layout.addWidget(self.match_label)
+       
         # Поле замены (скрыто по умолчанию)
         main_layout.addWidget(QLabel("Заменить на:"))
         self.replace_input = QLineEdit()
@@ -67,6 +104,20 @@ class SearchReplaceWidget(QWidget):
         self.whole_words.hide()
         main_layout.addWidget(self.whole_words)
        
+        self.use_regex = QCheckBox("Регулярное выражение")
+        self.use_regex.hide()
+        main_layout.addWidget(self.use_regex)
+       
+        self.highlight_all = QCheckBox("Подсветить все")
+        self.highlight_all.setChecked(True)
+        self.highlight_all.hide()
+        main_layout.addWidget(self.highlight_all)
+       
+        for option in (self.case_sensitive, self.whole_words, self.use_regex, self.highlight_all):
+            option.toggled.connect(self.schedule_highlights)
+        for option in (self.case_sensitive, self.whole_words, self.use_regex):
+            option.toggled.connect(self.on_query_changed)
+       
         # Кнопка закрытия
         close_btn = QPushButton("✕")
         close_btn.setMaximumWidth(30)
@@ -83,8 +134,7 @@ class SearchReplaceWidget(QWidget):
         self.replace_label.hide()
         self.replace_btn.hide()
         self.replace_all_btn.hide()
-        self.case_sensitive.show()
-        self.whole_words.show()
+        self.show_options()
         self.find_input.setFocus()
         self.find_input.selectAll()
        
@@ -97,111 +147,390 @@ class SearchReplaceWidget(QWidget):
         self.replace_label.show()
         self.replace_btn.show()
         self.replace_all_btn.show()
+        self.show_options()
+        self.replace_input.setFocus()
+       
+    def show_options(self):
+        """Показать флажки параметров поиска"""
         self.case_sensitive.show()
         self.whole_words.show()
-        self.replace_input.setFocus()
+        self.use_regex.show()
+        self.highlight_all.show()
+        self.schedule_highlights()
        
-    def find_next(self):
-        """Найти следующее совпадение"""
-        text_edit = self.editor.get_current_text_edit()
-        if not text_edit:
+    def find_in_open_tabs(self):
+        """Искать текущий запрос во всех вкладках, результаты - в панели"""
+        if not self.find_input.text():
             return
-       
+        panel = self.editor.find_in_files_panel
+        panel.case_sensitive.setChecked(self.case_sensitive.isChecked())
+        panel.whole_words.setChecked(self.whole_words.isChecked())
+        panel.use_regex.setChecked(self.use_regex.isChecked())
+        panel.show_panel(open_tabs=True, text=self.find_input.text())
+        panel.start_search()
+       
+    def current_query(self):
+        """Запрос и флажки параметров поиска"""
+        return (self.find_input.text(), self.case_sensitive.isChecked(),
+                self.whole_words.isChecked(), self.use_regex.isChecked())
+       
+    def current_pattern(self, report_errors=True):
+        """Скомпилированный шаблон из поля поиска или None"""
         search_text = self.find_input.text()
         if not search_text:
-            return
-       
-        cursor = text_edit.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.EndOfSelection)
-       
-        # Параметры поиска
-        flags = 0
-        if self.case_sensitive.isChecked():
-            flags |= QTextDocument.FindFlag.FindCaseSensitively
-        if self.whole_words.isChecked():
-            flags |= QTextDocument.FindFlag.FindWholeWords
+            return None
+        try:
+            return self.engine.compile(
+                search_text,
+                case_sensitive=self.case_sensitive.isChecked(),
+                whole_words=self.whole_words.isChecked(),
+                regex=self.use_regex.isChecked()
+            )
+        except re.error as e:
+            if report_errors:
+                self.editor.statusbar_manager.set_text(f"Ошибка в регулярном выражении: {e}")
+            return None
+       
+    def find_in_large_view(self, backward=False):
+        """Поиск в просмотре большого файла, True если он активен"""
+        large_view = self.editor.get_current_large_view()
+        if not large_view:
+            return False
        
-        # Ищем текст
-        from PyQt6.QtGui import QTextDocument
-        document = text_edit.document()
-        cursor = document.find(search_text, cursor, QTextDocument.FindFlag(flags))
+        search_text = self.find_input.text()
+        if not search_text:
+            return True
+        try:
+            # Поиск идет порциями, итог придет в on_large_search_finished
+            large_view.find(
+                search_text,
+                backward=backward,
+                case_sensitive=self.case_sensitive.isChecked(),
+                whole_words=self.whole_words.isChecked(),
+                regex=self.use_regex.isChecked()
+            )
+        except re.error as e:
+            self.editor.statusbar_manager.set_text(f"Ошибка в регулярном выражении: {e}")
+            return True
+        self.editor.statusbar_manager.set_text("Поиск в большом файле...")
+        return True
+       
+    def on_large_search_finished(self, found):
+        """Итог поиска в просмотре большого файла"""
+        # Вместо "Поиск..." снова показывается строка состояния вкладки
+        self.editor.ui_scheduler.mark_status()
+        if not found:
+            QMessageBox.information(self.editor, "Поиск", "Текст не найден")
        
-        if not cursor.isNull():
-            text_edit.setTextCursor(cursor)
-            text_edit.setFocus()
-        else:
-            # Ищем с начала
-            cursor = QTextCursor(document)
-            cursor = document.find(search_text, cursor, QTextDocument.FindFlag(flags))
-           
-            if not cursor.isNull():
-                text_edit.setTextCursor(cursor)
-            else:
-                QMessageBox.information(self.editor, "Поиск", "Текст не найден")
+    def find_next(self):
+        """Найти следующее совпадение"""
+        self.find(backward=False)
                
     def find_previous(self):
         """Найти предыдущее совпадение"""
+        self.find(backward=True)
+       
+    def find(self, backward=False):
+        """Перейти к следующему (предыдущему) совпадению с переходом через край"""
+        if self.find_in_large_view(backward):
+            return
+       
         text_edit = self.editor.get_current_text_edit()
         if not text_edit:
             return
        
-        search_text = self.find_input.text()
-        if not search_text:
+        pattern = self.current_pattern()
+        if pattern is None:
             return
        
+        index = self.ensure_index(text_edit, pattern)
         cursor = text_edit.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.StartOfSelection)
+        if backward:
+            i = index.previous_index(cursor.selectionStart())
+        else:
+            i = index.next_index(cursor.selectionEnd())
        
-        # Параметры поиска
-        flags = QTextDocument.FindFlag.FindBackward
-        if self.case_sensitive.isChecked():
-            flags |= QTextDocument.FindFlag.FindCaseSensitively
-        if self.whole_words.isChecked():
-            flags |= QTextDocument.FindFlag.FindWholeWords
+        if i is not None:
+            self.select_match(text_edit, *index.match(i))
+            self.update_match_label()
+        else:
+            QMessageBox.information(self.editor, "Поиск", "Текст не найден")
+           
+    def ensure_index(self, text_edit, pattern):
+        """Индекс совпадений шаблона в документе, строится один раз на запрос"""
+        index = self.match_index
+        if index is None or index.document is not text_edit.document() or index.pattern != pattern:
+            # Фоновое построение не дожидаемся, индекс нужен сейчас
+            self.invalidate_index()
+            self.set_match_index(MatchIndex(text_edit.document(), pattern))
+        return self.match_index
+       
+    def set_match_index(self, index):
+        self.match_index = index
+        self.match_query = self.current_query()
+        index.changed.connect(self.update_match_label)
+       
+    def invalidate_index(self, *args):
+        """Забыть индекс совпадений (сменился запрос или вкладка)"""
+        self.search_timer.stop()
+        self.cancel_scan()
+        for index in (self.match_index, self.previous_index):
+            if index is not None:
+                index.detach()
+        self.match_index = self.previous_index = None
+        self.match_label.setText("")
+       
+    def cancel_scan(self):
+        if self.scan is not None:
+            self.scan.cancel()
+            self.scan.deleteLater()
+            self.scan = None
+       
+    def on_query_changed(self, *args):
+        """Запрос изменился: прервать поиск и запланировать новый
+
+        Готовый индекс прежнего запроса сохраняется: если новый запрос
+        его продолжает, искать достаточно среди прежних совпадений.
+        """
+        self.cancel_scan()
+        if self.match_index is not None:
+            if self.previous_index is not None:
+                self.previous_index.detach()
+            self.previous_index, self.previous_query = self.match_index, self.match_query
+            self.match_index = None
+        self.match_label.setText("")
+        self.search_timer.start(SEARCH_INCREMENTAL_DELAY)
+       
+    def can_narrow(self, query):
+        """Совпадения запроса лежат внутри совпадений previous_query
+
+        Верно для продолжения обычного текста с теми же флажками; у целых
+        слов и выражений совпадения нового запроса могут быть где угодно.
+        """
+        previous = self.previous_query
+        return (previous is not None and not query[3] and not query[2] and previous[1:] == query[1:]
+                and len(query[0]) > len(previous[0]) and query[0].startswith(previous[0]))
+       
+    def incremental_search(self):
+        """Поиск по мере ввода
+
+        Совпадение в видимой области выделяется сразу, а индекс всех
+        совпадений для счетчика строится порциями (MatchScan), не
+        задерживая ввод. Следующий символ запроса прерывает построение.
+        """
+        text_edit = self.editor.get_current_text_edit()
+        if not self.isVisible() or not text_edit or self.editor.get_current_large_view():
+            return
+        pattern = self.current_pattern(report_errors=False)
+        if pattern is None:
+            if self.find_input.text():
+                self.match_label.setText("Ошибка в выражении")
+            return
        
-        from PyQt6.QtGui import QTextDocument
         document = text_edit.document()
-        cursor = document.find(search_text, cursor, flags)
-       
-        if not cursor.isNull():
-            text_edit.setTextCursor(cursor)
+        query = self.current_query()
+        previous = self.previous_index
+        if (previous is None or previous.document is not document or not self.can_narrow(query)
+                or len(previous) * SEARCH_NARROW_RATIO > document.blockCount()):
+            # Проверка каждого прежнего совпадения дороже просмотра строки,
+            # поэтому частые совпадения выгоднее искать заново
+            previous = None
+        self.select_visible_match(text_edit, pattern)
+       
+        self.scan = MatchScan(document, pattern, previous, self)
+        self.scan.progress_changed.connect(self.on_scan_progress)
+        self.scan.finished.connect(self.on_scan_finished)
+        self.scan.start()
+       
+    def select_visible_match(self, text_edit, pattern):
+        """Выделить первое видимое совпадение от начала выделения, True если есть"""
+        origin = text_edit.textCursor().selectionStart()
+        matches = [match for block in self.visible_blocks(text_edit) for match in block_matches(block, pattern)]
+        after = [match for match in matches if match[0] >= origin]
+        if not after:
+            return False
+        self.select_match(text_edit, *after[0], focus=False)
+        return True
+       
+    def on_scan_progress(self, count):
+        if self.sender() is self.scan:
+            self.match_label.setText(f"Совпадений: {count}…")
+       
+    def on_scan_finished(self, index):
+        """Индекс построен: заменить им индекс прежнего запроса"""
+        if self.sender() is not self.scan:
+            index.detach()
+            return
+        self.scan.deleteLater()
+        self.scan = None
+        if self.previous_index is not None:
+            self.previous_index.detach()
+            self.previous_index = None
+        self.set_match_index(index)
+        text_edit = self.editor.get_current_text_edit()
+        if text_edit and text_edit.document() is index.document:
+            cursor = text_edit.textCursor()
+            if len(index) and index.index_of(cursor.selectionStart(), cursor.selectionEnd() - cursor.selectionStart()) is None:
+                # В видимой области совпадения не нашлось - переходим к ближайшему
+                self.select_match(text_edit, *index.match(index.next_index(cursor.selectionStart())), focus=False)
+        self.update_match_label()
+       
+    def update_match_label(self):
+        """Показать «n из m» для выделенного совпадения"""
+        index = self.match_index
+        text_edit = self.editor.get_current_text_edit()
+        if index is None or not text_edit or index.document is not text_edit.document():
+            self.match_label.setText("")
+            return
+        cursor = text_edit.textCursor()
+        i = index.index_of(cursor.selectionStart(), cursor.selectionEnd() - cursor.selectionStart())
+        if i is None:
+            self.match_label.setText(f"Совпадений: {len(index)}")
         else:
-            QMessageBox.information(self.editor, "Поиск", "Текст не найден")
+            self.match_label.setText(f"{i + 1} из {len(index)}")
+           
+    def select_match(self, text_edit, position, length, focus=True):
+        """Выделить совпадение и прокрутить к нему"""
+        cursor = QTextCursor(text_edit.document())
+        cursor.setPosition(position)
+        cursor.setPosition(position + length, QTextCursor.MoveMode.KeepAnchor)
+        text_edit.setTextCursor(cursor)
+        if focus:
+            text_edit.setFocus()
+           
+    def schedule_highlights(self, *args):
+        """Запланировать перерисовку подсветки совпадений"""
+        self.highlight_timer.start(SEARCH_HIGHLIGHT_DELAY)
+       
+    def watch_text_edit(self, text_edit):
+        """Следить за прокруткой и правками редактора с подсветкой"""
+        if text_edit is self.highlighted_edit:
+            return
+        self.clear_highlights()
+        self.highlighted_edit = text_edit
+        if text_edit:
+            text_edit.verticalScrollBar().valueChanged.connect(self.schedule_highlights)
+            text_edit.document().contentsChanged.connect(self.schedule_highlights)
+           
+    def clear_highlights(self):
+        """Убрать подсветку и отключиться от прежнего редактора"""
+        text_edit = self.highlighted_edit
+        self.highlighted_edit = None
+        if text_edit is None:
+            return
+        try:
+            text_edit.verticalScrollBar().valueChanged.disconnect(self.schedule_highlights)
+            text_edit.document().contentsChanged.disconnect(self.schedule_highlights)
+            text_edit.setExtraSelections([])
+        except (TypeError, RuntimeError):
+            pass  # вкладка уже закрыта
+           
+    def visible_blocks(self, text_edit):
+        """Блоки видимой области с запасом SEARCH_HIGHLIGHT_MARGIN в обе стороны"""
+        viewport = text_edit.viewport()
+        first = text_edit.cursorForPosition(QPoint(0, 0)).block()
+        for _ in range(SEARCH_HIGHLIGHT_MARGIN):
+            if not first.previous().isValid():
+                break
+            first = first.previous()
+        # Пока раскладка не готова, нижняя точка может указывать на конец
+        # документа, поэтому число блоков дополнительно ограничено по высоте
+        last = text_edit.cursorForPosition(QPoint(viewport.width() - 1, viewport.height() - 1)).block()
+        visible = viewport.height() // max(1, text_edit.fontMetrics().lineSpacing()) + 1
+        limit = visible + 2 * SEARCH_HIGHLIGHT_MARGIN
+        block = first
+        past_last = 0
+        while block.isValid() and limit > 0:
+            yield block
+            if block == last or past_last:
+                past_last += 1
+                if past_last > SEARCH_HIGHLIGHT_MARGIN:
+                    break
+            block = block.next()
+            limit -= 1
+       
+    def update_highlights(self):
+        """Подсветить совпадения в видимой части текущего документа"""
+        text_edit = self.editor.get_current_text_edit() if self.isVisible() else None
+        self.watch_text_edit(text_edit)
+        if not text_edit:
+            return
+       
+        pattern = self.current_pattern(report_errors=False) if self.highlight_all.isChecked() else None
+        selections = []
+        if pattern is not None:
+            document = text_edit.document()
+            for block in self.visible_blocks(text_edit):
+                for position, length in block_matches(block, pattern):
+                    selection = QTextEdit.ExtraSelection()
+                    selection.cursor = QTextCursor(document)
+                    selection.cursor.setPosition(position)
+                    selection.cursor.setPosition(position + length, QTextCursor.MoveMode.KeepAnchor)
+                    selection.format = self.highlight_format
+                    selections.append(selection)
+        text_edit.setExtraSelections(selections)
+           
+    def editable_text_edit(self):
+        """Текущий редактор, если в нем можно заменять текст
+
+        QTextCursor правит документ и при setReadOnly, поэтому вкладки,
+        которые загружаются, отслеживаются или еще не загружены из
+        сессии, здесь отсекаются явно.
+        """
+        text_edit = self.editor.get_current_text_edit()
+        if not text_edit:
+            return None
+        tab_data = self.editor.get_tab_data_for_widget(text_edit)
+        if text_edit.isReadOnly() or (tab_data and tab_data.pending is not None):
+            self.editor.statusbar_manager.set_text("Замена недоступна: вкладка только для чтения")
+            return None
+        return text_edit
            
     def replace_next(self):
         """Заменить текущее совпадение"""
-        text_edit = self.editor.get_current_text_edit()
+        text_edit = self.editable_text_edit()
         if not text_edit:
             return
        
         cursor = text_edit.textCursor()
-        if cursor.hasSelection():
-            cursor.insertText(self.replace_input.text())
+        pattern = self.current_pattern()
+        if cursor.hasSelection() and pattern is not None:
+            match = pattern.fullmatch(cursor.selectedText())
+            if match:
+                replace_text = self.replace_input.text()
+                try:
+                    cursor.insertText(match.expand(replace_text) if self.use_regex.isChecked() else replace_text)
+                except re.error as e:
+                    self.editor.statusbar_manager.set_text(f"Ошибка в строке замены: {e}")
+                    return
        
         self.find_next()
        
     def replace_all(self):
-        """Заменить все совпадения"""
-        text_edit = self.editor.get_current_text_edit()
+        """Заменить все совпадения одной отменяемой правкой"""
+        text_edit = self.editable_text_edit()
         if not text_edit:
             return
        
-        search_text = self.find_input.text()
-        replace_text = self.replace_input.text()
-       
-        if not search_text:
+        pattern = self.current_pattern()
+        if pattern is None:
             return
        
-        content = text_edit.toPlainText()
-        count = content.count(search_text)
+        scroll = text_edit.verticalScrollBar().value()
+        cursor = text_edit.textCursor()
+        try:
+            count = replace_all(text_edit.document(), pattern, self.replace_input.text(),
+                                expand=self.use_regex.isChecked(), text_cursor=cursor)
+        except re.error as e:
+            self.editor.statusbar_manager.set_text(f"Ошибка в строке замены: {e}")
+            return
+        text_edit.setTextCursor(cursor)
+        text_edit.verticalScrollBar().setValue(scroll)
        
         if count == 0:
             QMessageBox.information(self.editor, "Замена", "Текст не найден")
             return
        
-        new_content = content.replace(search_text, replace_text)
-        text_edit.setPlainText(new_content)
-       
         QMessageBox.information(
             self.editor,
             "Замена",
@@ -209,8 +538,11 @@ class SearchReplaceWidget(QWidget):
         )
        
     def hideEvent(self, event):
-        """При скрытии очищаем выделение"""
+        """При скрытии очищаем выделение и подсветку"""
         super().hideEvent(event)
+        self.highlight_timer.stop()
+        self.clear_highlights()
+        self.invalidate_index()
         text_edit = self.editor.get_current_text_edit()
         if text_edit:
             cursor = text_edit.textCursor()
@@ -22,19 +22,17 @@ class ThemeManager:
         theme = THEMES.get(self.editor.theme, THEMES['light'])
        
         # Применяем цвета к редактору
-        for i in range(self.editor.tab_widget.count()):
-            tab_data = self.editor.get_tab_data(i)
-            if tab_data:
-                text_edit = tab_data['text_edit']
-               
-                # Установка цветов
-                text_edit.setStyleSheet(f"""
-                    QTextEdit {{
-                        background-color: {theme['bg']};
-                        color: {theme['fg']};
-                        selection-background-color: {theme.get('selection', '#add6ff')};
-                    }}
-                """)
+        for tab_data in self.editor.tabs:
+            text_edit = tab_data.text_edit
+           
+            # Установка цветов
+            text_edit.setStyleSheet(f"""
+                QTextEdit, LargeFileView {{
+                    background-color: {theme['bg']};
+                    color: {theme['fg']};
+                    selection-background-color: {theme.get('selection', '#add6ff')};
+                }}
+            """)
        
         # Применяем тему к главному окну
         self.editor.setStyleSheet(f"""
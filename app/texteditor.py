@@ -14,12 +14,23 @@ from PyQt6.QtGui import QFont, QIcon, QAction, QKeySequence, QShortcut
 from app.core.file_manager import FileManager
 from app.core.editor_commands import EditorCommands
 from app.core.session_manager import SessionManager
+from app.core.edit_journal import EditJournal
+from app.core.tab_registry import TabRegistry, TabState
+from app.core.large_file import LargeFileView
+from app.core.document_stats import DocumentStats
+from app.core.save_pipeline import document_digest
 from app.features.search_replace import SearchReplaceWidget
 from app.features.autosave import AutoSaveManager
 from app.features.theme_manager import ThemeManager
+from app.features.follow_mode import FollowManager
+from app.features.hibernation import HibernationManager
+from app.features.file_watcher import FileWatchService
+from app.features.find_in_files import FindInFilesPanel
+from app.core.file_search import shutdown_search_pool
 from app.ui.menu import MenuManager
 from app.ui.toolbar import ToolbarManager
 from app.ui.statusbar import StatusBarManager
+from app.ui.update_scheduler import UpdateScheduler
 from app.utils.constants import *
 
 class TextEditorApp(QMainWindow):
@@ -32,7 +43,7 @@ class TextEditorApp(QMainWindow):
         self.auto_save_enabled = False
         self.auto_save_interval = AUTOSAVE_INTERVAL
         self.theme = DEFAULT_THEME
-        self.tab_data = {}
+        self.tabs = TabRegistry()
         self.current_tab_index = 0
        
         # Создание директорий
@@ -44,9 +55,14 @@ class TextEditorApp(QMainWindow):
         self.session_manager = SessionManager(self)
         self.autosave_manager = AutoSaveManager(self)
         self.theme_manager = ThemeManager(self)
+        self.follow_manager = FollowManager(self)
+        self.file_watch_service = FileWatchService(self)
         self.menu_manager = MenuManager(self)
         self.toolbar_manager = ToolbarManager(self)
         self.statusbar_manager = StatusBarManager(self)
+        self.ui_scheduler = UpdateScheduler(self)
+        self.edit_journal = EditJournal(self)
+        self.hibernation_manager = HibernationManager(self)
        
         # Настройка UI
         self.setup_ui()
@@ -56,6 +72,10 @@ class TextEditorApp(QMainWindow):
         # Загрузка сессии
         self.session_manager.load_session()
        
+        # Восстановление после сбоя и запуск журнала правок
+        self.edit_journal.recover()
+        self.edit_journal.start()
+       
         # Восстановление размеров окна
         self.restore_window_geometry()
        
@@ -70,6 +90,8 @@ class TextEditorApp(QMainWindow):
         self.config_dir.mkdir(parents=True, exist_ok=True)
        
         self.session_file = self.config_dir / "session.json"
+        self.session_blob_dir = self.config_dir / "session"
+        self.journal_dir = self.config_dir / "journal"
         self.theme_file = self.config_dir / "theme.json"
        
     def setup_ui(self):
@@ -77,6 +99,7 @@ class TextEditorApp(QMainWindow):
         self.setWindowTitle("Текстовый Редактор 3.4")
         self.setObjectName("TextEditorApp")  # ✅ ИСПРАВЛЕНО: Установляем objectName для окна
         self.setGeometry(100, 100, 1200, 700)
+        self.setAcceptDrops(True)
        
         # Загрузка иконки
         self.setup_icon()
@@ -104,6 +127,11 @@ class TextEditorApp(QMainWindow):
         main_layout.addWidget(self.search_replace_widget)
         self.search_replace_widget.hide()
        
+        # Панель поиска в файлах
+        self.find_in_files_panel = FindInFilesPanel(self)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.find_in_files_panel)
+        self.find_in_files_panel.hide()
+       
         # Создание меню, панели инструментов и статусбара
         self.menu_manager.create_menu()
         self.toolbar_manager.create_toolbar()
@@ -118,15 +146,22 @@ class TextEditorApp(QMainWindow):
         if icon_path.exists():
             self.setWindowIcon(QIcon(str(icon_path)))
            
-    def new_tab(self, file_path=None, content=None):
+    def new_tab(self, file_path=None, content=None, encoding='utf-8', compression=None):
         """Создание новой вкладки"""
         text_edit = QTextEdit()
         text_edit.setFont(QFont(DEFAULT_FONT[0], DEFAULT_FONT[1]))
         text_edit.textChanged.connect(self.on_text_changed)
-        text_edit.cursorPositionChanged.connect(self.update_status)
+        # Признак изменения ведет сам документ: отмена до сохраненного
+        # состояния его снимает, а setPlainText не выставляет
+        text_edit.document().modificationChanged.connect(
+            lambda modified, widget=text_edit: self.on_modification_changed(widget, modified)
+        )
+        text_edit.cursorPositionChanged.connect(self.ui_scheduler.mark_status)
         
         # Разрешаем горячие клавиши в текстовом поле
         text_edit.installEventFilter(self)
+        # Перетаскивание файлов приходит в viewport, а не в сам QTextEdit
+        text_edit.viewport().installEventFilter(self)
        
         if content:
             text_edit.setPlainText(content)
@@ -137,17 +172,31 @@ class TextEditorApp(QMainWindow):
         else:
             tab_name = f"Новый {self.tab_widget.count() + 1}"
        
-        # Храним метаданные в словаре
+        # Храним состояние вкладки в реестре по ее виджету
+        tab_data = self.tabs.add(TabState(text_edit, tab_name, file_path, encoding, compression,
+                                          stats=DocumentStats(text_edit.document())))
         tab_index = self.tab_widget.addTab(text_edit, tab_name)
+        self.edit_journal.attach(tab_data)
+       
+        self.tab_widget.setCurrentIndex(tab_index)
+        return tab_index
        
-        self.tab_data[tab_index] = {
-            'file_path': file_path,
-            'modified': False,
-            'name': tab_name,
-            'text_edit': text_edit
-        }
+    def new_large_file_tab(self, file_path, mapped_file):
+        """Создание вкладки просмотра большого файла"""
+        view = LargeFileView(mapped_file)
+        view.cursorPositionChanged.connect(self.ui_scheduler.mark_status)
+        view.fileChanged.connect(self.ui_scheduler.mark_status)
+        view.searchFinished.connect(self.search_replace_widget.on_large_search_finished)
+        tab_name = Path(file_path).name
+        view.fileChanged.connect(lambda: self.statusbar_manager.set_text(
+            f"Файл {tab_name} изменился на диске и показан заново"))
+       
+        self.tabs.add(TabState(view, tab_name, file_path, mapped_file.encoding, large_file=mapped_file))
+        tab_index = self.tab_widget.addTab(view, tab_name)
+        self.tab_widget.setTabToolTip(tab_index, f"{file_path} (только чтение)")
        
         self.tab_widget.setCurrentIndex(tab_index)
+        self.theme_manager.apply_theme()
         return tab_index
        
     def close_tab(self, index):
@@ -157,13 +206,15 @@ class TextEditorApp(QMainWindow):
        
         # Проверяем сохранение
         tab_data = self.get_tab_data(index)
-        if tab_data and tab_data.get('modified'):
-            text_edit = tab_data['text_edit']
+        if tab_data and self.is_dirty(tab_data):
+            # Несохраненный текст заготовки нужно показать перед вопросом
+            self.session_manager.restore_tab(tab_data)
+            text_edit = tab_data.text_edit
             if text_edit.toPlainText().strip():
                 reply = QMessageBox.question(
                     self,
                     "Сохранение",
-                    f"Сохранить изменения в {tab_data['name']}?",
+                    f"Сохранить изменения в {tab_data.name}?",
                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
                 )
                
@@ -173,31 +224,119 @@ class TextEditorApp(QMainWindow):
                     self.current_tab_index = index
                     self.file_manager.save_file()
        
+        self.remove_tab(index)
+       
+    def remove_tab(self, index):
+        """Удаление вкладки без проверки сохранения"""
+        tab_data = self.tabs.remove(self.tab_widget.widget(index))
+        if tab_data:
+            self.edit_journal.drop(tab_data)
+            if tab_data.loader:
+                tab_data.loader.cancel()
+            if tab_data.follow:
+                self.follow_manager.stop_following(tab_data)
+            if tab_data.large_file:
+                tab_data.large_file.close()
         self.tab_widget.removeTab(index)
-        if index in self.tab_data:
-            del self.tab_data[index]
-           
+       
+    def discard_tab(self, widget):
+        """Закрыть вкладку с виджетом, оставив хотя бы одну пустую"""
+        index = self.tab_widget.indexOf(widget)
+        if index < 0:
+            return
+        if self.tab_widget.count() <= 1:
+            self.new_tab()
+        self.remove_tab(self.tab_widget.indexOf(widget))
+       
     def on_tab_changed(self, index):
         """Обработчик смены вкладки"""
         self.current_tab_index = index
-        self.update_status()
-        self.update_window_title()
+        tab_data = self.get_tab_data(index)
+        self.session_manager.on_tab_activated(tab_data)
+        self.hibernation_manager.touch(tab_data)
+        self.ui_scheduler.mark_title()
+        self.ui_scheduler.mark_status()
        
     def on_text_changed(self):
         """Обработчик изменения текста"""
-        index = self.tab_widget.currentIndex()
-        tab_data = self.get_tab_data(index)
-        if tab_data:
-            tab_data['modified'] = True
-            self.update_window_title()
+        self.ui_scheduler.mark_status()
+           
+    def on_modification_changed(self, widget, modified):
+        """Документ стал измененным или вернулся к сохраненному состоянию"""
+        tab_data = self.get_tab_data_for_widget(widget)
+        # Загрузка, слежение и выгрузка пишут в документ сами, признак им задают явно
+        if tab_data and not tab_data.loader and not tab_data.follow and not tab_data.pending:
+            self.update_modified(tab_data, modified)
+           
+    def update_modified(self, tab_data, modified):
+        """Обновить признак изменения вкладки и запланировать перерисовку"""
+        if tab_data.modified != modified:
+            tab_data.modified = modified
+            self.ui_scheduler.mark_title()
+            self.ui_scheduler.mark_tab(tab_data.text_edit)
+        self.ui_scheduler.mark_status()
+           
+    def set_modified(self, tab_data, modified, digest=None):
+        """Изменить признак изменения вкладки
+
+        False значит, что текст совпадает с файлом: запоминаются ревизия,
+        длина и хеш текста (digest, если он уже посчитан при записи;
+        для небольших документов он считается здесь).
+        """
+        if not tab_data.large_file:
+            document = tab_data.text_edit.document()
+            if not modified:
+                if digest is None and document.characterCount() <= DIRTY_DIGEST_MAX_CHARS:
+                    digest = document_digest(document)
+                tab_data.saved = (document.revision(), document.characterCount(), digest)
+                tab_data.dirty_checked = None
+            document.setModified(modified)
+        self.update_modified(tab_data, modified)
+        if not modified:
+            # Текст совпал с файлом - журнал правок начинается заново
+            self.edit_journal.reset(tab_data)
+           
+    def is_dirty(self, tab_data):
+        """Отличается ли текст вкладки от сохраненного
+
+        Чистый документ и документ другой длины решаются без чтения
+        текста. Хеш считается, только если длина совпала с сохраненной,
+        и запоминается для текущей ревизии.
+        """
+        if tab_data.pending is not None:
+            # Текст заготовки не загружен, признак хранит ее запись
+            return bool(tab_data.pending.get('modified'))
+        if tab_data.large_file or not tab_data.modified:
+            return False
+        saved = tab_data.saved
+        document = tab_data.text_edit.document()
+        if saved is None or saved[2] is None or document.characterCount() != saved[1]:
+            return True
+        checked = tab_data.dirty_checked
+        if checked is None or checked[0] != document.revision():
+            checked = tab_data.dirty_checked = (document.revision(), document_digest(document) != saved[2])
+        if not checked[1]:
+            # Правки вернули текст к сохраненному - документ снова чистый
+            self.set_modified(tab_data, False, saved[2])
+        return checked[1]
            
     def get_current_text_edit(self):
         """Возвращает текущий QTextEdit"""
-        return self.tab_widget.currentWidget()
+        widget = self.tab_widget.currentWidget()
+        return widget if isinstance(widget, QTextEdit) else None
+       
+    def get_current_large_view(self):
+        """Возвращает текущий просмотр большого файла"""
+        widget = self.tab_widget.currentWidget()
+        return widget if isinstance(widget, LargeFileView) else None
        
     def get_tab_data(self, index):
         """Возвращает данные вкладки"""
-        return self.tab_data.get(index)
+        return self.tabs.get(self.tab_widget.widget(index))
+       
+    def get_tab_data_for_widget(self, widget):
+        """Возвращает данные вкладки по её виджету"""
+        return self.tabs.get(widget)
        
     def get_current_tab_data(self):
         """Возвращает данные текущей вкладки"""
@@ -205,35 +344,71 @@ class TextEditorApp(QMainWindow):
        
     def update_status(self):
         """Обновление статусбара"""
+        large_view = self.get_current_large_view()
+        if large_view:
+            mapped_file = large_view.mapped_file
+            total = mapped_file.line_count()
+            approx = "" if mapped_file.index_complete else "~"
+            self.statusbar_manager.set_text(
+                f"Строка: {large_view.current_line + 1} | Строк: {approx}{total} | "
+                f"Размер: {mapped_file.size // (1024 * 1024)} МБ | "
+                f"{mapped_file.encoding.upper()} | Только чтение"
+            )
+            return
+       
+        tab_data = self.get_current_tab_data()
+        if tab_data and tab_data.loader:
+            self.statusbar_manager.set_text(
+                f"Загрузка {tab_data.name}: {tab_data.loader.progress}%"
+            )
+            return
+       
         text_edit = self.get_current_text_edit()
         if text_edit:
             cursor = text_edit.textCursor()
             line = cursor.blockNumber() + 1
             column = cursor.positionInBlock() + 1
            
-            text = text_edit.toPlainText()
-            total_lines = len(text.split('\n'))
-            words = len(text.split())
-            chars = len(text)
+            stats = tab_data.stats
+            total_lines = stats.lines
+            words = stats.words
+            chars = stats.characters
            
-            tab_data = self.get_current_tab_data()
-            modified = " [Изменен]" if tab_data and tab_data.get('modified') else ""
-            file_path = tab_data.get('file_path', '') if tab_data else ''
+            modified = " [Изменен]" if tab_data and tab_data.modified else ""
+            file_path = (tab_data.file_path or '') if tab_data else ''
+            encoding = tab_data.encoding if tab_data else 'utf-8'
+            if tab_data and tab_data.compression:
+                encoding = f"{encoding} + {tab_data.compression}"
            
             status_text = (
                 f"Строка: {line}, Колонка: {column} | "
-                f"Строк: {total_lines} | Слов: {words} | Символов: {chars}"
-                f"{modified}"
+                f"Строк: {total_lines} | Слов: {words} | Символов: {chars} | "
+                f"{encoding.upper()}{modified}"
             )
            
             self.statusbar_manager.set_text(status_text)
            
+    def update_tab_label(self, widget):
+        """Обновление подписи вкладки (с индикатором загрузки и изменения)"""
+        index = self.tab_widget.indexOf(widget)
+        tab_data = self.get_tab_data_for_widget(widget)
+        if index < 0 or not tab_data:
+            return
+        label = tab_data.name
+        if tab_data.loader:
+            label = f"{label} ({tab_data.loader.progress}%)"
+        elif tab_data.follow:
+            label = f"{label} (слежение)"
+        elif tab_data.modified:
+            label = f"{label}*"
+        self.tab_widget.setTabText(index, label)
+       
     def update_window_title(self):
         """Обновление заголовка окна"""
         tab_data = self.get_current_tab_data()
         if tab_data:
-            name = tab_data['name']
-            modified = "*" if tab_data['modified'] else ""
+            name = tab_data.name
+            modified = "*" if tab_data.modified else ""
             self.setWindowTitle(f"Текстовый Редактор 3.4 - {name}{modified}")
         else:
             self.setWindowTitle("Текстовый Редактор 3.4")
@@ -310,6 +485,14 @@ class TextEditorApp(QMainWindow):
     
     def eventFilter(self, obj, event):
         """Перехват событий для горячих клавиш в текстовом поле"""
+        if event.type() in (QEvent.Type.DragEnter, QEvent.Type.DragMove, QEvent.Type.Drop):
+            if self.dropped_paths(event):
+                if event.type() == QEvent.Type.Drop:
+                    self.dropEvent(event)
+                else:
+                    event.acceptProposedAction()
+                return True
+       
         if event.type() == QEvent.Type.KeyPress:
             key = event.key()
             modifiers = event.modifiers()
@@ -351,6 +534,25 @@ class TextEditorApp(QMainWindow):
         
         return super().eventFilter(obj, event)
        
+    def dropped_paths(self, event):
+        """Локальные файлы и папки из перетаскиваемых данных"""
+        mime_data = event.mimeData()
+        if not mime_data.hasUrls():
+            return []
+        return [url.toLocalFile() for url in mime_data.urls() if url.isLocalFile()]
+       
+    def dragEnterEvent(self, event):
+        """Разрешаем перетаскивание файлов в окно"""
+        if self.dropped_paths(event):
+            event.acceptProposedAction()
+           
+    def dropEvent(self, event):
+        """Открытие перетащенных файлов и папок"""
+        paths = self.dropped_paths(event)
+        if paths:
+            event.acceptProposedAction()
+            self.file_manager.open_files(paths)
+           
     def show_search(self):
         """Показать панель поиска"""
         self.search_replace_widget.show_search()
@@ -359,6 +561,14 @@ class TextEditorApp(QMainWindow):
         """Показать панель замены"""
         self.search_replace_widget.show_replace()
        
+    def show_find_in_files(self):
+        """Показать панель поиска в файлах"""
+        self.find_in_files_panel.show_panel()
+       
+    def show_find_in_tabs(self):
+        """Показать панель поиска по открытым вкладкам"""
+        self.find_in_files_panel.show_panel(open_tabs=True)
+       
     def close_current_tab(self):
         """Закрыть текущую вкладку"""
         self.close_tab(self.tab_widget.currentIndex())
@@ -371,7 +581,15 @@ class TextEditorApp(QMainWindow):
     def closeEvent(self, event):
         """Обработчик закрытия приложения"""
         if self.check_save_all():
+            for tab_data in self.tabs:
+                if tab_data.loader:
+                    tab_data.loader.cancel()
+            self.find_in_files_panel.cancel_search()
+            shutdown_search_pool()
+            self.autosave_manager.shutdown()
+            self.file_watch_service.shutdown()
             self.session_manager.save_session()
+            self.edit_journal.shutdown()
             self.save_window_geometry()
             event.accept()
         else:
@@ -379,16 +597,16 @@ class TextEditorApp(QMainWindow):
            
     def check_save_all(self):
         """Проверка сохранения всех вкладок"""
-        for i in range(self.tab_widget.count()):
-            tab_data = self.get_tab_data(i)
-            if tab_data and tab_data.get('modified'):
-                text_edit = tab_data['text_edit']
+        for tab_data in self.tabs:
+            if self.is_dirty(tab_data):
+                self.session_manager.restore_tab(tab_data)
+                text_edit = tab_data.text_edit
                 if text_edit.toPlainText().strip():
-                    self.tab_widget.setCurrentIndex(i)
+                    self.tab_widget.setCurrentWidget(text_edit)
                     reply = QMessageBox.question(
                         self,
                         "Сохранение",
-                        f"Сохранить изменения в {tab_data['name']}?",
+                        f"Сохранить изменения в {tab_data.name}?",
                         QMessageBox.StandardButton.Yes |
                         QMessageBox.StandardButton.No |
                         QMessageBox.StandardButton.Cancel
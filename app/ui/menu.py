@@ -21,6 +21,7 @@ class MenuManager:
         file_menu.addAction("Открыть", self.editor.file_manager.open_file).setShortcut(QKeySequence.StandardKey.Open)
         file_menu.addAction("Сохранить", self.editor.file_manager.save_file).setShortcut(QKeySequence.StandardKey.Save)
         file_menu.addAction("Сохранить как", self.editor.file_manager.save_as_file).setShortcut(QKeySequence.StandardKey.SaveAs)
+        file_menu.addAction("Отменить загрузку", self.editor.file_manager.cancel_loading)
        
         file_menu.addSeparator()
         file_menu.addAction("Новая вкладка", self.editor.new_tab).setShortcut("Ctrl+T")
@@ -30,6 +31,8 @@ class MenuManager:
         autosave_action = file_menu.addAction("Автосохранение")
         autosave_action.setCheckable(True)
         autosave_action.triggered.connect(self.editor.autosave_manager.toggle_autosave)
+        file_menu.addAction("Резервные копии...", self.editor.autosave_manager.show_backups)
+        file_menu.addAction("Хранение резервных копий...", self.editor.autosave_manager.configure_retention)
        
         file_menu.addSeparator()
         file_menu.addAction("Печать", self.editor.file_manager.print_file).setShortcut(QKeySequence.StandardKey.Print)
@@ -48,7 +51,10 @@ class MenuManager:
         edit_menu.addSeparator()
         edit_menu.addAction("Найти", self.editor.show_search).setShortcut(QKeySequence.StandardKey.Find)
         edit_menu.addAction("Заменить", self.editor.show_replace).setShortcut(QKeySequence.StandardKey.Replace)
+        edit_menu.addAction("Найти в файлах...", self.editor.show_find_in_files).setShortcut("Ctrl+Shift+F")
+        edit_menu.addAction("Найти во вкладках...", self.editor.show_find_in_tabs).setShortcut("Ctrl+Alt+F")
         edit_menu.addAction("Выделить все", self.editor.editor_commands.select_all).setShortcut(QKeySequence.StandardKey.SelectAll)
+        edit_menu.addAction("Перейти к строке...", self.editor.editor_commands.goto_line).setShortcut("Ctrl+G")
        
         # Меню Формат
         format_menu = menubar.addMenu("Формат")
@@ -73,6 +79,9 @@ class MenuManager:
         view_menu.addAction("Увеличить", self.editor.editor_commands.zoom_in).setShortcut("Ctrl++")
         view_menu.addAction("Уменьшить", self.editor.editor_commands.zoom_out).setShortcut("Ctrl+-")
         view_menu.addAction("Сбросить масштаб", self.editor.editor_commands.zoom_reset).setShortcut("Ctrl+0")
+        view_menu.addSeparator()
+        view_menu.addAction("Следить за файлом", self.editor.follow_manager.toggle_follow)
+        view_menu.addAction("Память вкладок...", self.editor.hibernation_manager.configure_budget)
        
         # Меню Инструменты
         tools_menu = menubar.addMenu("Инструменты")
@@ -111,6 +120,8 @@ class MenuManager:
 <tr><td>Ctrl+W</td><td>Закрыть вкладку</td></tr>
 <tr><td>Ctrl+F</td><td>Поиск</td></tr>
 <tr><td>Ctrl+H</td><td>Замена</td></tr>
+<tr><td>Ctrl+Shift+F</td><td>Поиск в файлах</td></tr>
+<tr><td>Ctrl+Alt+F</td><td>Поиск во всех вкладках</td></tr>
 <tr><td>F5</td><td>Вставить дату/время</td></tr>
 </table>
         """
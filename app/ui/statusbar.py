@@ -17,25 +17,11 @@ class StatusBarManager:
        
     def set_text(self, text):
         """Установить текст в статусбаре"""
+        # Явное сообщение не должно затираться отложенным обновлением
+        self.editor.ui_scheduler.discard_status()
         if self.status_label:
             self.status_label.setText(text)
            
     def update_status(self):
         """Обновить статусбар"""
-        text_edit = self.editor.get_current_text_edit()
-        if text_edit:
-            cursor = text_edit.textCursor()
-            line = cursor.blockNumber() + 1
-            column = cursor.positionInBlock() + 1
-           
-            text = text_edit.toPlainText()
-            total_lines = len(text.split('\n'))
-            words = len(text.split())
-            chars = len(text)
-           
-            status_text = (
-                f"Строка: {line}, Колонка: {column} | "
-                f"Строк: {total_lines} | Слов: {words} | Символов: {chars}"
-            )
-           
-            self.set_text(status_text)
+        self.editor.update_status()
@@ -0,0 +1,87 @@
+"""
+Объединение частых обновлений заголовка, статусбара и вкладок
+"""
+from PyQt6.QtCore import QTimer
+from app.utils.constants import UI_UPDATE_INTERVAL
+
+
+class UpdateScheduler:
+    """Отложенное обновление интерфейса не чаще раза за кадр
+
+    Обработчики правок и перемещений курсора только помечают части
+    интерфейса устаревшими, а одиночный таймер перерисовывает их разом.
+    Счетчики показывают, сколько запросов было объединено.
+    """
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.title_dirty = False
+        self.status_dirty = False
+        self.dirty_tabs = set()
+        self.counters = {
+            'requests': 0,
+            'flushes': 0,
+            'title_updates': 0,
+            'status_updates': 0,
+            'tab_updates': 0,
+        }
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def _schedule(self):
+        self.counters['requests'] += 1
+        if not self.timer.isActive():
+            self.timer.start(UI_UPDATE_INTERVAL)
+
+    def mark_title(self):
+        self.title_dirty = True
+        self._schedule()
+
+    def mark_status(self):
+        self.status_dirty = True
+        self._schedule()
+
+    def mark_tab(self, widget):
+        self.dirty_tabs.add(widget)
+        self._schedule()
+
+    def mark_all(self, widget=None):
+        """Пометить заголовок, статусбар и (если указана) вкладку"""
+        self.mark_title()
+        self.mark_status()
+        if widget is not None:
+            self.mark_tab(widget)
+
+    def discard_status(self):
+        """Не перезаписывать статусбар: в нем явно выставленное сообщение"""
+        self.status_dirty = False
+
+    def flush(self):
+        """Выполнить все отложенные обновления"""
+        self.timer.stop()
+        self.counters['flushes'] += 1
+        if self.dirty_tabs:
+            tabs, self.dirty_tabs = self.dirty_tabs, set()
+            for widget in tabs:
+                self.editor.update_tab_label(widget)
+            self.counters['tab_updates'] += len(tabs)
+        if self.title_dirty:
+            self.title_dirty = False
+            self.editor.update_window_title()
+            self.counters['title_updates'] += 1
+        if self.status_dirty:
+            self.status_dirty = False
+            self.editor.update_status()
+            self.counters['status_updates'] += 1
+
+    @property
+    def coalesced(self):
+        """Сколько запросов не потребовали отдельного обновления"""
+        executed = (self.counters['title_updates'] + self.counters['status_updates']
+                    + self.counters['tab_updates'])
+        return self.counters['requests'] - executed
+
+    def reset_counters(self):
+        for key in self.counters:
+            self.counters[key] = 0
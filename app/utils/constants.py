@@ -13,6 +13,7 @@ SUPPORTED_FILES = [
     ("JavaScript файлы", "*.js"),
     ("JSON файлы", "*.json"),
     ("Markdown файлы", "*.md"),
+    ("Сжатые файлы", "*.gz *.bz2 *.xz"),
     ("Все файлы", "*.*")
 ]
 # Темы
@@ -50,3 +51,80 @@ THEMES = {
 DEFAULT_WINDOW_WIDTH = 1200
 DEFAULT_WINDOW_HEIGHT = 700
 TOOLBAR_ICON_SIZE = 16
+# Большие файлы (просмотр через mmap)
+LARGE_FILE_THRESHOLD = 512 * 1024 * 1024  # файлы от 512 МБ открываются только для чтения
+LARGE_FILE_INDEX_CHUNK = 64 * 1024  # шаг индекса строк в байтах
+LARGE_FILE_INDEX_STEP = 16 * 1024 * 1024  # сколько байт индексировать за один проход таймера
+LARGE_FILE_MAX_LINE = 4096  # максимальная длина отображаемой строки в байтах
+LARGE_FILE_SEARCH_WINDOW = 1024 * 1024  # порция поиска в байтах
+LARGE_FILE_SEARCH_OVERLAP = 64 * 1024  # перекрытие порций: самое длинное совпадение, находимое на их границе
+LARGE_FILE_SEARCH_SLICE = 0.015  # время на поиск за один такт GUI, с
+# Определение кодировок
+ENCODING_SAMPLE_SIZE = 64 * 1024  # размер выборки для определения кодировки
+ENCODING_CACHE_SIZE = 512  # число запоминаемых файлов
+# Фоновая загрузка файлов
+LOAD_ASYNC_THRESHOLD = 1024 * 1024  # файлы от 1 МБ загружаются в фоне
+LOAD_CHUNK_SIZE = 256 * 1024  # размер читаемой порции в байтах
+LOAD_QUEUE_SIZE = 8  # число порций, ожидающих вставки
+LOAD_BATCH_TIME = 0.015  # время на вставку порций за один такт GUI, с
+LOAD_INSERT_CHARS = 8 * 1024  # символов за один вызов insertText
+# Сохранение файлов
+SAVE_CHUNK_CHARS = 256 * 1024  # символов, кодируемых за один раз
+DIRTY_DIGEST_MAX_CHARS = 1024 * 1024  # у документов не длиннее хеш текста считается сразу при открытии
+SAVE_BUFFER_SIZE = 1024 * 1024  # буфер записи во временный файл
+# Пакетное открытие файлов
+OPEN_MAX_WORKERS = 8  # потоков для чтения и декодирования
+BINARY_CHECK_SIZE = 8192  # сколько байт проверять на двоичность
+# Слежение за растущими файлами
+FOLLOW_POLL_INTERVAL = 1000  # опрос файлов в миллисекундах
+FOLLOW_MAX_LINES = 100000  # сколько последних строк держать в документе
+FOLLOW_MAX_READ = 4 * 1024 * 1024  # байт за одно чтение
+# Отслеживание внешних изменений файлов
+WATCH_POLL_INTERVAL = 2000  # период опроса в миллисекундах
+WATCH_BATCH_SIZE = 100  # файлов, проверяемых за один цикл
+WATCH_HASH_CHUNK = 1024 * 1024  # порция чтения при подсчете хэша
+WATCH_DIFF_MAX_LINES = 5000  # предел строк в окне различий
+# Отложенное обновление интерфейса
+UI_UPDATE_INTERVAL = 16  # не чаще одного обновления за кадр, мс
+# Поиск
+SEARCH_PATTERN_CACHE_SIZE = 64  # скомпилированных шаблонов в кэше
+SEARCH_HIGHLIGHT_MARGIN = 50  # блоков подсветки за пределами видимой области
+SEARCH_HIGHLIGHT_DELAY = 30  # задержка перерисовки подсветки, мс
+SEARCH_INCREMENTAL_DELAY = 120  # пауза в наборе перед поиском по мере ввода, мс
+SEARCH_NARROW_RATIO = 5  # сужать прежние совпадения, если их в столько раз меньше строк
+REPLACE_MERGE_GAP = 1024  # замены ближе этого числа символов вставляются одним участком
+# Поиск в файлах
+FIND_FILES_MAX_WORKERS = 4  # процессов в пуле поиска
+FIND_FILES_BATCH = 32  # файлов в одном задании пула
+FIND_FILES_MAX_SIZE = 64 * 1024 * 1024  # файлы больше пропускаются
+FIND_FILES_MAX_MATCHES = 1000  # совпадений из одного файла
+FIND_FILES_PREVIEW = 200  # символов строки в списке результатов
+FIND_FILES_EXCLUDE = ".git;.svn;.hg;__pycache__;node_modules"  # исключения по умолчанию
+INDEX_FLUSH_ENTRIES = 2000000  # записей списков файлов, копящихся до записи в базу
+INDEX_COMPACT_RATIO = 1.0  # сжатие индекса, когда устаревших файлов больше живых
+TAB_SEARCH_SLICE = 0.010  # время на поиск по вкладкам за один такт GUI, с
+TAB_SEARCH_CHUNK = 2000  # строк документа, просматриваемых за один раз
+TAB_SEARCH_WAIT_INTERVAL = 100  # опрос загружающихся вкладок во время поиска, мс
+SESSION_PRELOAD_DELAY = 300  # пауза между фоновыми загрузками вкладок сессии, мс
+SESSION_PRELOAD_MAX_CHARS = 256 * 1024  # несохраненный текст больше этого ждет перехода на вкладку
+JOURNAL_FLUSH_INTERVAL = 1.0  # как часто журнал правок сбрасывается на диск, с
+JOURNAL_COMPACT_SIZE = 1024 * 1024  # примерный объем журнала в байтах, после которого он сворачивается в снимок
+# Резервные копии автосохранения
+BACKUP_MAX_COUNT = 20  # копий одного файла
+BACKUP_MAX_AGE_DAYS = 30  # копии старше удаляются
+BACKUP_MAX_SIZE_MB = 200  # предел объема всего хранилища
+BACKUP_DELTA_RATIO = 0.5  # копия хранится дельтой, пока новых строк в ней не больше этой доли
+BACKUP_CHUNK = 16 * 1024  # строк или символов, обрабатываемых за один вызов
+AUTOSAVE_MAX_WORKERS = 2  # потоков записи автосохранения
+AUTOSAVE_SNAPSHOT_SLICE = 0.003  # время на снимок документов за один такт GUI, с
+AUTOSAVE_SNAPSHOT_CHARS = 32 * 1024  # символов документа в одной порции снимка
+AUTOSAVE_SNAPSHOT_RETRIES = 3  # перезапусков снимка из-за правок, после которых остаток снимается сразу
+AUTOSAVE_TIMING_HISTORY = 100  # сколько последних срабатываний автосохранения хранить в замерах
+# Выгрузка вкладок из памяти
+TAB_MEMORY_BUDGET_MB = 512  # бюджет памяти документов вкладок по умолчанию
+TAB_CHAR_BYTES = 3  # примерный расход памяти на символ документа, байт
+TAB_BLOCK_BYTES = 140  # примерный расход памяти на строку документа, байт
+TAB_LAYOUT_CHAR_BYTES = 100  # примерный расход памяти на символ разложенной по строкам экрана части документа, байт
+HIBERNATE_MIN_BYTES = 256 * 1024  # вкладки меньше этого не выгружаются
+HIBERNATE_CHECK_DELAY = 2000  # проверка бюджета после смены вкладки, мс
+HIBERNATE_CHECK_INTERVAL = 60000  # периодическая проверка бюджета, мс
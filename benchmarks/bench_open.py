@@ -0,0 +1,82 @@
+"""
+Сравнение последовательного и параллельного открытия множества файлов
+
+Запуск: python benchmarks/bench_open.py [число_файлов] [размер_КБ] [--cold]
+
+С --cold перед каждым прогоном файлы вытесняются из кэша ОС
+(posix_fadvise), что ближе к открытию архива логов с диска или по сети.
+Размер файла должен быть меньше LOAD_ASYNC_THRESHOLD.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import encoding
+from app.core.batch_open import read_file_task
+from app.utils.constants import OPEN_MAX_WORKERS
+
+
+def make_files(directory, count, size_kb):
+    """Создать набор логов в UTF-8 и cp1251"""
+    line = "2024-01-01 12:00:00 INFO запрос обработан за 12 мс, id=%d\n"
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"log_{i:04d}.log")
+        text = "".join(line % n for n in range(size_kb * 1024 // len(line)))
+        with open(path, 'wb') as f:
+            f.write(text.encode('cp1251' if i % 2 else 'utf-8'))
+        paths.append(path)
+    return paths
+
+
+def evict(paths):
+    """Вытеснить файлы из кэша ОС"""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def run(paths, parallel, cold=False):
+    """Прочитать все файлы, вернуть время в секундах"""
+    encoding._encoding_detector = None  # сбрасываем кэш кодировок
+    if cold:
+        evict(paths)
+    start = time.perf_counter()
+    if parallel:
+        with ThreadPoolExecutor(max_workers=OPEN_MAX_WORKERS) as executor:
+            results = list(executor.map(read_file_task, paths))
+    else:
+        results = [read_file_task(path) for path in paths]
+    elapsed = time.perf_counter() - start
+    assert all(kind == 'text' for kind, _ in results)
+    return elapsed
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    cold = '--cold' in sys.argv and hasattr(os, 'posix_fadvise')
+    count = int(args[0]) if len(args) > 0 else 200
+    size_kb = int(args[1]) if len(args) > 1 else 256
+    # Временная папка рядом со скриптом: /tmp бывает в памяти (tmpfs)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(__file__))) as directory:
+        paths = make_files(directory, count, size_kb)
+        run(paths, parallel=False)  # прогрев интерпретатора и кэша ОС
+        sequential = min(run(paths, parallel=False, cold=cold) for _ in range(3))
+        parallel = min(run(paths, parallel=True, cold=cold) for _ in range(3))
+    mode = "холодный кэш" if cold else "теплый кэш"
+    print(f"Файлов: {count} по {size_kb} КБ, потоков: {OPEN_MAX_WORKERS}, {mode}")
+    print(f"Последовательно: {sequential:.3f} с")
+    print(f"Пулом потоков:   {parallel:.3f} с")
+    print(f"Ускорение:       {sequential / parallel:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Сравнение замены всех совпадений: через setPlainText и правками на месте
+
+Запуск: python benchmarks/bench_replace.py [число_строк] [замен_в_строке]
+
+Старый способ собирает новый текст через str.replace и целиком заменяет
+документ (теряется история отмены и заново раскладывается весь текст).
+Новый вносит правки одним блоком через QTextCursor.
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from app.core.search_engine import replace_all
+
+
+def make_text(lines, per_line):
+    """Журнал, в каждой строке которого per_line раз встречается 'ERROR'"""
+    words = " ".join(["ERROR"] * per_line)
+    return "".join(f"{n:07d} запрос {words} обработан за 12 мс\n" for n in range(lines))
+
+
+def make_editor(text):
+    text_edit = QTextEdit()
+    text_edit.resize(800, 600)
+    text_edit.show()
+    text_edit.setPlainText(text)
+    QApplication.processEvents()
+    return text_edit
+
+
+def run_old(text):
+    text_edit = make_editor(text)
+    start = time.perf_counter()
+    content = text_edit.toPlainText()
+    count = content.count("ERROR")
+    text_edit.setPlainText(content.replace("ERROR", "WARNING"))
+    QApplication.processEvents()
+    return time.perf_counter() - start, count, text_edit.document().isUndoAvailable()
+
+
+def run_new(text):
+    text_edit = make_editor(text)
+    start = time.perf_counter()
+    count = replace_all(text_edit.document(), re.compile("ERROR"), "WARNING")
+    QApplication.processEvents()
+    return time.perf_counter() - start, count, text_edit.document().isUndoAvailable()
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    per_line = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    text = make_text(lines, per_line)
+    old, count, old_undo = run_old(text)
+    new, new_count, new_undo = run_new(text)
+    assert count == new_count
+    print(f"Строк: {lines}, замен: {count}")
+    print(f"setPlainText:   {old:.3f} с, отмена доступна: {'да' if old_undo else 'нет'}")
+    print(f"Правки на месте: {new:.3f} с, отмена доступна: {'да' if new_undo else 'нет'}")
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    main()
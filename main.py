@@ -4,12 +4,17 @@
 Главная точка входа приложения
 """
 import sys
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from app.texteditor import TextEditorApp
 def main():
     app = QApplication(sys.argv)
     editor = TextEditorApp()
     editor.show()
+    # Файлы и папки из командной строки
+    editor.file_manager.open_files(app.arguments()[1:])
     sys.exit(app.exec())
 if __name__ == "__main__":
+    # Нужно для процессов поиска в файлах в собранном .exe
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,66 @@
+"""
+Реестр вкладок и QTabWidget должны описывать одни и те же вкладки
+"""
+import os
+import random
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+from PyQt6.QtWidgets import QApplication
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    # Ссылка в фикстуре держит приложение живым, пока его используют тесты
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture(scope="module")
+def editor(qapp, tmp_path_factory):
+    # Сессия, журнал и резервные копии пишутся во временный домашний каталог
+    home = tmp_path_factory.mktemp("home")
+    old_home = os.environ.get("HOME")
+    os.environ["HOME"] = str(home)
+    from app.texteditor import TextEditorApp
+    editor = TextEditorApp()
+    yield editor
+    editor.edit_journal.shutdown()
+    editor.autosave_manager.shutdown()
+    editor.file_watch_service.shutdown()
+    if old_home is None:
+        del os.environ["HOME"]
+    else:
+        os.environ["HOME"] = old_home
+
+
+def assert_in_sync(editor):
+    widgets = [editor.tab_widget.widget(i) for i in range(editor.tab_widget.count())]
+    states = list(editor.tabs)
+    assert len(editor.tabs) == len(widgets)
+    # Реестр -> виджеты: тот же порядок
+    assert [state.text_edit for state in states] == widgets
+    # Виджеты -> реестр: у каждого индекса и виджета свое состояние
+    for index, widget in enumerate(widgets):
+        state = editor.get_tab_data(index)
+        assert state is states[index]
+        assert editor.get_tab_data_for_widget(widget) is state
+        assert state in editor.tabs
+
+
+def test_random_open_close_keeps_registry_in_sync(editor):
+    rng = random.Random(1234)
+    assert_in_sync(editor)
+    opened = 0
+    while opened < 1000 or editor.tab_widget.count() > 1:
+        count = editor.tab_widget.count()
+        if opened < 1000 and (count <= 1 or rng.random() < 0.6):
+            editor.new_tab(content=f"tab {opened}")
+            opened += 1
+        else:
+            index = rng.randrange(count)
+            widget = editor.tab_widget.widget(index)
+            editor.remove_tab(index)
+            assert editor.get_tab_data_for_widget(widget) is None
+        assert_in_sync(editor)
+    assert len(editor.tabs) == 1